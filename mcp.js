@@ -15,6 +15,9 @@ import {
   ListToolsRequestSchema,
 } from "@modelcontextprotocol/sdk/types.js";
 import { spawn } from "child_process";
+import { createWriteStream } from "fs";
+import { request } from "http";
+import { homedir } from "os";
 import { z } from "zod";
 import { fileURLToPath } from 'url';
 import { dirname, join } from 'path';
@@ -58,6 +61,58 @@ async function runPocketTts(args) {
   });
 }
 
+/**
+ * Socket of `pocket-tts daemon`, which keeps the model loaded between requests.
+ */
+const DAEMON_SOCKET =
+  process.env.POCKET_TTS_SOCKET ||
+  join(homedir(), ".cache", "pocket_tts", "daemon", "pocket-tts.sock");
+
+/**
+ * Generates speech with the daemon, through the `/tts` endpoint on its Unix socket.
+ * @param {string} text - The text to convert to speech.
+ * @param {string} voice - The voice to use.
+ * @param {string} outputPath - Where to write the .wav file.
+ * @returns {Promise<{ok: boolean, error?: string}>} `ok` is false with no `error` when no
+ *   daemon is running, the caller should then generate the audio itself.
+ */
+async function generateWithDaemon(text, voice, outputPath) {
+  return new Promise((resolve) => {
+    const body = new URLSearchParams({ text, voice_url: voice }).toString();
+    const req = request(
+      {
+        socketPath: DAEMON_SOCKET,
+        path: "/tts",
+        method: "POST",
+        headers: { "Content-Type": "application/x-www-form-urlencoded" },
+      },
+      (res) => {
+        if (res.statusCode !== 200) {
+          let error = "";
+          res.on("data", (data) => {
+            error += data.toString();
+          });
+          res.on("end", () => resolve({ ok: false, error: `${res.statusCode} ${error}` }));
+          return;
+        }
+        const file = createWriteStream(outputPath);
+        res.pipe(file);
+        file.on("finish", () => resolve({ ok: true }));
+        file.on("error", (error) => resolve({ ok: false, error: error.message }));
+      }
+    );
+    req.on("error", (error) => {
+      // No socket, or a socket left by a daemon that is not running anymore.
+      if (error.code === "ENOENT" || error.code === "ECONNREFUSED") {
+        resolve({ ok: false });
+      } else {
+        resolve({ ok: false, error: error.message });
+      }
+    });
+    req.end(body);
+  });
+}
+
 const server = new Server(
   {
     name: "pocket-tts",
@@ -119,6 +174,21 @@ const tools = [
     },
     async handler(args) {
       const { text, voice = "alba", output_path = "./tts_output.wav" } = args;
+
+      const daemon = await generateWithDaemon(text, voice, output_path);
+      if (daemon.ok) {
+        return {
+          content: [{ type: "text", text: `Successfully generated audio to ${output_path}.` }],
+        };
+      }
+      if (daemon.error) {
+        return {
+          isError: true,
+          content: [{ type: "text", text: `Error generating audio: ${daemon.error}` }],
+        };
+      }
+
+      // No daemon running, generate in a new process.
       const cmdArgs = ["generate", "--text", text, "--voice", voice, "--output-path", output_path];
 
       const { stdout, stderr, code } = await runPocketTts(cmdArgs);
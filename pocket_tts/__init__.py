@@ -1,9 +1,27 @@
+import importlib
+import os
+
 from beartype import BeartypeConf
 from beartype.claw import beartype_this_package
 
-beartype_this_package(conf=BeartypeConf(is_color=False))
+# The runtime type checks slow down the import and every generation step.
+# Set POCKET_TTS_TYPE_CHECKS=0 to skip them in production.
+if os.environ.get("POCKET_TTS_TYPE_CHECKS", "1") != "0":
+    beartype_this_package(conf=BeartypeConf(is_color=False))
+
+# The public classes are imported on first access, so that the CLI and the modules which
+# do not need the model, e.g. for `pocket-tts list-personas`, start without importing torch.
+_LAZY_EXPORTS = {
+    "TTSModel": "pocket_tts.models.tts_model",
+    "TextStreamSession": "pocket_tts.models.text_stream",
+}
+
+
+def __getattr__(name: str):
+    if name in _LAZY_EXPORTS:
+        return getattr(importlib.import_module(_LAZY_EXPORTS[name]), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-from pocket_tts.models.tts_model import TTSModel  # noqa: E402
 
 # Public methods:
 # TTSModel.device
@@ -12,5 +30,8 @@ from pocket_tts.models.tts_model import TTSModel  # noqa: E402
 # TTSModel.generate_audio
 # TTSModel.generate_audio_stream
 # TTSModel.get_state_for_audio_prompt
+# TextStreamSession.feed
+# TextStreamSession.close
+# TextStreamSession.audio_chunks
 
-__all__ = ["TTSModel"]
+__all__ = ["TTSModel", "TextStreamSession"]
@@ -0,0 +1,206 @@
+"""Generation of many utterances from a manifest, with one model load.
+
+The manifest is a JSONL or CSV file with one utterance per row. The `text` and `output`
+columns are required. The `voice` and `persona` columns, and the generation parameters
+of `GENERATION_DEFAULTS`, are optional and resolved like the options of `generate`.
+"""
+
+import csv
+import json
+import logging
+import math
+import time
+import traceback
+from functools import partial
+from pathlib import Path
+
+import torch
+
+from pocket_tts.data.audio import stream_audio_chunks
+from pocket_tts.default_parameters import MAX_TOKEN_PER_CHUNK
+from pocket_tts.models.tts_model import TTSModel
+from pocket_tts.personas import GENERATION_DEFAULTS, load_persona, resolve_generation_parameters
+from pocket_tts.utils.utils import can_fork, forked_map
+
+logger = logging.getLogger(__name__)
+
+_INTEGER_PARAMETERS = {"lsd_decode_steps", "frames_after_eos"}
+_FLOAT_PARAMETERS = {"temperature", "speed", "noise_clamp", "eos_threshold"}
+
+
+def read_manifest(manifest_path: Path, output_dir: Path) -> list[dict]:
+    """Reads the rows of a manifest and resolves their generation parameters.
+
+    Relative output paths are resolved against `output_dir`.
+
+    Returns:
+        One item per row, with its `index` in the manifest, `text`, `output` path and
+        resolved `parameters`.
+
+    Raises:
+        ValueError: If a row is missing a required column or has an invalid value.
+    """
+    with open(manifest_path, newline="", encoding="utf-8") as f:
+        if manifest_path.suffix.lower() == ".csv":
+            rows = [(line_number, row) for line_number, row in enumerate(csv.DictReader(f), 2)]
+        else:
+            rows = [
+                (line_number, json.loads(line))
+                for line_number, line in enumerate(f, 1)
+                if line.strip()
+            ]
+
+    personas = {}
+    items = []
+    for line_number, row in rows:
+        # Empty CSV cells are treated as missing values.
+        row = {key: value for key, value in row.items() if value not in (None, "")}
+        for column in ["text", "output"]:
+            if column not in row:
+                raise ValueError(f"{manifest_path}:{line_number}: missing '{column}'")
+
+        persona = row.get("persona")
+        if persona is not None and persona not in personas:
+            personas[persona] = load_persona(persona)
+        try:
+            overrides = {
+                name: _convert_parameter(name, row[name])
+                for name in GENERATION_DEFAULTS
+                if name in row
+            }
+        except ValueError as e:
+            raise ValueError(f"{manifest_path}:{line_number}: {e}") from e
+
+        output = Path(row["output"])
+        items.append(
+            {
+                "index": len(items),
+                "text": row["text"],
+                "output": output if output.is_absolute() else output_dir / output,
+                "parameters": resolve_generation_parameters(personas.get(persona, {}), **overrides),
+            }
+        )
+    return items
+
+
+def _convert_parameter(name: str, value):
+    if name in _INTEGER_PARAMETERS:
+        return int(value)
+    if name in _FLOAT_PARAMETERS:
+        return float(value)
+    return value
+
+
+def split_items(items: list[dict], num_workers: int) -> list[list[dict]]:
+    """Splits the items between workers, keeping the items of a voice together.
+
+    The items of each voice are cut in slices of at most `len(items) / num_workers` items,
+    which are given to the worker with the least text so far, longest slices first. Each
+    worker gets its items sorted by voice, so that a voice is prompted once per worker.
+    """
+    slice_size = max(1, math.ceil(len(items) / num_workers))
+    by_voice = {}
+    for item in items:
+        by_voice.setdefault(item["parameters"]["voice"], []).append(item)
+    slices = [
+        voice_items[start : start + slice_size]
+        for voice_items in by_voice.values()
+        for start in range(0, len(voice_items), slice_size)
+    ]
+    slices.sort(key=lambda voice_slice: -sum(len(item["text"]) for item in voice_slice))
+
+    workers = [[] for _ in range(num_workers)]
+    loads = [0] * num_workers
+    for voice_slice in slices:
+        worker = loads.index(min(loads))
+        workers[worker].extend(voice_slice)
+        loads[worker] += sum(len(item["text"]) for item in voice_slice)
+    return [worker_items for worker_items in workers if worker_items]
+
+
+@torch.no_grad
+def generate_item(tts_model: TTSModel, item: dict, max_tokens: int = MAX_TOKEN_PER_CHUNK) -> dict:
+    """Generates the audio of one manifest item and returns its summary."""
+    parameters = item["parameters"]
+    summary = {"index": item["index"], "output": str(item["output"]), "voice": parameters["voice"]}
+    start = time.perf_counter()
+    try:
+        # The sampling parameters are read from the model at each step.
+        tts_model.temp = parameters["temperature"]
+        tts_model.lsd_decode_steps = parameters["lsd_decode_steps"]
+        tts_model.noise_clamp = parameters["noise_clamp"]
+        tts_model.eos_threshold = parameters["eos_threshold"]
+        model_state = tts_model._cached_get_state_for_audio_prompt(parameters["voice"])
+
+        num_samples = 0
+
+        def count_samples(audio_chunks):
+            nonlocal num_samples
+            for chunk in audio_chunks:
+                num_samples += chunk.shape[-1]
+                yield chunk
+
+        audio_chunks = tts_model.generate_audio_stream(
+            model_state=model_state,
+            text_to_generate=item["text"],
+            max_tokens=max_tokens,
+            frames_after_eos=parameters["frames_after_eos"],
+        )
+        item["output"].parent.mkdir(parents=True, exist_ok=True)
+        stream_audio_chunks(
+            item["output"],
+            count_samples(audio_chunks),
+            tts_model.sample_rate,
+            speed=parameters["speed"],
+        )
+    except Exception as e:
+        logger.error("Item %d (%s) failed: %s", item["index"], item["output"], e)
+        logger.debug(traceback.format_exc())
+        summary.update(status="error", error=str(e))
+        return summary
+
+    generation_time = time.perf_counter() - start
+    audio_duration = num_samples / tts_model.sample_rate / parameters["speed"]
+    summary.update(
+        status="ok",
+        audio_duration=audio_duration,
+        generation_time=generation_time,
+        rtf=generation_time / audio_duration if audio_duration > 0 else None,
+    )
+    return summary
+
+
+def run_batch(
+    tts_model: TTSModel,
+    items: list[dict],
+    num_workers: int = 1,
+    max_tokens: int = MAX_TOKEN_PER_CHUNK,
+    pin: bool = True,
+):
+    """Generates the items and yields their summaries as they are done, in any order.
+
+    With more than one worker, the workers are processes forked from this one once the
+    model is loaded, so they share its weights, and the model must be on the CPU. Each
+    worker is pinned to its own core if `pin` is set and the platform supports it.
+    """
+    if num_workers > 1 and not can_fork():
+        logger.warning("Worker processes need fork, which this platform lacks: using one.")
+        num_workers = 1
+    if num_workers <= 1:
+        for item in items:
+            yield generate_item(tts_model, item, max_tokens)
+        return
+
+    worker_items = split_items(items, num_workers)
+    for item, summary in forked_map(
+        partial(generate_item, tts_model, max_tokens=max_tokens), worker_items, pin=pin
+    ):
+        if summary is None:
+            summary = {
+                "index": item["index"],
+                "output": str(item["output"]),
+                "voice": item["parameters"]["voice"],
+                "status": "error",
+                "error": "worker process exited",
+            }
+        yield summary
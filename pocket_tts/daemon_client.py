@@ -0,0 +1,97 @@
+"""Client of `pocket-tts daemon`, which serves the HTTP API on a local Unix socket.
+
+Only the standard library is used, so that a short-lived process can ask the daemon for
+speech without importing torch or loading the model.
+"""
+
+import http.client
+import os
+import socket
+import urllib.parse
+from pathlib import Path
+
+
+def default_socket_path() -> Path:
+    """`$POCKET_TTS_SOCKET`, or the socket in a private directory of the pocket_tts cache."""
+    socket_path = os.environ.get("POCKET_TTS_SOCKET")
+    if socket_path:
+        return Path(socket_path)
+    return Path.home() / ".cache" / "pocket_tts" / "daemon" / "pocket-tts.sock"
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP connection over a Unix domain socket rather than TCP."""
+
+    def __init__(self, socket_path: Path, timeout: float | None = None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(str(self.socket_path))
+
+
+def daemon_is_running(socket_path: Path | None = None) -> bool:
+    """Whether a daemon answers on `socket_path`, the default socket if None."""
+    connection = UnixHTTPConnection(socket_path or default_socket_path(), timeout=2.0)
+    try:
+        connection.request("GET", "/health")
+        return connection.getresponse().status == 200
+    except OSError:
+        return False
+    finally:
+        connection.close()
+
+
+def generate_with_daemon(
+    text: str,
+    output,
+    voice: str | None = None,
+    persona: str | None = None,
+    response_format: str = "wav",
+    socket_path: Path | None = None,
+) -> bool:
+    """Writes the speech of `text` to the binary file `output` as the daemon generates it.
+
+    Args are the fields of the `/tts` endpoint, see `docs/serve.md`, with `voice` sent as
+    `voice_url`.
+
+    Returns:
+        False if no daemon listens on `socket_path` (the default socket if None), so that
+        the caller can generate the audio itself. Nothing is written to `output` then.
+
+    Raises:
+        RuntimeError: If the daemon rejects the request.
+    """
+    fields = {
+        "text": text,
+        "voice_url": voice,
+        "persona": persona,
+        "response_format": response_format,
+    }
+    body = urllib.parse.urlencode({key: value for key, value in fields.items() if value})
+    connection = UnixHTTPConnection(socket_path or default_socket_path())
+    try:
+        try:
+            connection.request(
+                "POST",
+                "/tts",
+                body=body,
+                headers={"Content-Type": "application/x-www-form-urlencoded"},
+            )
+            response = connection.getresponse()
+        except (FileNotFoundError, ConnectionRefusedError):
+            # No socket, or a socket left by a daemon that is not running anymore.
+            return False
+        if response.status != 200:
+            raise RuntimeError(
+                f"The daemon failed with status {response.status}: {response.read().decode()}"
+            )
+        while chunk := response.read1(64 * 1024):
+            output.write(chunk)
+            output.flush()
+        return True
+    finally:
+        connection.close()
@@ -1,8 +1,10 @@
 """
 Audio IO methods are defined in this module (info, read, write),
-We rely on av library for faster read when possible, otherwise on torchaudio.
+We rely on soundfile to read and to write the compressed formats. It is only imported
+when needed, WAV and PCM are written with the standard library.
 """
 
+import io
 import logging
 import os
 import sys
@@ -11,12 +13,11 @@ from contextlib import nullcontext
 from pathlib import Path
 from typing import Any
 
-import numpy as np
-import soundfile as sf
 import torch
-import torchaudio
 from beartype.typing import Iterator
 
+from pocket_tts.data.audio_utils import time_stretch_chunks
+
 logger = logging.getLogger(__name__)
 
 FIRST_CHUNK_LENGTH_SECONDS = float(os.environ.get("FIRST_CHUNK_LENGTH_SECONDS", "0"))
@@ -24,6 +25,8 @@ FIRST_CHUNK_LENGTH_SECONDS = float(os.environ.get("FIRST_CHUNK_LENGTH_SECONDS",
 
 def audio_read(filepath: str | Path) -> tuple[torch.Tensor, int]:
     """Read audio file using soundfile for maximum compatibility."""
+    import soundfile as sf
+
     filepath_str = str(filepath)
     try:
         data, sample_rate = sf.read(filepath_str, dtype="float32")
@@ -37,6 +40,11 @@ def audio_read(filepath: str | Path) -> tuple[torch.Tensor, int]:
         raise RuntimeError(f"Could not read audio file {filepath_str}. If it is a Git LFS pointer, ensure you have run 'git lfs pull'. Error: {e}")
 
 
+def to_pcm16_bytes(audio_chunk: torch.Tensor) -> bytes:
+    """Converts audio samples in [-1, 1] to 16-bit little-endian PCM."""
+    chunk_int16 = (audio_chunk.clamp(-1, 1) * 32767).short()
+    return chunk_int16.detach().cpu().numpy().astype("<i2").tobytes()
+
 
 class StreamingWAVWriter:
     """WAV writer using Python's standard library wave module."""
@@ -59,9 +67,7 @@ class StreamingWAVWriter:
 
     def write_pcm_data(self, audio_chunk: torch.Tensor):
         """Write PCM data using wave module."""
-        # Convert to int16 PCM bytes
-        chunk_int16 = (audio_chunk.clamp(-1, 1) * 32767).short()
-        chunk_bytes = chunk_int16.detach().cpu().numpy().tobytes()
+        chunk_bytes = to_pcm16_bytes(audio_chunk)
 
         if self.first_chunk_buffer is not None:
             self.first_chunk_buffer.append(chunk_bytes)
@@ -105,10 +111,160 @@ def is_file_like(obj):
     return all(hasattr(obj, attr) for attr in ["write", "close"])
 
 
+class StreamingPCMWriter:
+    """Headerless 16-bit little-endian mono PCM writer."""
+
+    def __init__(self, output_stream, sample_rate: int):
+        self.output_stream = output_stream
+        self.sample_rate = sample_rate
+
+    def write_header(self, sample_rate: int):
+        pass
+
+    def write_pcm_data(self, audio_chunk: torch.Tensor):
+        self.output_stream.write(to_pcm16_bytes(audio_chunk))
+
+    def finalize(self):
+        self.output_stream.flush()
+
+
+class StreamingSoundFileWriter:
+    """Compressed audio writer, encoding with libsndfile as the chunks arrive.
+
+    libsndfile needs a seekable and readable file, so it writes to a memory buffer and the
+    bytes are forwarded to the output as soon as they are encoded. The FLAC and MP3
+    encoders go back to rewrite the header and some frames when closing: this is done
+    again at the start of seekable outputs. Other outputs, e.g. HTTP responses, only get
+    these formats once the encoder is closed, while Ogg is only ever appended to and is
+    forwarded as it is encoded.
+    """
+
+    def __init__(self, output_stream, sample_rate: int, audio_format: str):
+        self.output_stream = output_stream
+        self.sample_rate = sample_rate
+        self.format, self.subtype = _SOUNDFILE_FORMATS[audio_format]
+        self._append_only = audio_format in _APPEND_ONLY_FORMATS
+        seekable = hasattr(output_stream, "seekable") and output_stream.seekable()
+        self._streaming = self._append_only or seekable
+        self.sound_file = None
+        self._buffer = io.BytesIO()
+        self._forwarded = 0
+
+    def write_header(self, sample_rate: int):
+        """Open the encoder, which writes the header along with the first samples."""
+        import soundfile as sf
+
+        self.sound_file = sf.SoundFile(
+            self._buffer,
+            mode="w",
+            samplerate=sample_rate,
+            channels=1,
+            format=self.format,
+            subtype=self.subtype,
+        )
+
+    def write_pcm_data(self, audio_chunk: torch.Tensor):
+        self.sound_file.write(audio_chunk.clamp(-1, 1).detach().cpu().numpy().astype("float32"))
+        if self._streaming:
+            self._forward()
+
+    def finalize(self):
+        self.sound_file.close()
+        if self._forwarded and not self._append_only:
+            # Rewrites what libsndfile changed when closing, the output is seekable.
+            self.output_stream.seek(0)
+            self._forwarded = 0
+        self._forward()
+
+    def _forward(self):
+        with self._buffer.getbuffer() as view:
+            data = bytes(view[self._forwarded :])
+        if data:
+            self.output_stream.write(data)
+            self._forwarded += len(data)
+
+
+# Streaming output formats, as named by `response_format` in the OpenAI API, and their media type.
+AUDIO_FORMATS = {
+    "wav": "audio/wav",
+    "pcm": "audio/pcm",
+    "flac": "audio/flac",
+    "opus": "audio/ogg",
+    "mp3": "audio/mpeg",
+}
+_SOUNDFILE_FORMATS = {
+    "flac": ("FLAC", "PCM_16"),
+    "opus": ("OGG", "OPUS"),
+    "mp3": ("MP3", "MPEG_LAYER_III"),
+}
+# Formats whose encoder never rewrites the bytes it already wrote.
+_APPEND_ONLY_FORMATS = {"opus"}
+_EXTENSION_FORMATS = {
+    ".wav": "wav",
+    ".pcm": "pcm",
+    ".raw": "pcm",
+    ".flac": "flac",
+    ".opus": "opus",
+    ".ogg": "opus",
+    ".mp3": "mp3",
+}
+
+
+def audio_format_from_path(path: str | Path) -> str:
+    """Output format for the extension of `path`, WAV for stdout and unknown extensions."""
+    return _EXTENSION_FORMATS.get(Path(path).suffix.lower(), "wav")
+
+
+def check_audio_format(audio_format: str):
+    """Raises a ValueError if `audio_format` cannot be written.
+
+    The compressed formats depend on the libsndfile version: Opus needs 1.0.29 and MP3 1.1.0.
+    """
+    if audio_format not in AUDIO_FORMATS:
+        raise ValueError(
+            f"Unsupported audio format '{audio_format}', "
+            f"expected one of: {', '.join(AUDIO_FORMATS)}"
+        )
+    if audio_format in _SOUNDFILE_FORMATS:
+        import soundfile as sf
+
+        container, subtype = _SOUNDFILE_FORMATS[audio_format]
+        if subtype not in sf.available_subtypes(container):
+            raise ValueError(
+                f"The installed libsndfile ({sf.__libsndfile_version__}) cannot encode "
+                f"'{audio_format}'"
+            )
+
+
+def create_audio_writer(output_stream, sample_rate: int, audio_format: str = "wav"):
+    """Streaming writer of `audio_format` (see `AUDIO_FORMATS`) to `output_stream`.
+
+    All the writers have the interface of `StreamingWAVWriter`.
+    """
+    check_audio_format(audio_format)
+    if audio_format == "wav":
+        return StreamingWAVWriter(output_stream, sample_rate)
+    if audio_format == "pcm":
+        return StreamingPCMWriter(output_stream, sample_rate)
+    return StreamingSoundFileWriter(output_stream, sample_rate, audio_format)
+
+
 def stream_audio_chunks(
-    path: str | Path | None | Any, audio_chunks: Iterator[torch.Tensor], sample_rate: int, speed: float = 1.0
+    path: str | Path | None | Any,
+    audio_chunks: Iterator[torch.Tensor],
+    sample_rate: int,
+    speed: float = 1.0,
+    audio_format: str | None = None,
 ):
-    """Stream audio chunks to a WAV file or stdout, optionally playing them."""
+    """Stream audio chunks to a file or stdout, optionally playing them.
+
+    The format is one of `AUDIO_FORMATS`, from the extension of `path` if not given. If
+    `speed` is not 1, the audio is time-stretched without changing its pitch.
+    """
+    if audio_format is None:
+        is_path = isinstance(path, (str, Path)) and path != "-"
+        audio_format = audio_format_from_path(path) if is_path else "wav"
+    check_audio_format(audio_format)
     if path == "-":
         f = sys.stdout.buffer
     elif path is None:
@@ -120,21 +276,14 @@ def stream_audio_chunks(
 
     with f:
         if path is not None:
-            writer = StreamingWAVWriter(f, sample_rate)
+            writer = create_audio_writer(f, sample_rate, audio_format)
             writer.write_header(sample_rate)
 
-        if speed != 1.0:
-            import torchaudio.functional as F_audio
-            # If speed is not 1.0, we need to accumulate all chunks, resample, and then write.
-            full_audio = torch.cat(list(audio_chunks), dim=0)
-            resampled_audio = F_audio.speed(full_audio.unsqueeze(0), speed, 1000)[0]
+        # The time-stretch is streamed too, with a latency of about 20 ms.
+        for chunk in time_stretch_chunks(audio_chunks, sample_rate, speed):
+            # Then write to file
             if path is not None:
-                writer.write_pcm_data(resampled_audio)
-        else:
-            for chunk in audio_chunks:
-                # Then write to file
-                if path is not None:
-                    writer.write_pcm_data(chunk)
+                writer.write_pcm_data(chunk)
 
         if path is not None:
             writer.finalize()
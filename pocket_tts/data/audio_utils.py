@@ -1,8 +1,9 @@
 """Various utilities for audio conversion (pcm format, sample rate and channels),
-and volume normalization."""
+volume normalization and time-stretch."""
 
 import torch
-from scipy.signal import resample_poly
+import torch.nn.functional as F
+from beartype.typing import Iterator
 
 
 def convert_audio(
@@ -10,6 +11,9 @@ def convert_audio(
 ) -> torch.Tensor:
     """Convert audio to new sample rate and number of audio channels."""
     if from_rate != to_rate:
+        # scipy is slow to import and only needed for the audio prompts.
+        from scipy.signal import resample_poly
+
         # Convert to numpy for scipy resampling
         wav_np = wav.detach().cpu().numpy()
 
@@ -26,3 +30,139 @@ def convert_audio(
 
     assert wav.shape[-2] == to_channels
     return wav
+
+
+class StreamingTimeStretch:
+    """Pitch-preserving time-stretch of a stream of audio chunks, with WSOLA.
+
+    Waveform similarity overlap-add: windows of input taken every `speed * hop` samples are
+    added every `hop` samples of output. Each window is moved by up to `tolerance` samples
+    to best continue the previous one, which avoids the phase jumps of a plain overlap-add.
+    Only the input needed by the next windows is kept, and the output lags the input by
+    about one window.
+
+    Args:
+        sample_rate (int): Sample rate of the audio.
+        speed (float): Playback speed, 2.0 makes the audio twice shorter.
+        frame_seconds (float): Length of the windows.
+        tolerance_seconds (float): Maximum shift of a window, should cover half a pitch period.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        speed: float,
+        frame_seconds: float = 0.02,
+        tolerance_seconds: float = 0.0075,
+    ):
+        if speed <= 0:
+            raise ValueError(f"speed must be positive, got {speed}")
+        self.speed = speed
+        self.hop = max(1, round(sample_rate * frame_seconds / 2))
+        self.frame_length = 2 * self.hop
+        self.tolerance = round(sample_rate * tolerance_seconds)
+        # Two periodic Hann windows overlapping by half sum to one.
+        self.window = torch.hann_window(self.frame_length, periodic=True)
+
+        self._input = torch.zeros(0)
+        self._input_start = 0  # Position of `_input[0]` in the whole input.
+        self._input_length = 0
+        self._frame = 0
+        self._previous = None  # Position of the previous window in the whole input.
+        self._overlap = torch.zeros(self.hop)
+        self._held = torch.zeros(0)  # Output past the length of the input stretched so far.
+        self._output_length = 0
+
+    def process(self, audio_chunk: torch.Tensor) -> torch.Tensor:
+        """Adds a chunk of input and returns the output that is complete, maybe empty."""
+        audio_chunk = audio_chunk.reshape(-1).float().cpu()
+        self._input = torch.cat([self._input, audio_chunk])
+        self._input_length += audio_chunk.shape[0]
+        return self._emit(torch.cat([self._held, self._synthesize(final=False)]))
+
+    def flush(self) -> torch.Tensor:
+        """Returns the rest of the output, once all the input was processed."""
+        output = self._emit(torch.cat([self._held, self._synthesize(final=True), self._overlap]))
+        self._overlap = torch.zeros(self.hop)
+        self._held = torch.zeros(0)
+        return output
+
+    def _emit(self, output: torch.Tensor) -> torch.Tensor:
+        """Returns the part of `output` within the length of the input stretched so far.
+
+        The windows read ahead of the output they make, so at high speeds the output can
+        get past this length, the rest is held until more input comes.
+        """
+        length = max(0, round(self._input_length / self.speed) - self._output_length)
+        output, self._held = output[:length], output[length:]
+        self._output_length += output.shape[0]
+        return output
+
+    def _synthesize(self, final: bool) -> torch.Tensor:
+        outputs = []
+        while True:
+            nominal = round(self._frame * self.hop * self.speed)
+            if final and nominal >= self._input_length:
+                break
+            end = nominal + self.tolerance + self.frame_length
+            if self._previous is not None:
+                end = max(end, self._previous + self.hop + self.frame_length)
+            available = self._input_start + self._input.shape[0]
+            if end > available:
+                if not final:
+                    break
+                # The last windows are completed with silence.
+                self._input = torch.cat([self._input, torch.zeros(end - available)])
+
+            position = self._best_position(nominal)
+            start = position - self._input_start
+            segment = self._input[start : start + self.frame_length]
+            if self._previous is None:
+                # Nothing to fade from, the start of the input is kept as is.
+                outputs.append(segment[: self.hop].clone())
+            else:
+                outputs.append(self._overlap + segment[: self.hop] * self.window[: self.hop])
+            self._overlap = segment[self.hop :] * self.window[self.hop :]
+            self._previous = position
+            self._frame += 1
+
+            # Drops the input that no later window can use.
+            next_nominal = round(self._frame * self.hop * self.speed)
+            keep_from = min(next_nominal - self.tolerance, position + self.hop)
+            if keep_from > self._input_start:
+                self._input = self._input[keep_from - self._input_start :]
+                self._input_start = keep_from
+
+        return torch.cat(outputs) if outputs else torch.zeros(0)
+
+    def _best_position(self, nominal: int) -> int:
+        """Window position close to `nominal` most similar to the continuation of the previous."""
+        if self._previous is None:
+            return nominal
+        low = max(nominal - self.tolerance, self._input_start)
+        high = nominal + self.tolerance
+        template_start = self._previous + self.hop - self._input_start
+        template = self._input[template_start : template_start + self.frame_length]
+        candidates = self._input[
+            low - self._input_start : high - self._input_start + self.frame_length
+        ]
+        correlation = F.conv1d(candidates[None, None], template[None, None])[0, 0]
+        energy = F.conv1d(candidates[None, None] ** 2, torch.ones(1, 1, self.frame_length))[0, 0]
+        return low + int(torch.argmax(correlation / (energy + 1e-8).sqrt()))
+
+
+def time_stretch_chunks(
+    audio_chunks: Iterator[torch.Tensor], sample_rate: int, speed: float
+) -> Iterator[torch.Tensor]:
+    """Time-stretches a stream of audio chunks, see `StreamingTimeStretch`."""
+    if speed == 1.0:
+        yield from audio_chunks
+        return
+    time_stretch = StreamingTimeStretch(sample_rate, speed)
+    for audio_chunk in audio_chunks:
+        output = time_stretch.process(audio_chunk)
+        if output.shape[0] > 0:
+            yield output
+    output = time_stretch.flush()
+    if output.shape[0] > 0:
+        yield output
@@ -6,3 +6,5 @@ DEFAULT_NOISE_CLAMP = None
 DEFAULT_EOS_THRESHOLD = -4.0
 DEFAULT_FRAMES_AFTER_EOS = None
 MAX_TOKEN_PER_CHUNK = 50
+DEFAULT_VOICE_CACHE_MB = 256
+QUANTIZATION_MODES = ("int8",)
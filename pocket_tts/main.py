@@ -1,11 +1,9 @@
-import io
+import json
 import logging
 import os
 import sys
-import tempfile
-import threading
+import time
 from pathlib import Path
-from queue import Queue
 
 # Disable SSL verification for corporate firewalls
 # Add project root's 'tools' directory to path to import the patch
@@ -22,16 +20,10 @@ if tools_dir.is_dir():
         pass  # Patch file not present, continue without it
 
 import typer
-import uvicorn
-from fastapi import FastAPI, File, Form, HTTPException, UploadFile, Request
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse, StreamingResponse
-from pydantic import BaseModel
 from typing_extensions import Annotated
 
-from pocket_tts.personas import load_persona, list_personas
-
-from pocket_tts.data.audio import stream_audio_chunks
+# Only the light modules are imported here, `pocket-tts list-personas` must not wait for
+# torch. The commands import the model, the audio IO and the server when they run.
 from pocket_tts.default_parameters import (
     DEFAULT_AUDIO_PROMPT,
     DEFAULT_EOS_THRESHOLD,
@@ -40,11 +32,12 @@ from pocket_tts.default_parameters import (
     DEFAULT_NOISE_CLAMP,
     DEFAULT_TEMPERATURE,
     DEFAULT_VARIANT,
+    DEFAULT_VOICE_CACHE_MB,
     MAX_TOKEN_PER_CHUNK,
+    QUANTIZATION_MODES,
 )
-from pocket_tts.models.tts_model import TTSModel
+from pocket_tts.personas import list_personas, load_persona, resolve_generation_parameters
 from pocket_tts.utils.logging_utils import enable_logging
-from pocket_tts.utils.utils import PREDEFINED_VOICES, size_of_dict
 
 logger = logging.getLogger(__name__)
 
@@ -53,250 +46,11 @@ cli_app = typer.Typer(
 )
 
 
-# ------------------------------------------------------
-# The pocket-tts server implementation
-# ------------------------------------------------------
-
-# Global model instance
-tts_model: TTSModel | None = None
-global_model_state = None
-
-web_app = FastAPI(
-    title="Kyutai Pocket TTS API", description="Text-to-Speech generation API", version="1.0.0"
-)
-web_app.add_middleware(
-    CORSMiddleware,
-    allow_origins=[
-        "http://localhost:3000",
-        "https://pod1-10007.internal.kyutai.org",
-        "https://kyutai.org",
-    ],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-
-class SpeechRequest(BaseModel):
-    model: str = "pocket-tts"
-    input: str
-    voice: str | None = None
-    persona: str | None = None
-    response_format: str = "wav"
-    speed: float = 1.0
-
-
-@web_app.get("/")
-async def root():
-    """Serve the frontend."""
-    static_path = Path(__file__).parent / "static" / "index.html"
-    return FileResponse(static_path)
-
-
-@web_app.get("/health")
-async def health():
-    return {"status": "healthy"}
-
-
-@web_app.post("/v1/audio/speech")
-async def openai_speech(request: SpeechRequest):
-    """OpenAI-compatible TTS endpoint."""
-    if not request.input.strip():
-        raise HTTPException(status_code=400, detail="Input cannot be empty")
-
-    persona_data = {}
-    if request.persona:
-        try:
-            persona_data = load_persona(request.persona)
-        except FileNotFoundError:
-            raise HTTPException(status_code=400, detail=f"Persona '{request.persona}' not found.")
-
-    final_voice = request.voice if request.voice is not None else persona_data.get("voice")
-
-    if not final_voice:
-        project_dir = Path(__file__).parent.parent
-        current_voice_path = project_dir / ".current_voice"
-        if current_voice_path.exists():
-            final_voice = current_voice_path.read_text().strip()
-        else:
-            final_voice = DEFAULT_AUDIO_PROMPT
-    
-    # Use azelma as a fallback default if no voice is found
-    if not final_voice:
-        final_voice = "azelma"
-
-    model_state = tts_model._cached_get_state_for_audio_prompt(final_voice)
-
-    return StreamingResponse(
-        generate_data_with_state(request.input, model_state),
-        media_type="audio/wav",
-    )
-
-
-def write_to_queue(queue, text_to_generate, model_state):
-    """Allows writing to the StreamingResponse as if it were a file."""
-
-    class FileLikeToQueue(io.IOBase):
-        def __init__(self, queue):
-            self.queue = queue
-
-        def write(self, data):
-            self.queue.put(data)
-
-        def flush(self):
-            pass
-
-        def close(self):
-            self.queue.put(None)
-
-    audio_chunks = tts_model.generate_audio_stream(
-        model_state=model_state, text_to_generate=text_to_generate
-    )
-    stream_audio_chunks(FileLikeToQueue(queue), audio_chunks, tts_model.config.mimi.sample_rate)
-
-
-def generate_data_with_state(text_to_generate: str, model_state: dict):
-    queue = Queue()
-
-    # Run your function in a thread
-    thread = threading.Thread(target=write_to_queue, args=(queue, text_to_generate, model_state))
-    thread.start()
-
-    # Yield data as it becomes available
-    i = 0
-    while True:
-        data = queue.get()
-        if data is None:
-            break
-        i += 1
-        yield data
-
-    thread.join()
-
-
-@web_app.post("/tts")
-def text_to_speech(
-    text: str = Form(...),
-    voice_url: str | None = Form(None),
-    voice_wav: UploadFile | None = File(None),
-    persona: str | None = Form(None),
-):
-    """
-    Generate speech from text using the pre-loaded voice prompt or a custom voice.
-
-    Args:
-        text: Text to convert to speech
-        voice_url: Optional voice URL (http://, https://, or hf://)
-        voice_wav: Optional uploaded voice file (mutually exclusive with voice_url)
-        persona: Optional persona name
-    """
-    if not text.strip():
-        raise HTTPException(status_code=400, detail="Text cannot be empty")
-
-    if voice_url is not None and voice_wav is not None:
-        raise HTTPException(status_code=400, detail="Cannot provide both voice_url and voice_wav")
-
-    persona_data = {}
-    if persona:
-        try:
-            persona_data = load_persona(persona)
-        except FileNotFoundError:
-            raise HTTPException(status_code=400, detail=f"Persona '{persona}' not found.")
-
-    final_voice_url = voice_url if voice_url is not None else persona_data.get("voice")
-
-    # Use the appropriate model state
-    if final_voice_url is not None:
-        # If the voice is a simple name (no path separators), search for it in the tts-voices directory
-        if "/" not in final_voice_url and "\\" not in final_voice_url:
-            voices_dir = Path(__file__).parent.parent / "tts-voices"
-            found_voice = None
-            
-            # 1. Search for .safetensors first (most efficient and reliable)
-            for f in voices_dir.glob(f"**/{final_voice_url}*.safetensors"):
-                if f.is_file() and f.stat().st_size > 1000: # Skip LFS pointers
-                    found_voice = f
-                    break
-            
-            # 2. Fallback to audio files only if no safetensors found
-            if not found_voice:
-                for ext in ["wav", "mp3", "flac", "ogg", "aiff"]:
-                    for f in voices_dir.glob(f"**/{final_voice_url}.{ext}"):
-                        if f.is_file() and f.stat().st_size > 1000:
-                            found_voice = f
-                            break
-                    if found_voice:
-                        break
-            
-            if found_voice:
-                final_voice_url = str(found_voice)
-                logging.info(f"Found voice file '{final_voice_url}'")
-
-        voice_path = Path(final_voice_url)
-        if voice_path.is_dir():
-            logging.info(f"'{final_voice_url}' is a directory, searching for voice file.")
-            # If a directory is provided, find the first suitable file
-            found_voice = None
-            # Try audio files first
-            for ext in ["wav", "mp3", "flac", "ogg", "aiff"]:
-                files = sorted([f for f in voice_path.glob(f"*.{ext}") if f.stat().st_size > 1000])
-                if files:
-                    found_voice = files[0]
-                    break
-            
-            # Then safetensors
-            if not found_voice:
-                files = sorted([f for f in voice_path.glob("*.safetensors") if f.stat().st_size > 1000])
-                if files:
-                    found_voice = files[0]
-            
-            if found_voice:
-                final_voice_url = str(found_voice)
-                logging.info(f"Found voice file '{final_voice_url}'")
-            else:
-                raise HTTPException(
-                    status_code=404,
-                    detail=f"No supported voice file found in directory '{final_voice_url}' (found files may be Git LFS pointers)"
-                )
-
-        is_url = final_voice_url.startswith(("http://", "https://", "hf://"))
-        is_predefined = final_voice_url in PREDEFINED_VOICES
-        # Path.is_file() handles the check for existence.
-        is_file = Path(final_voice_url).is_file()
-
-        if not (is_url or is_predefined or is_file):
-            raise HTTPException(
-                status_code=400,
-                detail=f"Voice '{final_voice_url}' not found. It must be a valid URL, a predefined voice name, a local file path, or a directory containing a voice file."
-            )
-        model_state = tts_model._cached_get_state_for_audio_prompt(final_voice_url)
-        logging.warning("Using voice: %s", final_voice_url)
-    elif voice_wav is not None:
-        # Use uploaded voice file - preserve extension for format detection
-        suffix = Path(voice_wav.filename).suffix if voice_wav.filename else ".wav"
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
-            content = voice_wav.file.read()
-            temp_file.write(content)
-            temp_file.flush()
-            temp_file_path = temp_file.name
-
-        # Close the file before reading it back (required on Windows)
-        try:
-            model_state = tts_model.get_state_for_audio_prompt(Path(temp_file_path), truncate=True)
-        finally:
-            os.unlink(temp_file_path)
-    else:
-        # Use default global model state
-        model_state = global_model_state
-
-    return StreamingResponse(
-        generate_data_with_state(text, model_state),
-        media_type="audio/wav",
-        headers={
-            "Content-Disposition": "attachment; filename=generated_speech.wav",
-            "Transfer-Encoding": "chunked",
-        },
-    )
+def check_quantization(quantize: str | None) -> str | None:
+    """Rejects an unsupported `--quantize` before the model is loaded."""
+    if quantize is not None and quantize not in QUANTIZATION_MODES:
+        raise typer.BadParameter(f"expected one of: {', '.join(QUANTIZATION_MODES)}")
+    return quantize
 
 
 @cli_app.command()
@@ -313,17 +67,132 @@ def serve(
             help="Path to locally-saved model config .yaml file or model variant signature"
         ),
     ] = DEFAULT_VARIANT,
+    max_batch_size: Annotated[
+        int,
+        typer.Option(
+            help="Maximum number of concurrent requests generated together in one batch. "
+            "Use 0 to generate each request in its own thread."
+        ),
+    ] = 4,
+    voice_cache_mb: Annotated[
+        int, typer.Option(help="Memory budget of the voice states kept in the cache, in MB.")
+    ] = DEFAULT_VOICE_CACHE_MB,
+    voice_cache_dir: Annotated[
+        Path,
+        typer.Option(
+            help="Directory where the voice states evicted from the cache are stored, "
+            "so that they are loaded back without prompting the model again."
+        ),
+    ] = None,
+    quantize: Annotated[
+        str | None,
+        typer.Option(
+            help="Quantize the linear layers to make the generation faster on the CPU: int8.",
+            callback=check_quantization,
+        ),
+    ] = None,
+    compile_step: Annotated[
+        bool,
+        typer.Option(
+            help="Compile the generation step with torch.compile. The first generation takes "
+            "longer, the compiled kernels are cached in ~/.cache/pocket_tts/inductor."
+        ),
+    ] = False,
 ):
     """Start the FastAPI server."""
+    from pocket_tts.server import start_server
+
+    start_server(
+        voice,
+        host,
+        port,
+        reload,
+        config,
+        max_batch_size,
+        voice_cache_mb,
+        voice_cache_dir,
+        quantize,
+        compile_step,
+    )
 
-    global tts_model, global_model_state
-    tts_model = TTSModel.load_model(config)
-
-    # Pre-load the voice prompt
-    global_model_state = tts_model.get_state_for_audio_prompt(voice)
-    logger.info(f"The size of the model state is {size_of_dict(global_model_state) // 1e6} MB")
 
-    uvicorn.run("pocket_tts.main:web_app", host=host, port=port, reload=reload)
+@cli_app.command()
+def daemon(
+    voice: Annotated[
+        str, typer.Option(help="Voice prompted at startup, used when a request has none")
+    ] = DEFAULT_AUDIO_PROMPT,
+    socket_path: Annotated[
+        Path,
+        typer.Option(
+            help="Unix socket to listen on (default: $POCKET_TTS_SOCKET, or "
+            "~/.cache/pocket_tts/daemon/pocket-tts.sock)"
+        ),
+    ] = None,
+    config: Annotated[
+        str,
+        typer.Option(
+            help="Path to locally-saved model config .yaml file or model variant signature"
+        ),
+    ] = DEFAULT_VARIANT,
+    max_batch_size: Annotated[
+        int,
+        typer.Option(
+            help="Maximum number of concurrent requests generated together in one batch. "
+            "Use 0 to generate each request in its own thread."
+        ),
+    ] = 4,
+    voice_cache_mb: Annotated[
+        int, typer.Option(help="Memory budget of the voice states kept in the cache, in MB.")
+    ] = DEFAULT_VOICE_CACHE_MB,
+    voice_cache_dir: Annotated[
+        Path,
+        typer.Option(
+            help="Directory where the voice states evicted from the cache are stored, "
+            "so that they are loaded back without prompting the model again."
+        ),
+    ] = None,
+    quantize: Annotated[
+        str | None,
+        typer.Option(
+            help="Quantize the linear layers to make the generation faster on the CPU: int8.",
+            callback=check_quantization,
+        ),
+    ] = None,
+    compile_step: Annotated[
+        bool,
+        typer.Option(
+            help="Compile the generation step with torch.compile. The first generation takes "
+            "longer, the compiled kernels are cached in ~/.cache/pocket_tts/inductor."
+        ),
+    ] = False,
+):
+    """Keep the model loaded behind a local Unix socket, for pocket-say and the MCP server."""
+    from pocket_tts.daemon_client import daemon_is_running, default_socket_path
+    from pocket_tts.server import start_server
+
+    socket_path = socket_path or default_socket_path()
+    # Binding the socket would replace the one of the running daemon.
+    if daemon_is_running(socket_path):
+        logger.error("A daemon is already running on %s", socket_path)
+        raise typer.Exit(code=1)
+    # The socket itself is only accessible by the user, whatever the directory.
+    socket_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    try:
+        start_server(
+            voice,
+            "localhost",
+            0,
+            False,
+            config,
+            max_batch_size,
+            voice_cache_mb,
+            voice_cache_dir,
+            quantize,
+            compile_step,
+            uds=socket_path,
+        )
+    finally:
+        socket_path.unlink(missing_ok=True)
 
 
 @cli_app.command(name="list-personas")
@@ -377,14 +246,32 @@ def generate(
         int, typer.Option(help="Number of frames to generate after EOS")
     ] = None,
     output_path: Annotated[
-        str, typer.Option(help="Output path for generated audio")
+        str,
+        typer.Option(
+            help="Output path for generated audio, its extension selects the format: "
+            ".wav, .flac, .opus or .ogg, .mp3, .pcm or .raw (headerless)."
+        ),
     ] = "./tts_output.wav",
     device: Annotated[str, typer.Option(help="Device to use")] = "cpu",
     max_tokens: Annotated[
         int, typer.Option(help="Maximum number of tokens per chunk.")
     ] = MAX_TOKEN_PER_CHUNK,
+    quantize: Annotated[
+        str | None,
+        typer.Option(
+            help="Quantize the linear layers to make the generation faster on the CPU: int8.",
+            callback=check_quantization,
+        ),
+    ] = None,
 ):
     """Generate speech using Kyutai Pocket TTS."""
+    from pocket_tts.data.audio import (
+        audio_format_from_path,
+        check_audio_format,
+        stream_audio_chunks,
+    )
+    from pocket_tts.models.tts_model import TTSModel
+
     # Load persona data if specified
     persona_data = {}
     if persona:
@@ -393,16 +280,28 @@ def generate(
         except FileNotFoundError as e:
             logger.error(e)
             raise typer.Exit(code=1)
+    if output_path != "-":
+        try:
+            check_audio_format(audio_format_from_path(output_path))
+        except ValueError as e:
+            logger.error(e)
+            raise typer.Exit(code=1)
 
     # Determine final parameters with precedence: CLI > persona > default
-    final_voice = voice if voice is not None else persona_data.get("voice", DEFAULT_AUDIO_PROMPT)
-    final_lsd_decode_steps = lsd_decode_steps if lsd_decode_steps is not None else persona_data.get("lsd_decode_steps", DEFAULT_LSD_DECODE_STEPS)
-    final_temperature = temperature if temperature is not None else persona_data.get("temperature", DEFAULT_TEMPERATURE)
-    final_speed = speed if speed is not None else persona_data.get("speed", 1.0)
-    final_noise_clamp = noise_clamp if noise_clamp is not None else persona_data.get("noise_clamp", DEFAULT_NOISE_CLAMP)
-    final_eos_threshold = eos_threshold if eos_threshold is not None else persona_data.get("eos_threshold", DEFAULT_EOS_THRESHOLD)
-    final_frames_after_eos = frames_after_eos if frames_after_eos is not None else persona_data.get("frames_after_eos", DEFAULT_FRAMES_AFTER_EOS)
+    parameters = resolve_generation_parameters(
+        persona_data,
+        voice=voice,
+        lsd_decode_steps=lsd_decode_steps,
+        temperature=temperature,
+        speed=speed,
+        noise_clamp=noise_clamp,
+        eos_threshold=eos_threshold,
+        frames_after_eos=frames_after_eos,
+    )
 
+    if quantize is not None and device != "cpu":
+        logger.error("Quantized models only run on the cpu.")
+        raise typer.Exit(code=1)
     if "cuda" in device:
         # Cuda graphs capturing does not play nice with multithreading.
         os.environ["NO_CUDA_GRAPH"] = "1"
@@ -410,20 +309,27 @@ def generate(
     log_level = logging.ERROR if quiet else logging.INFO
     with enable_logging("pocket_tts", log_level):
         tts_model = TTSModel.load_model(
-            config, final_temperature, final_lsd_decode_steps, final_noise_clamp, final_eos_threshold
+            config,
+            parameters["temperature"],
+            parameters["lsd_decode_steps"],
+            parameters["noise_clamp"],
+            parameters["eos_threshold"],
+            quantize=quantize,
         )
         tts_model.to(device)
 
-        model_state_for_voice = tts_model.get_state_for_audio_prompt(final_voice)
+        model_state_for_voice = tts_model.get_state_for_audio_prompt(parameters["voice"])
         # Stream audio generation directly to file or stdout
         audio_chunks = tts_model.generate_audio_stream(
             model_state=model_state_for_voice,
             text_to_generate=text,
-            frames_after_eos=final_frames_after_eos,
+            frames_after_eos=parameters["frames_after_eos"],
             max_tokens=max_tokens,
         )
 
-        stream_audio_chunks(output_path, audio_chunks, tts_model.config.mimi.sample_rate, speed=final_speed)
+        stream_audio_chunks(
+            output_path, audio_chunks, tts_model.config.mimi.sample_rate, speed=parameters["speed"]
+        )
 
         # Only print the result message if not writing to stdout
         if output_path != "-":
@@ -437,6 +343,116 @@ def generate(
         )
 
 
+# ------------------------------------------------------
+# The pocket-tts batch generation CLI implementation
+# ------------------------------------------------------
+
+
+@cli_app.command()
+def batch(
+    manifest: Annotated[
+        Path,
+        typer.Argument(
+            help="JSONL or CSV file with one utterance per row: text, output, and optionally "
+            "voice, persona and the generation parameters of `generate`."
+        ),
+    ],
+    output_dir: Annotated[
+        Path, typer.Option(help="Directory against which relative output paths are resolved")
+    ] = Path("."),
+    summary_path: Annotated[
+        Path,
+        typer.Option(
+            help="Where to write the JSONL summary of the items, with their real-time factor "
+            "(default: <output-dir>/<manifest name>.summary.jsonl)"
+        ),
+    ] = None,
+    workers: Annotated[int, typer.Option(help="Number of worker processes")] = 1,
+    pin_workers: Annotated[
+        bool, typer.Option(help="Pin each worker process to its own CPU core")
+    ] = True,
+    quiet: Annotated[bool, typer.Option("-q", "--quiet", help="Disable logging output")] = False,
+    config: Annotated[
+        str, typer.Option(help="Model signature or path to config .yaml file")
+    ] = DEFAULT_VARIANT,
+    device: Annotated[str, typer.Option(help="Device to use")] = "cpu",
+    max_tokens: Annotated[
+        int, typer.Option(help="Maximum number of tokens per chunk.")
+    ] = MAX_TOKEN_PER_CHUNK,
+    quantize: Annotated[
+        str | None,
+        typer.Option(
+            help="Quantize the linear layers to make the generation faster on the CPU: int8.",
+            callback=check_quantization,
+        ),
+    ] = None,
+    compile_step: Annotated[
+        bool,
+        typer.Option(
+            help="Compile the generation step with torch.compile. The first generation takes "
+            "longer, the compiled kernels are cached in ~/.cache/pocket_tts/inductor."
+        ),
+    ] = False,
+):
+    """Generate many utterances from a manifest, loading the model once."""
+    from pocket_tts.batch import read_manifest, run_batch
+    from pocket_tts.models.tts_model import TTSModel
+
+    if workers > 1 and device != "cpu":
+        logger.error("Several workers are only supported on the cpu.")
+        raise typer.Exit(code=1)
+    if quantize is not None and device != "cpu":
+        logger.error("Quantized models only run on the cpu.")
+        raise typer.Exit(code=1)
+    if "cuda" in device:
+        # Cuda graphs capturing does not play nice with multithreading.
+        os.environ["NO_CUDA_GRAPH"] = "1"
+    if summary_path is None:
+        summary_path = output_dir / f"{manifest.stem}.summary.jsonl"
+
+    log_level = logging.ERROR if quiet else logging.INFO
+    with enable_logging("pocket_tts", log_level):
+        try:
+            items = read_manifest(manifest, output_dir)
+        except (OSError, ValueError) as e:
+            logger.error(e)
+            raise typer.Exit(code=1)
+
+        tts_model = TTSModel.load_model(config, quantize=quantize, compile_step=compile_step)
+        tts_model.to(device)
+
+        start = time.perf_counter()
+        summaries = []
+        for summary in run_batch(tts_model, items, workers, max_tokens, pin=pin_workers):
+            summaries.append(summary)
+            logger.info(
+                "[%d/%d] %s: %s", len(summaries), len(items), summary["output"], summary["status"]
+            )
+        wall_time = time.perf_counter() - start
+
+        summaries.sort(key=lambda summary: summary["index"])
+        summary_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(summary_path, "w", encoding="utf-8") as f:
+            for summary in summaries:
+                f.write(json.dumps(summary) + "\n")
+
+        failures = sum(summary["status"] != "ok" for summary in summaries)
+        audio_duration = sum(summary.get("audio_duration", 0.0) for summary in summaries)
+        logger.info(
+            "Generated %d items (%d failed), %.1fs of audio in %.1fs with %d workers "
+            "(aggregate RTF %.3f). Summary written in %s",
+            len(summaries) - failures,
+            failures,
+            audio_duration,
+            wall_time,
+            workers,
+            wall_time / audio_duration if audio_duration > 0 else float("nan"),
+            summary_path,
+        )
+        if failures:
+            raise typer.Exit(code=1)
+
+
 # ----------------------------------------------
 # export audio to safetensors CLI implementation
 # ----------------------------------------------
@@ -451,6 +467,25 @@ def export_voice(
     truncate: Annotated[
         bool, typer.Option("-tr", "--truncate", help="Truncate long audio")
     ] = False,
+    save_state: Annotated[
+        bool,
+        typer.Option(
+            "--save-state",
+            help="Also store the prompted model state, so that loading the voice does not "
+            "run the model over the audio again. Only valid for the model it was exported with.",
+        ),
+    ] = False,
+    workers: Annotated[
+        int, typer.Option(help="Number of worker processes exporting a directory in parallel")
+    ] = 1,
+    force: Annotated[
+        bool,
+        typer.Option(
+            "--force",
+            help="Export again the voices whose output is already up to date with the audio "
+            "and the model.",
+        ),
+    ] = False,
     quiet: Annotated[bool, typer.Option("-q", "--quiet", help="Disable logging output")] = False,
     config: Annotated[str, typer.Option(help="Model config path or signature")] = DEFAULT_VARIANT,
     lsd_decode_steps: Annotated[
@@ -469,6 +504,9 @@ def export_voice(
     """Convert and save audio to .safetensors file"""
     import re
 
+    from pocket_tts.models.tts_model import TTSModel
+    from pocket_tts.utils.utils import can_fork, forked_map
+
     def url(path):
         return path.startswith(("http:", "https:", "hf:"))
 
@@ -482,8 +520,9 @@ def export_voice(
     def likely_dir(path):
         return not url(path) and (path.endswith(("/", "\\")) or path == ".")
 
-    def convert_one(in_path, out_path, join_path):
-        """helper convert function"""
+    def convert_one(task):
+        """helper convert function, returns whether the voice was exported, skipped or failed"""
+        in_path, out_path, join_path = task
         voice = in_path.stem
         if url(str(in_path)):
             in_path = normalize_url(str(in_path))
@@ -492,20 +531,29 @@ def export_voice(
         else:
             # ensure output file has correct extension
             out_path = out_path.with_suffix(".safetensors")
+        if (
+            not force
+            and isinstance(in_path, Path)
+            and tts_model._is_export_current(in_path, out_path, truncate, save_state)
+        ):
+            logger.info(f"⏭️ Voice '{voice}' is up to date in '{out_path}'")
+            return "skipped"
         try:
-            tts_model.save_audio_prompt(in_path, out_path, truncate)
+            tts_model.save_audio_prompt(in_path, out_path, truncate, save_state=save_state)
         except Exception as e:
             logger.error(f"❌ Unable to export voice '{in_path}': {e}")
-            return False
+            return "failed"
         logger.info(f"✅ Successfully exported voice '{voice}' to '{out_path}'")
-        return True
+        return "exported"
 
     if "cuda" in device:
         # Cuda graphs capturing does not play nice with multithreading.
         os.environ["NO_CUDA_GRAPH"] = "1"
+    if workers > 1 and (device != "cpu" or not can_fork()):
+        logger.warning("Several workers need the cpu and a platform with fork: using one.")
+        workers = 1
 
     log_level = logging.ERROR if quiet else logging.INFO
-    success_count = 0
 
     with enable_logging("pocket_tts", log_level):
         tts_model = TTSModel.load_model(
@@ -526,25 +574,48 @@ def export_voice(
             if not likely_dir(export_path):
                 # batch convert, output path must be directory, not file
                 out_path = Path("./")
-            for path in Path(in_path).iterdir():
-                if path.is_file() and path.suffix.lower() in [
-                    ".wav",
-                    ".mp3",
-                    ".flac",
-                    ".ogg",
-                    ".aiff",
-                ]:
-                    if convert_one(path, out_path, True):
-                        success_count += 1
+            tasks = [
+                (path, out_path, True)
+                for path in sorted(Path(in_path).iterdir())
+                if path.is_file()
+                and path.suffix.lower() in [".wav", ".mp3", ".flac", ".ogg", ".aiff"]
+            ]
         else:  # convert single file
             if likely_file(audio_path) and not in_path.exists():
                 logger.error(f"Input file '{in_path}'' does not exists")
                 exit(1)
-            if convert_one(in_path, out_path, likely_dir(export_path)):
-                success_count += 1
+            tasks = [(in_path, out_path, likely_dir(export_path))]
+
+        start = time.perf_counter()
+        if workers > 1 and len(tasks) > 1:
+            # Forked after the model is loaded, the workers share its weights. The largest
+            # files are dealt first, to the least loaded worker.
+            task_lists = [[] for _ in range(min(workers, len(tasks)))]
+            loads = [0] * len(task_lists)
+            for task in sorted(tasks, key=lambda task: -task[0].stat().st_size):
+                worker = loads.index(min(loads))
+                task_lists[worker].append(task)
+                loads[worker] += task[0].stat().st_size
+            statuses = [status or "failed" for _, status in forked_map(convert_one, task_lists)]
+        else:
+            statuses = [convert_one(task) for task in tasks]
+        elapsed = time.perf_counter() - start
 
+        success_count = statuses.count("exported")
+        skipped_count = statuses.count("skipped")
         if success_count > 0:
             logger.info(f"🎉 Successfully exported {success_count} voices.")
+        if len(tasks) > 1:
+            logger.info(
+                "Exported %d voices, skipped %d up to date, %d failed, in %.1fs with %d workers "
+                "(%.2f voices/s)",
+                success_count,
+                skipped_count,
+                statuses.count("failed"),
+                elapsed,
+                workers,
+                success_count / elapsed if elapsed > 0 else 0.0,
+            )
 
 
 if __name__ == "__main__":
@@ -0,0 +1,400 @@
+"""Continuous batching of concurrent generations on a single TTSModel.
+
+Every active stream owns one row of a KV cache arena shared by all the streams.
+At each frame boundary, new streams are prompted and join the batch, finished ones
+leave it, then the FlowLM runs a single batched step for all the rows.
+"""
+
+import logging
+import os
+import queue
+import threading
+import time
+
+import torch
+
+from pocket_tts.default_parameters import MAX_TOKEN_PER_CHUNK
+from pocket_tts.models.tts_model import TTSModel
+from pocket_tts.modules.quantization import compute_dtype_and_device
+from pocket_tts.modules.stateful_module import (
+    copy_state_row,
+    gather_states,
+    init_states,
+    scatter_states,
+    slice_states,
+)
+from pocket_tts.modules.transformer import StreamingMultiheadAttention, cached_kv
+
+logger = logging.getLogger(__name__)
+
+
+class _Stream:
+    """A request going through the scheduler, one text chunk at a time."""
+
+    def __init__(
+        self,
+        model_state: dict,
+        chunks: list[tuple[str, int]],
+        cancel_event: threading.Event | None = None,
+    ):
+        self.model_state = model_state
+        self.chunks = chunks
+        self.results = queue.Queue()
+        self.cancel_event = cancel_event or threading.Event()
+
+        # State of the chunk being generated.
+        self.row = None
+        self.backbone_input = None
+        self.step = 0
+        self.eos_step = None
+        self.max_gen_len = 0
+        self.frames_after_eos = 0
+
+    @property
+    def cancelled(self) -> bool:
+        return self.cancel_event.is_set()
+
+    @cancelled.setter
+    def cancelled(self, value: bool):
+        if value:
+            self.cancel_event.set()
+
+
+class BatchedMimiDecoder:
+    """Decodes the latents of many streams with a single batched Mimi call.
+
+    Each stream owns a row of a batched Mimi state until it is released. The rows in use
+    are kept at the start of the batch so that the usual case, where all the streams have
+    a latent to decode, works on views of the state without any copy.
+
+    Args:
+        tts_model: The model whose Mimi decoder is used.
+        max_batch_size: Maximum number of streams decoded together.
+    """
+
+    def __init__(self, tts_model: TTSModel, max_batch_size: int):
+        self.tts_model = tts_model
+        mimi_context = tts_model.config.mimi.transformer.context
+        self._state = init_states(
+            tts_model.mimi, batch_size=max_batch_size, sequence_length=mimi_context
+        )
+        self._initial_state = init_states(
+            tts_model.mimi, batch_size=1, sequence_length=mimi_context
+        )
+        self.max_batch_size = max_batch_size
+        self._keys = []
+
+    def decode(self, keys: list, latents: torch.Tensor) -> list[torch.Tensor]:
+        """Decodes latents of shape [len(keys), 1, ldim], one per stream.
+
+        Streams seen for the first time get a fresh Mimi state.
+
+        Returns:
+            One audio frame of shape [1, C, samples] per stream, in the order of `keys`.
+        """
+        mimi = self.tts_model.mimi
+        rows = [self._row(key) for key in keys]
+        order = sorted(range(len(keys)), key=rows.__getitem__)
+        sorted_rows = [rows[i] for i in order]
+        latents = latents[order]
+
+        if sorted_rows == list(range(len(self._keys))):
+            state = slice_states(mimi, self._state, 0, len(self._keys))
+            audio_frames = self.tts_model._decode_latent(latents, state)
+        else:
+            rows_index = torch.tensor(sorted_rows)
+            state = gather_states(mimi, self._state, rows_index)
+            audio_frames = self.tts_model._decode_latent(latents, state)
+            scatter_states(mimi, self._state, rows_index, state)
+
+        result = [None] * len(keys)
+        for i, audio_frame in zip(order, audio_frames):
+            result[i] = audio_frame[None]
+        return result
+
+    def release(self, key):
+        """Frees the row of a stream, the last row is moved in its place."""
+        if key not in self._keys:
+            return
+        row = self._keys.index(key)
+        last_row = len(self._keys) - 1
+        if row != last_row:
+            copy_state_row(self.tts_model.mimi, self._state, row, self._state, last_row)
+            self._keys[row] = self._keys[last_row]
+        self._keys.pop()
+
+    def _row(self, key) -> int:
+        if key in self._keys:
+            return self._keys.index(key)
+        if len(self._keys) == self.max_batch_size:
+            raise RuntimeError("All the rows of the batched Mimi decoder are in use.")
+        row = len(self._keys)
+        copy_state_row(self.tts_model.mimi, self._state, row, self._initial_state, 0)
+        self._keys.append(key)
+        return row
+
+
+class BatchScheduler:
+    """Runs the generations of many concurrent requests as one batched FlowLM step per frame.
+
+    The scheduler owns a background thread driving the FlowLM and another one decoding
+    the latents of all the streams with batched Mimi calls. Requests join and leave the
+    batch at frame boundaries, so the throughput grows with the number of concurrent requests.
+
+    Args:
+        tts_model: The model used for all the generations. It should not be used
+            for generation by anything else while the scheduler is running.
+        max_batch_size: Maximum number of streams generated together, the other
+            ones wait for a row to be free.
+    """
+
+    def __init__(self, tts_model: TTSModel, max_batch_size: int = 8):
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be at least 1, got {max_batch_size}")
+        self.tts_model = tts_model
+        self.max_batch_size = max_batch_size
+        self._pending = queue.Queue()
+        self._active: list[_Stream] = []
+        self._arena: dict[str, dict[str, torch.Tensor]] = {}
+        self._capacity = 0
+        self._decode_queue = queue.Queue()
+        self._decoder = BatchedMimiDecoder(tts_model, max_batch_size)
+
+        threading.Thread(target=self._run, daemon=True).start()
+        threading.Thread(target=self._decode_loop, daemon=True).start()
+
+    def generate_audio_stream(
+        self,
+        model_state: dict,
+        text_to_generate: str,
+        max_tokens: int = MAX_TOKEN_PER_CHUNK,
+        frames_after_eos: int | None = None,
+        cancel_event: threading.Event | None = None,
+    ):
+        """Same as `TTSModel.generate_audio_stream` with `copy_state=True`, but thread-safe.
+
+        Yields:
+            torch.Tensor: Audio chunks with shape [samples] at the model's sample rate.
+        """
+        chunks = self.tts_model._prepare_text_chunks(text_to_generate, max_tokens, frames_after_eos)
+        stream = _Stream(model_state, chunks, cancel_event)
+        self._pending.put(stream)
+        try:
+            while True:
+                kind, value = stream.results.get()
+                if kind == "done" or stream.cancelled:
+                    return
+                elif kind == "chunk":
+                    yield value[0, 0]  # Remove batch, channel
+                else:
+                    raise value
+        finally:
+            # Stops the generation if the caller stopped consuming the audio.
+            stream.cancelled = True
+
+    @torch.no_grad
+    def _run(self):
+        while True:
+            self._admit_streams()
+            if not self._active:
+                continue
+            try:
+                self._step()
+            except Exception as e:
+                logger.error(f"Error in batched generation: {e}")
+                for stream in self._active:
+                    stream.cancelled = True
+                    stream.results.put(("error", e))
+                    self._decode_queue.put(("end", stream, True))
+                self._active.clear()
+
+    def _admit_streams(self):
+        cancelled = [stream for stream in self._active if stream.cancelled]
+        self._remove_streams(cancelled)
+        for stream in cancelled:
+            self._decode_queue.put(("end", stream, True))
+        while len(self._active) < self.max_batch_size:
+            try:
+                # Only wait for new streams when there is nothing else to do.
+                stream = self._pending.get(block=not self._active)
+            except queue.Empty:
+                return
+            if stream.cancelled:
+                stream.results.put(("done", None))
+                continue
+            try:
+                self._start_chunk(stream)
+            except Exception as e:
+                logger.error(f"Error when prompting text: {e}")
+                stream.results.put(("error", e))
+
+    def _start_chunk(self, stream: _Stream):
+        model = self.tts_model
+        text_to_generate, stream.frames_after_eos = stream.chunks.pop(0)
+        prepared = model.flow_lm.conditioner.prepare(text_to_generate)
+        token_count = prepared.tokens.shape[1]
+        stream.max_gen_len = model._estimate_max_gen_len(token_count)
+        prompt_length = model._flow_lm_current_end(stream.model_state)
+        self._ensure_capacity(prompt_length + token_count + stream.max_gen_len)
+
+        # The voice state is copied in the arena, it is never modified.
+        row = len(self._active)
+        for module_name, module_state in stream.model_state.items():
+            arena_state = self._arena[module_name]
+            arena_state["cache"][:, row, :prompt_length] = cached_kv(module_state)[:, 0]
+            arena_state["offsets"][row] = prompt_length
+
+        model._run_flow_lm_and_increment_step(
+            model_state=self._rows_state(row, row + 1), text_tokens=prepared.tokens
+        )
+
+        stream.row = row
+        stream.step = 0
+        stream.eos_step = None
+        stream.backbone_input = torch.full(
+            (1, 1, model.flow_lm.ldim),
+            fill_value=float("NaN"),
+            device=model.flow_lm.bos_emb.device,
+            dtype=model.flow_lm.dtype,
+        )
+        self._active.append(stream)
+
+    def _ensure_capacity(self, sequence_length: int):
+        """Grows the KV cache arena so that each row can hold `sequence_length` steps."""
+        if self._capacity >= sequence_length:
+            return
+        capacity = max(sequence_length, 2 * self._capacity)
+        logger.info("Growing the batched KV cache to %d steps", capacity)
+        for module_name, module in self.tts_model.flow_lm.named_modules():
+            if not isinstance(module, StreamingMultiheadAttention):
+                continue
+            dtype, device = compute_dtype_and_device(module.in_proj)
+            dim_per_head = module.embed_dim // module.num_heads
+            # Zeros and not NaN as the masked positions still go through the attention matmul.
+            cache = torch.zeros(
+                (2, self.max_batch_size, capacity, module.num_heads, dim_per_head),
+                device=device,
+                dtype=dtype,
+            )
+            offsets = torch.zeros(self.max_batch_size, dtype=torch.long, device=device)
+            if module_name in self._arena:
+                previous = self._arena[module_name]
+                cache[:, :, : self._capacity] = previous["cache"]
+                offsets[:] = previous["offsets"]
+            self._arena[module_name] = dict(cache=cache, offsets=offsets)
+        self._capacity = capacity
+
+    def _rows_state(self, start: int, end: int) -> dict[str, dict[str, torch.Tensor]]:
+        """Model state made of views on some rows of the arena."""
+        return {
+            module_name: dict(
+                cache=arena_state["cache"][:, start:end], offsets=arena_state["offsets"][start:end]
+            )
+            for module_name, arena_state in self._arena.items()
+        }
+
+    def _step(self):
+        model = self.tts_model
+        t = time.monotonic()
+        backbone_input = torch.cat([stream.backbone_input for stream in self._active], dim=0)
+        next_latents, is_eos = model._run_flow_lm_and_increment_step(
+            model_state=self._rows_state(0, len(self._active)),
+            backbone_input_latents=backbone_input,
+        )
+        is_eos = is_eos[:, 0].tolist()
+        logger.debug(
+            "Generated a batch of %d latents in %d ms",
+            len(self._active),
+            int((time.monotonic() - t) * 1000),
+        )
+
+        decoded_streams = []
+        finished = {}
+        reached_max_len = []
+        for stream in self._active:
+            if is_eos[stream.row] and stream.eos_step is None:
+                stream.eos_step = stream.step
+            if (
+                stream.eos_step is not None
+                and stream.step >= stream.eos_step + stream.frames_after_eos
+            ):
+                # Before the latents of this frame so that the decoder row is freed first.
+                finished[stream] = self._end_chunk(stream)
+                continue
+
+            stream.backbone_input = next_latents[stream.row : stream.row + 1]
+            decoded_streams.append(stream)
+            stream.step += 1
+            if stream.step >= stream.max_gen_len:
+                if os.environ.get("KPOCKET_TTS_ERROR_WITHOUT_EOS", "0") == "1":
+                    raise RuntimeError("Generation reached maximum length without EOS!")
+                logger.warning(
+                    "Maximum generation length reached without EOS, "
+                    "this very often indicates an error."
+                )
+                reached_max_len.append(stream)
+
+        if decoded_streams:
+            rows = torch.tensor([stream.row for stream in decoded_streams])
+            self._decode_queue.put(("frame", decoded_streams, next_latents[rows]))
+        for stream in reached_max_len:
+            finished[stream] = self._end_chunk(stream)
+
+        self._remove_streams(list(finished))
+        for stream, done in finished.items():
+            if not done:
+                self._pending.put(stream)
+
+    def _end_chunk(self, stream: _Stream) -> bool:
+        """Queues the end of the current chunk of `stream` for the decoder.
+
+        Whether the stream is done is decided here, on the generation thread, as the next
+        chunk may be started before the decoder gets to the end of this one.
+        """
+        done = not stream.chunks or stream.cancelled
+        self._decode_queue.put(("end", stream, done))
+        return done
+
+    def _remove_streams(self, streams: list[_Stream]):
+        """Frees the rows of the streams, the last rows are moved to keep the batch dense."""
+        for stream in sorted(streams, key=lambda s: s.row, reverse=True):
+            last = self._active.pop()
+            if last is not stream:
+                for arena_state in self._arena.values():
+                    end = int(arena_state["offsets"][last.row])
+                    arena_state["cache"][:, stream.row, :end] = arena_state["cache"][
+                        :, last.row, :end
+                    ]
+                    arena_state["offsets"][stream.row] = end
+                last.row = stream.row
+                self._active[stream.row] = last
+            stream.row = None
+
+    @torch.no_grad
+    def _decode_loop(self):
+        while True:
+            kind, *args = self._decode_queue.get()
+            if kind == "end":
+                stream, done = args
+                self._decoder.release(stream)
+                if done:
+                    stream.results.put(("done", None))
+                continue
+
+            streams, latents = args
+            t = time.monotonic()
+            try:
+                audio_frames = self._decoder.decode(streams, latents)
+            except Exception as e:
+                logger.error(f"Error in mimi decoding: {e}")
+                for stream in streams:
+                    stream.cancelled = True
+                    stream.results.put(("error", e))
+                continue
+            logger.debug(
+                "Decoded a batch of %d frames with mimi in %d ms",
+                len(streams),
+                int((time.monotonic() - t) * 1000),
+            )
+            for stream, audio_frame in zip(streams, audio_frames):
+                stream.results.put(("chunk", audio_frame))
@@ -14,6 +14,7 @@ from pocket_tts.utils.config import FlowLMConfig
 logger = logging.getLogger(__name__)
 
 FlowNet2 = Callable[[torch.Tensor, torch.Tensor, torch.Tensor], torch.Tensor]
+StepFlow = Callable[[torch.Tensor], torch.Tensor]
 
 
 def lsd_decode(v_t: FlowNet2, x_0: torch.Tensor, num_steps: int = 1) -> torch.Tensor:
@@ -29,14 +30,29 @@ def lsd_decode(v_t: FlowNet2, x_0: torch.Tensor, num_steps: int = 1) -> torch.Te
     Returns:
         x_1_hat: (B, D) Reconstructed data sample.
     """
-    current = x_0
+    flows = []
     for i in range(num_steps):
         s = i / num_steps
         t = (i + 1) / num_steps
-        flow_dir = v_t(
-            s * torch.ones_like(x_0[..., :1]), t * torch.ones_like(x_0[..., :1]), current
+        flows.append(
+            partial(v_t, s * torch.ones_like(x_0[..., :1]), t * torch.ones_like(x_0[..., :1]))
         )
-        current += flow_dir / num_steps
+    return lsd_decode_flows(flows, x_0)
+
+
+def lsd_decode_flows(flows: list[StepFlow], x_0: torch.Tensor) -> torch.Tensor:
+    """Same as `lsd_decode`, with the flow of each step given as a function of x_t only.
+
+    Args:
+        flows: Flow of each step, already conditioned on the step's (s, t).
+        x_0: Starting point from the known distribution.
+
+    Returns:
+        x_1_hat: (B, D) Reconstructed data sample.
+    """
+    current = x_0
+    for flow in flows:
+        current += flow(current) / len(flows)
     return current
 
 
@@ -130,8 +146,8 @@ class FlowLMModel(nn.Module):
             torch.nn.init.normal_(noise, mean=0.0, std=std)
         else:
             torch.nn.init.trunc_normal_(noise, mean=0.0, std=std, a=-noise_clamp, b=noise_clamp)
-        conditioned_flow = partial(self.flow_net, transformer_out)
-        return lsd_decode(conditioned_flow, noise, lsd_decode_steps), out_eos
+        flows = self.flow_net.lsd_flows(transformer_out, lsd_decode_steps)
+        return lsd_decode_flows(flows, noise), out_eos
 
     def backbone(
         self, input_, text_embeddings: torch.Tensor, sequence, model_state: dict
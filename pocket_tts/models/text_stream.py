@@ -0,0 +1,120 @@
+"""Speech generation from text that arrives in fragments, e.g. from a language model."""
+
+import queue
+import re
+import threading
+
+import torch
+from beartype.typing import Callable, Iterator
+
+from pocket_tts.default_parameters import MAX_TOKEN_PER_CHUNK
+
+# End of a sentence: final punctuation (maybe followed by closing quotes or brackets) and
+# whitespace, or a line break.
+_SENTENCE_BOUNDARY = re.compile(r"[.!?…]+[\"'”’)\]]*\s+|\n+")
+
+
+class TextStreamSession:
+    """Speaks text fed in fragments, starting as soon as the first sentence is complete.
+
+    `feed` accumulates the fragments and queues the text up to the last sentence boundary
+    seen. `close` queues the rest. `audio_chunks` generates the queued texts one after the
+    other, from the same voice state, and waits for more text until the session is closed.
+    Text is meant to be fed from one thread while the audio is consumed in another.
+
+    Args:
+        tts_model (TTSModel): The model generating the audio.
+        model_state (dict): State of the voice, from `get_state_for_audio_prompt`. It is
+            not modified.
+        max_tokens (int): Same as for `TTSModel.generate_audio_stream`.
+        frames_after_eos (int, optional): Same as for `TTSModel.generate_audio_stream`.
+        generate_audio_stream (Callable, optional): Generates the audio of each text, with
+            the arguments of `TTSModel.generate_audio_stream`. Defaults to the one of
+            `tts_model`, use `BatchScheduler.generate_audio_stream` to run several sessions
+            on one model.
+        max_buffered_chars (int): Text without sentence boundary is cut at its last space
+            once longer than this, so that speech does not wait for a very long sentence.
+    """
+
+    def __init__(
+        self,
+        tts_model,
+        model_state: dict,
+        max_tokens: int = MAX_TOKEN_PER_CHUNK,
+        frames_after_eos: int | None = None,
+        generate_audio_stream: Callable | None = None,
+        max_buffered_chars: int = 400,
+    ):
+        self.model_state = model_state
+        self.max_tokens = max_tokens
+        self.frames_after_eos = frames_after_eos
+        self.max_buffered_chars = max_buffered_chars
+        self._generate_audio_stream = generate_audio_stream or tts_model.generate_audio_stream
+        self._buffer = ""
+        self._texts = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        self._cancelled = threading.Event()
+
+    def feed(self, fragment: str):
+        """Adds a fragment of text, queuing the sentences it completes."""
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Cannot feed a closed session")
+            self._buffer += fragment
+            boundaries = list(_SENTENCE_BOUNDARY.finditer(self._buffer))
+            if boundaries:
+                end = boundaries[-1].end()
+                self._queue_text(self._buffer[:end])
+                self._buffer = self._buffer[end:]
+            if len(self._buffer) > self.max_buffered_chars:
+                cut = self._buffer.rfind(" ")
+                if cut > 0:
+                    self._queue_text(self._buffer[:cut])
+                    self._buffer = self._buffer[cut:]
+
+    def close(self):
+        """Queues the remaining text, the audio ends once it is spoken."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue_text(self._buffer)
+            self._buffer = ""
+            self._texts.put(None)
+
+    def cancel(self):
+        """Stops the audio as soon as possible, dropping the text not spoken yet."""
+        self._cancelled.set()
+        with self._lock:
+            self._closed = True
+            self._texts.put(None)
+
+    def audio_chunks(self) -> Iterator[torch.Tensor]:
+        """Yields the audio chunks of the text fed, until the session is closed or cancelled."""
+        while not self._cancelled.is_set():
+            text = self._texts.get()
+            if text is None:
+                return
+            audio_chunks = self._generate_audio_stream(
+                model_state=self.model_state,
+                text_to_generate=text,
+                max_tokens=self.max_tokens,
+                frames_after_eos=self.frames_after_eos,
+            )
+            try:
+                for audio_chunk in audio_chunks:
+                    if self._cancelled.is_set():
+                        return
+                    yield audio_chunk
+            finally:
+                # Stops the generation if the loop was left early.
+                audio_chunks.close()
+
+    def __iter__(self) -> Iterator[torch.Tensor]:
+        return self.audio_chunks()
+
+    def _queue_text(self, text: str):
+        # Fragments with only spaces or punctuation have nothing to say.
+        if any(character.isalnum() for character in text):
+            self._texts.put(text.strip())
@@ -1,4 +1,5 @@
 import copy
+import hashlib
 import logging
 import math
 import os
@@ -6,7 +7,6 @@ import queue
 import statistics
 import threading
 import time
-from functools import lru_cache
 from pathlib import Path
 
 import safetensors
@@ -24,22 +24,43 @@ from pocket_tts.default_parameters import (
     DEFAULT_NOISE_CLAMP,
     DEFAULT_TEMPERATURE,
     DEFAULT_VARIANT,
+    DEFAULT_VOICE_CACHE_MB,
     MAX_TOKEN_PER_CHUNK,
 )
 from pocket_tts.models.flow_lm import FlowLMModel
 from pocket_tts.models.mimi import MimiModel
+from pocket_tts.models.voice_cache import VoiceStateCache
 from pocket_tts.modules import mimi_transformer
 from pocket_tts.modules.dummy_quantizer import DummyQuantizer
+from pocket_tts.modules.kv_cache import KVCachePool
+from pocket_tts.modules.quantization import quantize_linear_layers
 from pocket_tts.modules.seanet import SEANetDecoder, SEANetEncoder
-from pocket_tts.modules.stateful_module import increment_steps, init_states
+from pocket_tts.modules.stateful_module import copy_states, increment_steps, init_states
+from pocket_tts.modules.transformer import cached_kv
 from pocket_tts.utils.config import Config, load_config
+from pocket_tts.utils.state_files import (
+    MODEL_STATE_PREFIX,
+    MODEL_STATE_SIGNATURE_KEY,
+    SOURCE_SHA256_KEY,
+    SOURCE_STAT_KEY,
+    TRUNCATE_KEY,
+    file_sha256,
+    flatten_model_state,
+    mmap_safetensors,
+    read_safetensors_header,
+    source_stat,
+    unflatten_model_state,
+)
 from pocket_tts.utils.utils import (
     PREDEFINED_VOICES,
+    BackgroundWorker,
     display_execution_time,
     download_if_necessary,
     load_predefined_voice,
+    make_cache_directory,
     size_of_dict,
 )
+from pocket_tts.utils.voice_catalog import default_voices_dir, get_voice_catalog
 from pocket_tts.utils.weights_loading import get_flow_lm_state_dict, get_mimi_state_dict
 
 torch.set_num_threads(1)
@@ -55,9 +76,18 @@ VOICE_CLONING_UNSUPPORTED = (
 )
 
 
+def _is_static_state(model_state: dict) -> bool:
+    """Whether the positions of all the KV caches are `offsets` tensors."""
+    return all("offsets" in state for state in model_state.values() if "cache" in state)
+
+
 class TTSModel(nn.Module):
     _TOKENS_PER_SECOND_ESTIMATE = 3.0
     _GEN_SECONDS_PADDING = 2.0
+    # Number of KV cache tails kept for reuse between generations, see `_reserve_kv_cache`.
+    _KV_CACHE_POOL_SIZE = 2
+    # Length of the voice prompts that fit in the caches of the compiled step, see `_compile_step`.
+    _STATIC_PREFIX_SECONDS = 30.0
 
     def __init__(
         self,
@@ -76,6 +106,25 @@ class TTSModel(nn.Module):
         self.eos_threshold = eos_threshold
         self.config = config
         self.has_voice_cloning = True
+        # Quantization mode of the linear layers, see `_quantize`.
+        self.quantization = None
+        # Compiled `_run_flow_lm` for the generation steps, see `_compile_step`.
+        self._compiled_run_flow_lm = None
+        self._static_kv_cache_pool = None
+        # Room for a chunk of text of up to twice the default size and the audio generated for it.
+        max_chunk_tokens = 2 * MAX_TOKEN_PER_CHUNK
+        self._kv_cache_pool = KVCachePool(
+            flow_lm,
+            capacity=max_chunk_tokens + self._estimate_max_gen_len(max_chunk_tokens),
+            size=self._KV_CACHE_POOL_SIZE,
+        )
+        # Long-lived threads generating the latents and decoding them, shared by all the
+        # chunks. The Mimi state is owned by the decoder worker.
+        self._generation_worker = BackgroundWorker("pocket-tts-generation")
+        self._decoder_worker = BackgroundWorker("pocket-tts-decoder")
+        self._mimi_state = None
+        self._mimi_initial_state = None
+        self.voice_state_cache = VoiceStateCache(self, max_bytes=DEFAULT_VOICE_CACHE_MB * 2**20)
 
     @property
     def device(self) -> str:
@@ -185,6 +234,8 @@ class TTSModel(nn.Module):
         lsd_decode_steps: int = DEFAULT_LSD_DECODE_STEPS,
         noise_clamp: float | int | None = DEFAULT_NOISE_CLAMP,
         eos_threshold: float = DEFAULT_EOS_THRESHOLD,
+        quantize: str | None = None,
+        compile_step: bool = False,
     ) -> Self:
         """Load a pre-trained TTS model with specified configuration.
 
@@ -203,6 +254,15 @@ class TTSModel(nn.Module):
                 is applied. Helps prevent extreme values in generation.
             eos_threshold: Threshold for end-of-sequence detection. Higher values
                 make the model more likely to continue generating.
+            quantize: If "int8", the linear layers of the FlowLM transformer and flow
+                network and of the Mimi transformers are dynamically quantized to int8,
+                which makes the generation faster and the model smaller on the CPU. The
+                quantized model cannot be moved to another device.
+            compile_step: If True, the generation steps run a graph compiled with
+                `torch.compile`, which removes most of the Python overhead of the many
+                small operations of a step. The graph is compiled on the first generation,
+                and the compiled kernels are cached on disk for the next runs. The eager
+                step is used if the compilation fails.
 
         Returns:
             TTSModel: Fully initialized model with loaded weights on cpu, ready for
@@ -223,8 +283,51 @@ class TTSModel(nn.Module):
         tts_model = TTSModel._from_pydantic_config_with_weights(
             config, temp, lsd_decode_steps, noise_clamp, eos_threshold
         )
+        if quantize is not None:
+            tts_model._quantize(quantize)
+        if compile_step:
+            tts_model._compile_step()
         return tts_model
 
+    def _compile_step(self):
+        """Compiles `_run_flow_lm` for the generation steps on static states.
+
+        A static state (see `_to_static_state`) has the whole KV cache and the positions as
+        tensors, so the shapes of a step do not change from one step to the next.
+        """
+        import torch._inductor.config
+
+        # Kernels are cached on disk by Inductor, so the next processes skip their compilation.
+        os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", str(make_cache_directory() / "inductor"))
+        torch._inductor.config.fx_graph_cache = True
+        self._compiled_run_flow_lm = torch.compile(self._run_flow_lm)
+        # Forked states get a whole cache of the same length for every chunk, so that the
+        # step is not compiled again for each voice and text length, see `_reserve_kv_cache`.
+        prefix_capacity = math.ceil(self._STATIC_PREFIX_SECONDS * self.mimi.frame_rate)
+        self._static_kv_cache_pool = KVCachePool(
+            self.flow_lm,
+            capacity=prefix_capacity + self._kv_cache_pool.capacity,
+            size=self._KV_CACHE_POOL_SIZE,
+        )
+
+    def _quantize(self, mode: str):
+        """Quantizes the linear layers doing most of the computation, see `load_model`.
+
+        The input and EOS projections of the FlowLM are small and kept in float.
+        """
+        for module in [
+            self.flow_lm.transformer,
+            self.flow_lm.flow_net,
+            self.mimi.encoder_transformer,
+            self.mimi.decoder_transformer,
+        ]:
+            quantize_linear_layers(module, mode)
+        # Computed with the float weights.
+        self.flow_lm.flow_net._lsd_time_embeddings.clear()
+        self.quantization = mode
+        size_in_mb = size_of_dict(self.state_dict()) // 1e6
+        logger.info(f"Quantized the model to {mode}. Its size is {size_in_mb} MB")
+
     def _run_flow_lm_and_increment_step(
         self,
         model_state: dict,
@@ -233,23 +336,39 @@ class TTSModel(nn.Module):
         audio_conditioning: torch.Tensor | None = None,
     ) -> tuple[torch.Tensor, torch.Tensor]:
         """First one is the backbone output, second one is the audio decoding output."""
+        batch_size = 1 if backbone_input_latents is None else backbone_input_latents.shape[0]
         if text_tokens is None:
-            text_tokens = torch.zeros((1, 0), dtype=torch.int64, device=self.flow_lm.device)
+            text_tokens = torch.zeros(
+                (batch_size, 0), dtype=torch.int64, device=self.flow_lm.device
+            )
         if backbone_input_latents is None:
             backbone_input_latents = torch.empty(
                 (1, 0, self.flow_lm.ldim), dtype=self.flow_lm.dtype, device=self.flow_lm.device
             )
         if audio_conditioning is None:
             audio_conditioning = torch.empty(
-                (1, 0, self.flow_lm.dim), dtype=self.flow_lm.dtype, device=self.flow_lm.device
+                (batch_size, 0, self.flow_lm.dim),
+                dtype=self.flow_lm.dtype,
+                device=self.flow_lm.device,
             )
 
-        output = self._run_flow_lm(
+        inputs = dict(
             text_tokens=text_tokens,
             backbone_input_latents=backbone_input_latents,
             model_state=model_state,
             audio_conditioning=audio_conditioning,
         )
+        output = None
+        is_step = text_tokens.shape[1] == 0 and audio_conditioning.shape[1] == 0
+        if self._compiled_run_flow_lm is not None and is_step and _is_static_state(model_state):
+            try:
+                output = self._compiled_run_flow_lm(**inputs)
+            except Exception as e:
+                # The positions are only incremented below, so the step can run again.
+                logger.warning("The compiled generation step failed, using the eager one: %s", e)
+                self._compiled_run_flow_lm = None
+        if output is None:
+            output = self._run_flow_lm(**inputs)
         increment_by = (
             text_tokens.shape[1] + backbone_input_latents.shape[1] + audio_conditioning.shape[1]
         )
@@ -298,13 +417,17 @@ class TTSModel(nn.Module):
                 cache = module_state["cache"]
                 # KV cache has shape [2, batch_size, current_length, num_heads, dim_per_head]
                 current_length = cache.shape[2]
-                if current_length < sequence_length:
+                needed_length = sequence_length
+                if "prefix" in module_state:
+                    # Copy-on-write state, the cache only holds the positions after the prefix.
+                    needed_length -= module_state["prefix"].shape[2]
+                if current_length < needed_length:
                     # Create expanded cache filled with NaN for unused positions
                     expanded_cache = torch.full(
                         (
                             cache.shape[0],
                             cache.shape[1],
-                            sequence_length,
+                            needed_length,
                             cache.shape[3],
                             cache.shape[4],
                         ),
@@ -316,34 +439,151 @@ class TTSModel(nn.Module):
                     expanded_cache[:, :, :current_length, :, :] = cache
                     module_state["cache"] = expanded_cache
 
+    def _reserve_kv_cache(
+        self, model_state: dict, sequence_length: int
+    ) -> tuple[KVCachePool, dict[str, torch.Tensor]] | None:
+        """Makes room in the KV cache of the model state for `sequence_length` positions.
+
+        The states returned by `_fork_state` get their cache from a pool of the model when
+        possible, in which case the pool and the pooled caches are returned. The caches must
+        be given back with `pool.release` once the model state is not used anymore.
+        With the compiled step, the prefix is copied at the start of a pooled cache.
+        Other states are expanded with `_expand_kv_cache`.
+        """
+        attention_states = [state for state in model_state.values() if "cache" in state]
+        is_fresh_fork = all(
+            "prefix" in state and state["cache"].shape[1:3] == (1, 0) for state in attention_states
+        )
+        if not attention_states or not is_fresh_fork:
+            self._expand_kv_cache(model_state, sequence_length)
+            return None
+        prefix_length = attention_states[0]["prefix"].shape[2]
+        pool = self._static_kv_cache_pool
+        caches = None if pool is None else pool.acquire(sequence_length)
+        if caches is not None:
+            for module_name, cache in caches.items():
+                cache[:, :, :prefix_length] = model_state[module_name].pop("prefix")
+                model_state[module_name]["cache"] = cache
+            return pool, caches
+        pool = self._kv_cache_pool
+        caches = pool.acquire(sequence_length - prefix_length)
+        if caches is None:
+            self._expand_kv_cache(model_state, sequence_length)
+            return None
+        for module_name, cache in caches.items():
+            model_state[module_name]["cache"] = cache
+        return pool, caches
+
+    def _fork_state(self, model_state: dict) -> dict:
+        """Copy-on-write copy of a FlowLM model state.
+
+        The KV cache already in the state becomes a read-only prefix shared with the
+        original. The copy gets its own, initially empty, cache for the following positions.
+        """
+        forked = {}
+        for module_name, module_state in model_state.items():
+            if "cache" not in module_state:
+                forked[module_name] = {key: value.clone() for key, value in module_state.items()}
+                continue
+            prefix = cached_kv(module_state)
+            forked[module_name] = dict(
+                current_end=module_state["current_end"].clone(),
+                prefix=prefix,
+                cache=prefix.new_empty(prefix.shape[:2] + (0,) + prefix.shape[3:]),
+            )
+        return forked
+
+    def _to_static_state(self, model_state: dict) -> dict:
+        """Same model state where the KV caches hold all their positions, for `_compile_step`.
+
+        The positions are stored as `offsets` tensors, as in the states of `BatchScheduler`,
+        and the unused part of the caches is zeroed. The caches without prefix, like those
+        `_reserve_kv_cache` gives to the forked states with the compiled step, are used as
+        is, the others are copied. Use `_from_static_state` to update `model_state` after.
+        """
+        static_state = {}
+        for module_name, module_state in model_state.items():
+            if "cache" not in module_state:
+                static_state[module_name] = module_state
+                continue
+            current_end = int(module_state["current_end"])
+            cache = module_state["cache"]
+            prefix = module_state.get("prefix")
+            if prefix is None:
+                cache[:, :, current_end:] = 0
+            else:
+                tail = cache
+                cache = tail.new_zeros(
+                    tail.shape[:2] + (prefix.shape[2] + tail.shape[2],) + tail.shape[3:]
+                )
+                cache[:, :, :current_end] = cached_kv(module_state)
+            static_state[module_name] = dict(
+                cache=cache,
+                offsets=torch.full(
+                    (cache.shape[1],), current_end, dtype=torch.long, device=cache.device
+                ),
+            )
+        return static_state
+
+    def _from_static_state(self, static_state: dict, model_state: dict):
+        """Updates `model_state` with the positions generated from `_to_static_state`."""
+        for module_name, module_state in static_state.items():
+            if "offsets" not in module_state:
+                continue
+            model_state[module_name].pop("prefix", None)
+            model_state[module_name]["cache"] = module_state["cache"]
+            # On the CPU like the positions of the other states, whatever the device.
+            model_state[module_name]["current_end"] = torch.tensor(int(module_state["offsets"][0]))
+
     def _flow_lm_current_end(self, model_state: dict) -> int:
         for module_state in model_state.values():
             current_end = module_state.get("current_end")
             if current_end is not None:
-                return int(current_end.shape[0])
+                return int(current_end)
         raise ValueError(
             "Could not find current_end in model state, please open an issue "
             "at https://github.com/kyutai-labs/pocket-tts/issues"
         )
 
+    def _decode_latent(self, latent: torch.Tensor, mimi_state: dict) -> torch.Tensor:
+        """Decodes FlowLM latents of shape [B, 1, ldim] into audio of shape [B, C, samples]."""
+        mimi_decoding_input = latent * self.flow_lm.emb_std + self.flow_lm.emb_mean
+        transposed = mimi_decoding_input.transpose(-1, -2)
+        quantized = self.mimi.quantizer(transposed)
+        audio_frame = self.mimi.decode_from_latent(quantized, mimi_state)
+        increment_steps(self.mimi, mimi_state, increment=16)
+        return audio_frame
+
     @torch.no_grad
-    def _decode_audio_worker(self, latents_queue: queue.Queue, result_queue: queue.Queue):
-        """Worker thread function for decoding audio latents from queue with immediate streaming."""
+    def _decode_audio_worker(
+        self,
+        latents_queue: queue.Queue,
+        result_queue: queue.Queue,
+        cancel_event: threading.Event | None = None,
+    ):
+        """Decodes the audio latents from the queue with immediate streaming.
+
+        Runs on the decoder worker, which owns a Mimi state reset at the start of every chunk.
+        Once `cancel_event` is set, the remaining latents are dropped without being decoded.
+        "done" is always the last message sent to the result queue.
+        """
         try:
-            audio_chunks = []
-            mimi_context = self.config.mimi.transformer.context
-            mimi_state = init_states(self.mimi, batch_size=1, sequence_length=mimi_context)
+            if self._mimi_state is None:
+                context = self.config.mimi.transformer.context
+                self._mimi_state = init_states(self.mimi, batch_size=1, sequence_length=context)
+                self._mimi_initial_state = copy.deepcopy(self._mimi_state)
+            mimi_state = self._mimi_state
+            copy_states(mimi_state, self._mimi_initial_state)
             while True:
                 latent = latents_queue.get()
                 if latent is None:
                     break
-                mimi_decoding_input = latent * self.flow_lm.emb_std + self.flow_lm.emb_mean
-                transposed = mimi_decoding_input.transpose(-1, -2)
-                quantized = self.mimi.quantizer(transposed)
+                if cancel_event is not None and cancel_event.is_set():
+                    latents_queue.task_done()
+                    continue
 
                 t = time.monotonic()
-                audio_frame = self.mimi.decode_from_latent(quantized, mimi_state)
-                increment_steps(self.mimi, mimi_state, increment=16)
+                audio_frame = self._decode_latent(latent, mimi_state)
                 audio_frame_duration = audio_frame.shape[2] / self.config.mimi.sample_rate
                 # We could log the timings here.
                 logger.debug(
@@ -351,18 +591,15 @@ class TTSModel(nn.Module):
                     int(audio_frame_duration * 1000),
                     int((time.monotonic() - t) * 1000),
                 )
-                audio_chunks.append(audio_frame)
-
                 result_queue.put(("chunk", audio_frame))
 
                 latents_queue.task_done()
 
-            # Signal completion
-            result_queue.put(("done", None))
-
         except Exception as e:
             # Put error in result queue
             result_queue.put(("error", e))
+        # Signal completion
+        result_queue.put(("done", None))
 
     @torch.no_grad
     def generate_audio(
@@ -392,8 +629,9 @@ class TTSModel(nn.Module):
             frames_after_eos: Number of additional frames to generate after
                 detecting end-of-sequence. If None, automatically determined
                 based on text length (1-3 frames).
-            copy_state: Whether to create a deep copy of the model state before
-                generation. If True, preserves the original state for reuse.
+            copy_state: Whether to generate from a copy of the model state.
+                If True, preserves the original state for reuse. The copy shares the
+                prompt KV cache of the original, so it is cheap whatever the prompt length.
                 If False, modifies the input state in-place. Defaults to True.
 
         Returns:
@@ -425,6 +663,7 @@ class TTSModel(nn.Module):
         max_tokens: int = MAX_TOKEN_PER_CHUNK,
         frames_after_eos: int | None = None,
         copy_state: bool = True,
+        cancel_event: threading.Event | None = None,
     ):
         """Generate audio streaming chunks from text input.
 
@@ -444,9 +683,13 @@ class TTSModel(nn.Module):
             frames_after_eos: Number of additional frames to generate after
                 detecting end-of-sequence. If None, automatically determined
                 based on text length (1-3 frames). Defaults to None.
-            copy_state: Whether to create a deep copy of the model state before
-                generation. If True, preserves the original state for reuse.
+            copy_state: Whether to generate from a copy of the model state.
+                If True, preserves the original state for reuse. The copy shares the
+                prompt KV cache of the original, so it is cheap whatever the prompt length.
                 If False, modifies the input state in-place. Defaults to True.
+            cancel_event: Event that can be set from any thread to stop the generation,
+                e.g. when the audio is not wanted anymore. The stream then ends after at
+                most one more frame. Closing the generator has the same effect.
 
         Yields:
             torch.Tensor: Audio chunks with shape [samples] at the model's
@@ -463,6 +706,26 @@ class TTSModel(nn.Module):
             real-time factor (RTF) metrics.
         """
 
+        queues = (queue.Queue(), queue.Queue())
+        cancel_event = cancel_event or threading.Event()
+        for chunk, effective_frames in self._prepare_text_chunks(
+            text_to_generate, max_tokens, frames_after_eos
+        ):
+            if cancel_event.is_set():
+                return
+            yield from self._generate_audio_stream_short_text(
+                model_state=model_state,
+                text_to_generate=chunk,
+                frames_after_eos=effective_frames,
+                copy_state=copy_state,
+                queues=queues,
+                cancel_event=cancel_event,
+            )
+
+    def _prepare_text_chunks(
+        self, text_to_generate: str, max_tokens: int, frames_after_eos: int | None
+    ) -> list[tuple[str, int]]:
+        """Splits the text into chunks, each with its number of frames to generate after EOS."""
         # This is a very simplistic way of handling long texts. We could do much better
         # by using teacher forcing, but it would be a bit slower.
         # TODO: add the teacher forcing method for long texts where we use the audio of one chunk
@@ -471,69 +734,77 @@ class TTSModel(nn.Module):
             self.flow_lm.conditioner.tokenizer, text_to_generate, max_tokens
         )
 
+        result = []
         for chunk in chunks:
-            text_to_generate, frames_after_eos_guess = prepare_text_prompt(chunk)
+            _, frames_after_eos_guess = prepare_text_prompt(chunk)
             frames_after_eos_guess += 2
             effective_frames = (
                 frames_after_eos if frames_after_eos is not None else frames_after_eos_guess
             )
-            yield from self._generate_audio_stream_short_text(
-                model_state=model_state,
-                text_to_generate=chunk,
-                frames_after_eos=effective_frames,
-                copy_state=copy_state,
-            )
+            result.append((chunk, effective_frames))
+        return result
 
     @torch.no_grad
     def _generate_audio_stream_short_text(
-        self, model_state: dict, text_to_generate: str, frames_after_eos: int, copy_state: bool
+        self,
+        model_state: dict,
+        text_to_generate: str,
+        frames_after_eos: int,
+        copy_state: bool,
+        queues: tuple[queue.Queue, queue.Queue] | None = None,
+        cancel_event: threading.Event | None = None,
     ):
         if copy_state:
-            model_state = copy.deepcopy(model_state)
-
-        # Set up multithreaded generation and decoding
-        latents_queue = queue.Queue()
-        result_queue = queue.Queue()
+            model_state = self._fork_state(model_state)
 
-        # Start decoder worker thread
-        decoder_thread = threading.Thread(
-            target=self._decode_audio_worker, args=(latents_queue, result_queue), daemon=True
-        )
+        # Generation and decoding run in parallel on the persistent workers of the model.
+        # The queues are empty between two chunks so they can be reused for the next one.
+        latents_queue, result_queue = queues or (queue.Queue(), queue.Queue())
+        cancel_event = cancel_event or threading.Event()
         logger.info("starting timer now!")
         t_generating = time.monotonic()
-        decoder_thread.start()
-
-        # Generate latents and add them to queue (decoder processes them in parallel)
-        self._generate(
-            model_state=model_state,
-            text_to_generate=text_to_generate,
-            frames_after_eos=frames_after_eos,
-            latents_queue=latents_queue,
-            result_queue=result_queue,
+        self._decoder_worker.submit(
+            self._decode_audio_worker, latents_queue, result_queue, cancel_event
         )
 
-        # Stream audio chunks as they become available
         total_generated_samples = 0
-        while True:
-            result = result_queue.get()
-            if result[0] == "chunk":
-                # Audio chunk available immediately for streaming/playback
-                audio_chunk = result[1]
-                total_generated_samples += audio_chunk.shape[-1]
-                yield audio_chunk[0, 0]  # Remove batch, channel
-            elif result[0] == "done":
-                # Generation complete
-                break
-            elif result[0] == "error":
-                # Wait for decoder thread to finish cleanly before propagating error
-                with display_execution_time("Waiting for mimi decoder to finish"):
-                    decoder_thread.join()
-                # Propagate error
-                raise result[1]
+        finished = False
+        try:
+            # Generate latents and add them to queue (decoder processes them in parallel)
+            self._generate(
+                model_state=model_state,
+                text_to_generate=text_to_generate,
+                frames_after_eos=frames_after_eos,
+                latents_queue=latents_queue,
+                result_queue=result_queue,
+                cancel_event=cancel_event,
+            )
 
-        # Wait for decoder thread to finish cleanly
-        with display_execution_time("Waiting for mimi decoder to finish"):
-            decoder_thread.join()
+            # Stream audio chunks as they become available
+            error = None
+            while True:
+                result = result_queue.get()
+                if result[0] == "chunk":
+                    if cancel_event.is_set():
+                        # Only waiting for the workers to be done with the queues.
+                        continue
+                    # Audio chunk available immediately for streaming/playback
+                    audio_chunk = result[1]
+                    total_generated_samples += audio_chunk.shape[-1]
+                    yield audio_chunk[0, 0]  # Remove batch, channel
+                elif result[0] == "done":
+                    # The decoder is done with the queues.
+                    break
+                elif result[0] == "error":
+                    error = result[1]
+            if error is not None:
+                raise error
+            finished = True
+        finally:
+            if not finished:
+                # The caller stopped consuming the audio or something failed,
+                # don't keep the workers busy with audio that won't be used.
+                cancel_event.set()
 
         # Print timing information
         duration_generated_audio = int(
@@ -557,39 +828,55 @@ class TTSModel(nn.Module):
         frames_after_eos: int,
         latents_queue: queue.Queue,
         result_queue: queue.Queue,
+        cancel_event: threading.Event,
     ):
         prepared = self.flow_lm.conditioner.prepare(text_to_generate)
         token_count = prepared.tokens.shape[1]
         max_gen_len = self._estimate_max_gen_len(token_count)
         current_end = self._flow_lm_current_end(model_state)
         required_len = current_end + token_count + max_gen_len
-        self._expand_kv_cache(model_state, sequence_length=required_len)
+        reserved = self._reserve_kv_cache(model_state, sequence_length=required_len)
 
-        with display_execution_time("Prompting text"):
-            self._run_flow_lm_and_increment_step(
-                model_state=model_state, text_tokens=prepared.tokens
-            )
+        def release_pooled_caches():
+            if reserved is not None:
+                pool, caches = reserved
+                pool.release(caches)
+
+        try:
+            with display_execution_time("Prompting text"):
+                self._run_flow_lm_and_increment_step(
+                    model_state=model_state, text_tokens=prepared.tokens
+                )
+        except Exception:
+            release_pooled_caches()
+            # Signal the decoder to stop.
+            latents_queue.put(None)
+            raise
 
         def run_generation():
             try:
                 self._autoregressive_generation(
-                    model_state, max_gen_len, frames_after_eos, latents_queue
+                    model_state, max_gen_len, frames_after_eos, latents_queue, cancel_event
                 )
             except Exception as e:
                 logger.error(f"Error in autoregressive generation: {e}")
-                # Signal decoder to stop by putting None (completion sentinel)
-                if latents_queue is not None:
-                    latents_queue.put(None)
-                # Report error to main thread
-                if result_queue is not None:
-                    result_queue.put(("error", e))
+                # Report the error before signaling the decoder to stop by putting None
+                # (completion sentinel), so that it is received before the decoder is done.
+                result_queue.put(("error", e))
+                latents_queue.put(None)
+            finally:
+                release_pooled_caches()
 
-        generation_thread = threading.Thread(target=run_generation, daemon=True)
-        generation_thread.start()
+        self._generation_worker.submit(run_generation)
 
     @torch.no_grad
     def _autoregressive_generation(
-        self, model_state: dict, max_gen_len: int, frames_after_eos: int, latents_queue: queue.Queue
+        self,
+        model_state: dict,
+        max_gen_len: int,
+        frames_after_eos: int,
+        latents_queue: queue.Queue,
+        cancel_event: threading.Event | None = None,
     ):
         backbone_input = torch.full(
             (1, 1, self.flow_lm.ldim),
@@ -599,10 +886,16 @@ class TTSModel(nn.Module):
         )
         steps_times = []
         eos_step = None
+        step_state = model_state
+        if self._compiled_run_flow_lm is not None:
+            step_state = self._to_static_state(model_state)
         for generation_step in range(max_gen_len):
+            if cancel_event is not None and cancel_event.is_set():
+                logger.info("Generation cancelled after %d steps", generation_step)
+                break
             with display_execution_time("Generating latent", print_output=False) as timer:
                 next_latent, is_eos = self._run_flow_lm_and_increment_step(
-                    model_state=model_state, backbone_input_latents=backbone_input
+                    model_state=step_state, backbone_input_latents=backbone_input
                 )
                 if is_eos.item() and eos_step is None:
                     eos_step = generation_step
@@ -619,16 +912,22 @@ class TTSModel(nn.Module):
             logger.warning(
                 "Maximum generation length reached without EOS, this very often indicates an error."
             )
+        if step_state is not model_state:
+            self._from_static_state(step_state, model_state)
 
         # Add sentinel value to signal end of generation
         latents_queue.put(None)
-        logger.info("Average generation step time: %d ms", int(statistics.mean(steps_times)))
+        if steps_times:
+            logger.info("Average generation step time: %d ms", int(statistics.mean(steps_times)))
 
-    @lru_cache(maxsize=2)
     def _cached_get_state_for_audio_prompt(
         self, audio_conditioning: Path | str | torch.Tensor, truncate: bool = False
     ) -> dict:
-        return self.get_state_for_audio_prompt(audio_conditioning, truncate)
+        """Same as get_state_for_audio_prompt, through `self.voice_state_cache`.
+
+        The returned state is shared, it must only be used with `copy_state=True`.
+        """
+        return self.voice_state_cache.get(audio_conditioning, truncate)
 
     @torch.no_grad
     def get_state_for_audio_prompt(
@@ -640,6 +939,9 @@ class TTSModel(nn.Module):
         ):
             if isinstance(audio_conditioning, str):
                 audio_conditioning = download_if_necessary(audio_conditioning)
+            model_state = self._load_prompted_state(audio_conditioning)
+            if model_state is not None:
+                return model_state
             import safetensors.torch
 
             weights = safetensors.torch.load_file(audio_conditioning)
@@ -667,22 +969,9 @@ class TTSModel(nn.Module):
         else:
             # Check for local voice file
             if isinstance(audio_conditioning, str) and not Path(audio_conditioning).exists():
-                voices_dir_str = os.environ.get("POCKET_TTS_VOICES_DIR")
-                if voices_dir_str:
-                    voices_dir = Path(voices_dir_str)
-                else:
-                    # Default to tts-voices at the project root
-                    voices_dir = Path.cwd() / "tts-voices"
-
-                # Check for .wav or .safetensors
-                local_voice_path_wav = voices_dir / f"{audio_conditioning}.wav"
-                local_voice_path_sf = voices_dir / f"{audio_conditioning}.safetensors"
-
-                if local_voice_path_wav.exists():
-                    audio_conditioning = local_voice_path_wav
-                    logger.info(f"Found local voice: {audio_conditioning}")
-                elif local_voice_path_sf.exists():
-                    audio_conditioning = local_voice_path_sf
+                local_voice_path = get_voice_catalog(default_voices_dir()).find(audio_conditioning)
+                if local_voice_path is not None:
+                    audio_conditioning = local_voice_path
                     logger.info(f"Found local voice: {audio_conditioning}")
 
             if not self.has_voice_cloning and isinstance(audio_conditioning, (str, Path)):
@@ -692,6 +981,9 @@ class TTSModel(nn.Module):
                 audio_conditioning = download_if_necessary(audio_conditioning)
             
             if isinstance(audio_conditioning, Path) and audio_conditioning.suffix == ".safetensors":
+                model_state = self._load_prompted_state(audio_conditioning)
+                if model_state is not None:
+                    return model_state
                 weights = safetensors.torch.load_file(audio_conditioning)
                 if "audio_prompt" in weights:
                     prompt = weights["audio_prompt"]
@@ -724,6 +1016,10 @@ class TTSModel(nn.Module):
                 with display_execution_time("Encoding audio prompt"):
                     prompt = self._encode_audio(audio_conditioning.unsqueeze(0).to(self.device))
 
+        return self._get_state_for_prompt(prompt)
+
+    def _get_state_for_prompt(self, prompt: torch.Tensor) -> dict:
+        """Runs the FlowLM over the encoded audio prompt and returns the model state."""
         model_state = init_states(self.flow_lm, batch_size=1, sequence_length=prompt.shape[1])
 
         with display_execution_time("Prompting audio"):
@@ -735,6 +1031,43 @@ class TTSModel(nn.Module):
 
         return model_state
 
+    def _model_state_signature(self) -> str:
+        """Identifies the weights a stored model state or audio prompt was computed with."""
+        config = self.config.flow_lm.model_dump_json() + str(self.config.weights_path)
+        if self.quantization is not None:
+            config += self.quantization
+        return hashlib.sha256(config.encode()).hexdigest()[:16]
+
+    def _load_prompted_state(self, path: Path) -> dict | None:
+        """Loads the model state stored by `save_audio_prompt(..., save_state=True)`.
+
+        The file is memory-mapped rather than read. Returns None when the file only has
+        the audio prompt, or when its model state does not match this model.
+        """
+        tensors, metadata = mmap_safetensors(path)
+        model_state = unflatten_model_state(tensors)
+        if not model_state:
+            return None
+        if metadata.get(MODEL_STATE_SIGNATURE_KEY) != self._model_state_signature():
+            logger.warning(
+                "The model state in %s was computed with other weights, prompting again.", path
+            )
+            return None
+        # Also gives their names to the stateful modules, see `StatefulModule.get_state`.
+        expected = init_states(self.flow_lm, batch_size=1, sequence_length=0)
+        if {name: state.keys() for name, state in expected.items()} != {
+            name: state.keys() for name, state in model_state.items()
+        }:
+            logger.warning("The model state in %s has an unexpected layout, prompting again.", path)
+            return None
+        if self.flow_lm.device != "cpu":
+            model_state = {
+                name: {key: value.to(self.flow_lm.device) for key, value in state.items()}
+                for name, state in model_state.items()
+            }
+        logger.info("Loaded the prompted model state from %s", path)
+        return model_state
+
     def _estimate_max_gen_len(self, token_count: int) -> int:
         gen_len_sec = token_count / self._TOKENS_PER_SECOND_ESTIMATE + self._GEN_SECONDS_PADDING
         frame_rate = self.config.mimi.frame_rate
@@ -746,6 +1079,7 @@ class TTSModel(nn.Module):
         audio_conditioning: Path | str | torch.Tensor,
         export_path: Path | str,
         truncate: bool = False,
+        save_state: bool = False,
     ) -> torch.Tensor:
         """Save audio prompt to .safetensors file
 
@@ -762,6 +1096,10 @@ class TTSModel(nn.Module):
                 - torch.Tensor: Pre-loaded audio tensor with shape [channels, samples]
             export_path: Path to output file
             truncate: Whether to truncate long audio prompts to 30 seconds.
+            save_state: Whether to also store the model state obtained after prompting
+                the model with the audio. get_state_for_audio_prompt then memory-maps it
+                instead of running the model over the prompt again. The file is larger
+                and only valid for the weights it was computed with.
 
         Returns:
             Audio tensor of converted audio
@@ -785,7 +1123,13 @@ class TTSModel(nn.Module):
         if isinstance(audio_conditioning, str):
             audio_conditioning = download_if_necessary(audio_conditioning)
 
+        metadata = {
+            MODEL_STATE_SIGNATURE_KEY: self._model_state_signature(),
+            TRUNCATE_KEY: str(truncate),
+        }
         if isinstance(audio_conditioning, Path):
+            metadata[SOURCE_STAT_KEY] = source_stat(audio_conditioning)
+            metadata[SOURCE_SHA256_KEY] = file_sha256(audio_conditioning)
             audio, conditioning_sample_rate = audio_read(audio_conditioning)
 
             if truncate:
@@ -802,10 +1146,37 @@ class TTSModel(nn.Module):
             prompt = self._encode_audio(audio_conditioning.unsqueeze(0).to(self.device))
             import safetensors.torch
 
-            safetensors.torch.save_file({"audio_prompt": prompt}, export_path)
+            tensors = {"audio_prompt": prompt}
+            if save_state:
+                model_state = self._get_state_for_prompt(prompt)
+                tensors.update(flatten_model_state(model_state))
+            safetensors.torch.save_file(tensors, export_path, metadata=metadata)
 
         return audio_conditioning
 
+    def _is_export_current(
+        self, audio_path: Path, export_path: Path, truncate: bool = False, save_state: bool = False
+    ) -> bool:
+        """Whether `save_audio_prompt` with these arguments would give the same file again.
+
+        The export must have been made by this model from the same audio, which is checked
+        with the modification time and size of the audio file first, then with its content
+        hash, so that an untouched copy of the audio is not exported again.
+        """
+        try:
+            names, metadata = read_safetensors_header(export_path)
+        except (OSError, ValueError):
+            return False
+        if metadata.get(MODEL_STATE_SIGNATURE_KEY) != self._model_state_signature():
+            return False
+        if metadata.get(TRUNCATE_KEY) != str(truncate):
+            return False
+        if save_state and not any(name.startswith(MODEL_STATE_PREFIX) for name in names):
+            return False
+        if metadata.get(SOURCE_STAT_KEY) == source_stat(audio_path):
+            return True
+        return metadata.get(SOURCE_SHA256_KEY) == file_sha256(audio_path)
+
 
 def prepare_text_prompt(text: str) -> tuple[str, int]:
     text = text.strip()
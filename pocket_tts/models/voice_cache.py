@@ -0,0 +1,192 @@
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import safetensors.torch
+import torch
+from beartype.typing import Callable
+
+from pocket_tts.utils.state_files import MODEL_STATE_SIGNATURE_KEY, flatten_model_state
+from pocket_tts.utils.utils import size_of_dict
+
+logger = logging.getLogger(__name__)
+
+UPLOADED_VOICE_PREFIX = "upload:"
+
+
+def uploaded_voice_id(content: bytes) -> str:
+    """Client-visible ID of an uploaded audio prompt, derived from its content."""
+    return UPLOADED_VOICE_PREFIX + hashlib.sha256(content).hexdigest()
+
+
+def voice_cache_key(voice: Path | str | torch.Tensor, truncate: bool) -> tuple:
+    """Identifies the model state computed for a voice.
+
+    Local files are identified by their resolved path, modification time and size, so that
+    an updated file is prompted again. Tensors are identified by a hash of their content.
+    Other voices (predefined names, URLs) are identified by their name.
+    """
+    if isinstance(voice, torch.Tensor):
+        content = voice.detach().cpu().contiguous().view(torch.uint8).numpy().tobytes()
+        return ("tensor", hashlib.sha256(content).hexdigest(), tuple(voice.shape), truncate)
+    is_url = str(voice).startswith(("http://", "https://", "hf://"))
+    path = Path(voice)
+    if not is_url and path.is_file():
+        stat = path.stat()
+        return ("file", str(path.resolve()), stat.st_mtime_ns, stat.st_size, truncate)
+    return ("voice", str(voice), truncate)
+
+
+class VoiceStateCache:
+    """LRU cache of the model states of voices, with a memory budget.
+
+    The size of each state is measured with `size_of_dict`. When the budget is exceeded,
+    the least recently used states are evicted. If `spill_dir` is given, evicted states are
+    written there, and a later miss on the same voice memory-maps them back instead of
+    running the model over the audio prompt again.
+
+    Cached states are shared, they must only be used with `copy_state=True`.
+
+    Args:
+        tts_model (TTSModel): Model computing the states.
+        max_bytes (int): Memory budget of the cached states.
+        spill_dir (Path, optional): Directory where evicted states are stored.
+    """
+
+    def __init__(self, tts_model, max_bytes: int, spill_dir: Path | None = None):
+        self.tts_model = tts_model
+        self.max_bytes = max_bytes
+        self.spill_dir = spill_dir
+        self._entries: OrderedDict[tuple, tuple[dict, int]] = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.spill_hits = 0
+
+    def get(self, voice: Path | str | torch.Tensor, truncate: bool = False) -> dict:
+        return self._get(
+            voice_cache_key(voice, truncate),
+            lambda: self.tts_model.get_state_for_audio_prompt(voice, truncate),
+        )
+
+    def get_uploaded(self, content: bytes, suffix: str = ".wav") -> tuple[str, dict]:
+        """Returns the ID and the truncated state of an uploaded audio prompt.
+
+        Uploads are identified by a hash of their content, so the same clip uploaded again
+        is not encoded and prompted again. The ID can later be given to `get_by_id`.
+        """
+        voice_id = uploaded_voice_id(content)
+        model_state = self._get(("upload", voice_id), lambda: self._prompt_upload(content, suffix))
+        return voice_id, model_state
+
+    def get_by_id(self, voice_id: str) -> dict | None:
+        """Returns the state of a previous upload, or None if it is not cached anymore."""
+        return self._get(("upload", voice_id), None)
+
+    def _get(self, key: tuple, compute: Callable[[], dict] | None) -> dict | None:
+        model_state = self.lookup(key)
+        if model_state is not None:
+            return model_state
+
+        model_state = self._load_spilled(key)
+        if model_state is not None:
+            with self._lock:
+                self.spill_hits += 1
+        elif compute is not None:
+            model_state = compute()
+        else:
+            return None
+        self.put(key, model_state)
+        return model_state
+
+    def _prompt_upload(self, content: bytes, suffix: str) -> dict:
+        # The suffix is kept for format detection.
+        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+            temp_file.write(content)
+            temp_file_path = temp_file.name
+        # The file is closed before being read back (required on Windows).
+        try:
+            return self.tts_model.get_state_for_audio_prompt(Path(temp_file_path), truncate=True)
+        finally:
+            os.unlink(temp_file_path)
+
+    def lookup(self, key: tuple) -> dict | None:
+        """Returns the cached state for `key`, counting a hit or a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key: tuple, model_state: dict):
+        size = size_of_dict(model_state)
+        evicted = []
+        with self._lock:
+            if key in self._entries:
+                self._total_bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (model_state, size)
+            self._total_bytes += size
+            # The most recent entry is always kept, even if it is above the budget by itself.
+            while self._total_bytes > self.max_bytes and len(self._entries) > 1:
+                evicted_key, (evicted_state, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+                self.evictions += 1
+                evicted.append((evicted_key, evicted_state))
+        for evicted_key, evicted_state in evicted:
+            logger.info("Evicted voice %s from the voice cache", evicted_key[1])
+            self._spill(evicted_key, evicted_state)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "spill_hits": self.spill_hits,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def _spill_path(self, key: tuple) -> Path:
+        return self.spill_dir / f"{hashlib.sha256(repr(key).encode()).hexdigest()}.safetensors"
+
+    def _spill(self, key: tuple, model_state: dict):
+        if self.spill_dir is None:
+            return
+        path = self._spill_path(key)
+        if path.exists():
+            return
+        try:
+            self.spill_dir.mkdir(parents=True, exist_ok=True)
+            metadata = {MODEL_STATE_SIGNATURE_KEY: self.tts_model._model_state_signature()}
+            # Written then renamed so that a concurrent reader never sees a partial file.
+            temporary_path = path.with_suffix(".tmp")
+            safetensors.torch.save_file(
+                flatten_model_state(model_state), temporary_path, metadata=metadata
+            )
+            temporary_path.replace(path)
+        except OSError as e:
+            logger.warning("Could not spill voice state to %s: %s", path, e)
+
+    def _load_spilled(self, key: tuple) -> dict | None:
+        if self.spill_dir is None:
+            return None
+        path = self._spill_path(key)
+        if not path.exists():
+            return None
+        return self.tts_model._load_prompted_state(path)
@@ -0,0 +1,52 @@
+import threading
+
+import torch
+from torch import nn
+
+from pocket_tts.modules.transformer import StreamingMultiheadAttention
+
+
+class KVCachePool:
+    """KV caches allocated once and recycled between generations.
+
+    Each entry holds one cache of shape [2, 1, capacity, H, D] per attention module of
+    the model, keyed by module name like the model state. At most `size` entries are
+    allocated. When the requested length is above the capacity or all the entries are
+    in use, `acquire` returns None and the caller should allocate its own cache.
+
+    Args:
+        model (nn.Module): Model whose `StreamingMultiheadAttention` modules get a cache.
+        capacity (int): Number of positions of each cache.
+        size (int): Maximum number of entries.
+    """
+
+    def __init__(self, model: nn.Module, capacity: int, size: int = 2):
+        self.model = model
+        self.capacity = capacity
+        self.size = size
+        self._free: list[dict[str, torch.Tensor]] = []
+        self._allocated = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, length: int) -> dict[str, torch.Tensor] | None:
+        if length > self.capacity:
+            return None
+        with self._lock:
+            if self._free:
+                return self._free.pop()
+            if self._allocated >= self.size:
+                return None
+            self._allocated += 1
+        return self._allocate()
+
+    def release(self, caches: dict[str, torch.Tensor]):
+        """Gives back caches obtained with `acquire`, they must not be used afterwards."""
+        with self._lock:
+            self._free.append(caches)
+
+    def _allocate(self) -> dict[str, torch.Tensor]:
+        return {
+            module_name: module.init_state(batch_size=1, sequence_length=self.capacity)["cache"]
+            for module_name, module in self.model.named_modules()
+            if isinstance(module, StreamingMultiheadAttention)
+        }
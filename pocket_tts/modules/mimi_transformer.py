@@ -87,6 +87,10 @@ class MimiStreamingMultiheadAttention(StatefulModule):
     def increment_step(self, state, increment: int = 1):
         state["offset"] += increment
 
+    def state_batch_dim(self, key: str) -> int | None:
+        # The cache is [2, B, H, T, D].
+        return 1 if key == "cache" else 0
+
     def _complete_kv(self, k, v, model_state: dict | None) -> KVCacheResult:
         if model_state is None:
             return KVCacheResult.from_kv(k, v)
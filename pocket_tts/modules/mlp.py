@@ -5,9 +5,11 @@ https://github.com/LTH14/mar/blob/fe470ac24afbee924668d8c5c83e9fec60af3a73/model
 """
 
 import math
+from functools import partial
 
 import torch
 import torch.nn as nn
+from beartype.typing import Callable
 from typing_extensions import Self
 
 from pocket_tts.utils.config import FlowLMConfig
@@ -105,7 +107,11 @@ class ResBlock(nn.Module):
         )
 
     def forward(self, x, y):
-        shift_mlp, scale_mlp, gate_mlp = self.adaLN_modulation(y).chunk(3, dim=-1)
+        return self.forward_modulated(x, self.adaLN_modulation(y))
+
+    def forward_modulated(self, x, modulation):
+        """Same as `forward` with `modulation = self.adaLN_modulation(y)` already computed."""
+        shift_mlp, scale_mlp, gate_mlp = modulation.chunk(3, dim=-1)
         h = modulate(self.in_ln(x), shift_mlp, scale_mlp)
         h = self.mlp(h)
         return x + gate_mlp * h
@@ -125,7 +131,11 @@ class FinalLayer(nn.Module):
         )
 
     def forward(self, x, c):
-        shift, scale = self.adaLN_modulation(c).chunk(2, dim=-1)
+        return self.forward_modulated(x, self.adaLN_modulation(c))
+
+    def forward_modulated(self, x, modulation):
+        """Same as `forward` with `modulation = self.adaLN_modulation(c)` already computed."""
+        shift, scale = modulation.chunk(2, dim=-1)
         x = modulate(self.norm_final(x), shift, scale)
         x = self.linear(x)
         return x
@@ -173,6 +183,8 @@ class SimpleMLPAdaLN(nn.Module):
 
         self.res_blocks = nn.ModuleList(res_blocks)
         self.final_layer = FinalLayer(model_channels, out_channels)
+        # Combined time embeddings of the LSD steps, per (num_steps, device, dtype).
+        self._lsd_time_embeddings: dict[tuple, torch.Tensor] = {}
 
     @classmethod
     def from_pydantic_config(cls, cfg: FlowLMConfig, latent_dim: int, cond_dim: int) -> Self:
@@ -203,9 +215,7 @@ class SimpleMLPAdaLN(nn.Module):
             f"Expected {self.num_time_conds} time conditions, got {len(ts)}"
         )
         assert self.num_time_conds != 1
-        t_combined = (
-            sum(self.time_embed[i](ts[i]) for i in range(self.num_time_conds)) / self.num_time_conds
-        )
+        t_combined = self._combined_time_embeddings(s, t)
         c = self.cond_embed(c)
         y = t_combined + c
 
@@ -213,3 +223,58 @@ class SimpleMLPAdaLN(nn.Module):
             x = block(x, y)
 
         return self.final_layer(x, y)
+
+    def _load_from_state_dict(self, *args, **kwargs):
+        self._lsd_time_embeddings.clear()
+        return super()._load_from_state_dict(*args, **kwargs)
+
+    def _combined_time_embeddings(self, s: torch.Tensor, t: torch.Tensor) -> torch.Tensor:
+        ts = [s, t]
+        return (
+            sum(self.time_embed[i](ts[i]) for i in range(self.num_time_conds)) / self.num_time_conds
+        )
+
+    def lsd_time_embeddings(
+        self, num_steps: int, device: torch.device, dtype: torch.dtype
+    ) -> torch.Tensor:
+        """Combined time embeddings of the (s, t) pairs of `lsd_decode`, shape [num_steps, C].
+
+        They only depend on the weights and the number of steps, so they are computed once.
+        """
+        key = (num_steps, device, dtype)
+        embeddings = self._lsd_time_embeddings.get(key)
+        if embeddings is None:
+            steps = torch.arange(num_steps, device=device, dtype=dtype)[:, None]
+            embeddings = self._combined_time_embeddings(steps / num_steps, (steps + 1) / num_steps)
+            if not torch.is_grad_enabled():
+                self._lsd_time_embeddings[key] = embeddings
+        return embeddings
+
+    def lsd_flows(
+        self, c: torch.Tensor, num_steps: int
+    ) -> list[Callable[[torch.Tensor], torch.Tensor]]:
+        """Flow of each step of `lsd_decode` for the conditioning `c`, as a function of x.
+
+        Everything that does not depend on x (the condition and time embeddings and the
+        adaLN modulations) is computed for all the steps at once.
+        """
+        time_embeddings = self.lsd_time_embeddings(num_steps, c.device, c.dtype)
+        y = self.cond_embed(c)[None] + time_embeddings.view(num_steps, *[1] * (c.dim() - 1), -1)
+        block_modulations = [block.adaLN_modulation(y) for block in self.res_blocks]
+        final_modulations = self.final_layer.adaLN_modulation(y)
+        return [
+            partial(
+                self._forward_modulated,
+                [modulations[step] for modulations in block_modulations],
+                final_modulations[step],
+            )
+            for step in range(num_steps)
+        ]
+
+    def _forward_modulated(
+        self, block_modulations: list[torch.Tensor], final_modulation: torch.Tensor, x: torch.Tensor
+    ) -> torch.Tensor:
+        x = self.input_proj(x)
+        for block, modulation in zip(self.res_blocks, block_modulations):
+            x = block.forward_modulated(x, modulation)
+        return self.final_layer.forward_modulated(x, final_modulation)
@@ -0,0 +1,38 @@
+"""Dynamic quantization of the linear layers, for faster inference on the CPU."""
+
+import torch
+from torch import nn
+
+from pocket_tts.default_parameters import QUANTIZATION_MODES
+
+
+def quantize_linear_layers(module: nn.Module, mode: str) -> nn.Module:
+    """Replaces the `nn.Linear` layers of `module` by dynamically quantized ones, in place.
+
+    With "int8", the weights are stored as int8 with one scale per layer, and the
+    activations are quantized on the fly at each call, so no calibration is needed. The
+    quantized layers only run on the CPU, and their `weight` is a method rather than a
+    parameter.
+
+    Returns:
+        The module itself, or the quantized layer if `module` is a `nn.Linear`.
+
+    Raises:
+        ValueError: If `mode` is not one of `QUANTIZATION_MODES`.
+    """
+    if mode not in QUANTIZATION_MODES:
+        raise ValueError(
+            f"Unsupported quantization '{mode}', expected one of: {', '.join(QUANTIZATION_MODES)}"
+        )
+    return torch.ao.quantization.quantize_dynamic(
+        module, {nn.Linear}, dtype=torch.qint8, inplace=True
+    )
+
+
+def compute_dtype_and_device(linear: nn.Module) -> tuple[torch.dtype, torch.device]:
+    """dtype and device of the computations of `linear`, quantized or not."""
+    weight = linear.weight
+    if callable(weight):
+        # Dynamically quantized layers run on the CPU and output float32.
+        return torch.float32, torch.device("cpu")
+    return weight.dtype, weight.device
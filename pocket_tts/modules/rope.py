@@ -14,24 +14,48 @@ def apply_rope(
     Args:
         q (torch.Tensor): Queries, shape `[B, T, H, D]`.
         k (torch.Tensor): Keys, shape `[B, T, H, D]`.
-        offset (int): Current offset, e.g. when streaming.
+        offset (int or torch.Tensor): Current offset, e.g. when streaming. A 1-d tensor
+            gives one offset per batch item, e.g. when batching streams at different positions.
         max_period (float): Maximum period for the cos and sin.
     """
 
-    B, T, H, D = q.shape
-    Bk, Tk, Hk, Dk = k.shape
-    assert (B, T, D) == (Bk, Tk, Dk)
-    assert D > 0
-    assert D % 2 == 0
+    D = q.shape[-1]
     assert max_period > 0
+    cos, sin = _rope_tables(_positions(q.shape[1], offset, q.device), D, max_period)
+    return _rotate(q, k, cos, sin)
+
+
+def _positions(T: int, offset: int | torch.Tensor, device: torch.device) -> torch.Tensor:
+    """Positions of the `T` time steps, shape `[T]`, or `[B, T]` for a 1-d tensor offset."""
+    ts = torch.arange(T, device=device, dtype=torch.long)
+    if isinstance(offset, torch.Tensor) and offset.dim() == 1:
+        return ts.view(1, -1) + offset.view(-1, 1).to(ts)
+    return ts + offset
+
 
-    ds = torch.arange(D // 2, device=q.device, dtype=torch.float32)
+def _rope_tables(
+    positions: torch.Tensor, D: int, max_period: int | float
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """Cos and sin of the rotation at the given positions, shape `[*positions.shape, D // 2]`."""
+    assert D > 0
+    assert D % 2 == 0
+    ds = torch.arange(D // 2, device=positions.device, dtype=torch.float32)
     freqs = torch.exp(ds * (-math.log(max_period) * 2 / D))
+    angles = positions[..., None].float() * freqs
+    return torch.cos(angles), torch.sin(angles)
+
+
+def _rotate(
+    q: torch.Tensor, k: torch.Tensor, cos: torch.Tensor, sin: torch.Tensor
+) -> tuple[torch.Tensor, torch.Tensor]:
+    """Rotates `q` and `k` given cos and sin tables of shape `[T, D // 2]` or `[B, T, D // 2]`."""
+    B, T, H, D = q.shape
+    Bk, Tk, Hk, Dk = k.shape
+    assert (B, T, D) == (Bk, Tk, Dk)
 
-    # could be optimized in one call
-    ts = torch.arange(T, device=q.device, dtype=torch.float32)
-    ts += offset
-    ts = ts.view(-1, 1, 1)
+    # Add the heads dimension.
+    rotr = cos.unsqueeze(-2)
+    roti = sin.unsqueeze(-2)
 
     q = q.view(B, T, H, D // 2, 2)
     k = k.view(B, T, Hk, D // 2, 2)
@@ -43,8 +67,6 @@ def apply_rope(
     kr = k[..., 0].float()
     ki = k[..., 1].float()
 
-    rotr = torch.cos(freqs * ts)
-    roti = torch.sin(freqs * ts)
     qor = qr * rotr - qi * roti
     qoi = qr * roti + qi * rotr
 
@@ -68,7 +90,29 @@ class RotaryEmbedding(nn.Module):
     def __init__(self, max_period: float | int = 10000.0):
         super().__init__()
         self.max_period = max_period
+        # Cos and sin tables indexed by position, per (head dim, device). They are grown lazily
+        # and shared by all the layers using this module.
+        self._tables: dict[tuple[int, torch.device], tuple[torch.Tensor, torch.Tensor]] = {}
+
+    def _get_tables(
+        self, length: int, D: int, device: torch.device
+    ) -> tuple[torch.Tensor, torch.Tensor]:
+        tables = self._tables.get((D, device))
+        if tables is None or tables[0].shape[0] < length:
+            capacity = 0 if tables is None else tables[0].shape[0]
+            capacity = max(length, 2 * capacity, 256)
+            positions = torch.arange(capacity, device=device, dtype=torch.long)
+            tables = _rope_tables(positions, D, self.max_period)
+            self._tables[(D, device)] = tables
+        return tables
 
     def forward(self, q: torch.Tensor, k: torch.Tensor, offset: torch.Tensor | int):
         """Apply rope rotation to query or key tensor."""
-        return apply_rope(q, k, offset, self.max_period)
+        B, T, H, D = q.shape
+        if isinstance(offset, torch.Tensor) and offset.dim() == 1:
+            positions = _positions(T, offset, q.device)
+            cos, sin = self._get_tables(int(positions.max()) + 1, D, q.device)
+            return _rotate(q, k, cos[positions], sin[positions])
+        offset = int(offset)
+        cos, sin = self._get_tables(offset + T, D, q.device)
+        return _rotate(q, k, cos[offset : offset + T], sin[offset : offset + T])
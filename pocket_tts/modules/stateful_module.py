@@ -27,6 +27,83 @@ def increment_steps(
         module.increment_step(model_state[module_name], increment)
 
 
+def _stateful_modules(module: nn.Module):
+    for module_name, submodule in module.named_modules():
+        if isinstance(submodule, StatefulModule):
+            yield module_name, submodule
+
+
+def slice_states(
+    module: nn.Module, model_state: dict[str, dict[str, torch.Tensor]], start: int, end: int
+) -> dict[str, dict[str, torch.Tensor]]:
+    """Views on the batch rows `start:end` of the model state, updates are written through."""
+    result = {}
+    for module_name, submodule in _stateful_modules(module):
+        result[module_name] = {}
+        for key, value in model_state[module_name].items():
+            dim = submodule.state_batch_dim(key)
+            if dim is not None:
+                value = value.narrow(dim, start, end - start)
+            result[module_name][key] = value
+    return result
+
+
+def gather_states(
+    module: nn.Module, model_state: dict[str, dict[str, torch.Tensor]], rows: torch.Tensor
+) -> dict[str, dict[str, torch.Tensor]]:
+    """Copies the given batch rows of the model state into a new model state."""
+    result = {}
+    for module_name, submodule in _stateful_modules(module):
+        result[module_name] = {}
+        for key, value in model_state[module_name].items():
+            dim = submodule.state_batch_dim(key)
+            result[module_name][key] = value if dim is None else value.index_select(dim, rows)
+    return result
+
+
+def scatter_states(
+    module: nn.Module,
+    model_state: dict[str, dict[str, torch.Tensor]],
+    rows: torch.Tensor,
+    rows_state: dict[str, dict[str, torch.Tensor]],
+):
+    """Writes back the rows obtained with `gather_states` into the model state."""
+    for module_name, submodule in _stateful_modules(module):
+        for key, value in model_state[module_name].items():
+            dim = submodule.state_batch_dim(key)
+            if dim is not None:
+                value.index_copy_(dim, rows, rows_state[module_name][key])
+
+
+def copy_state_row(
+    module: nn.Module,
+    model_state: dict[str, dict[str, torch.Tensor]],
+    row: int,
+    source_state: dict[str, dict[str, torch.Tensor]],
+    source_row: int,
+):
+    """Overwrites one batch row of the model state with a row of `source_state`."""
+    for module_name, submodule in _stateful_modules(module):
+        for key, value in model_state[module_name].items():
+            dim = submodule.state_batch_dim(key)
+            if dim is not None:
+                source = source_state[module_name][key]
+                value.select(dim, row).copy_(source.select(dim, source_row))
+
+
+def copy_states(
+    model_state: dict[str, dict[str, torch.Tensor]],
+    source_state: dict[str, dict[str, torch.Tensor]],
+):
+    """Overwrites in place every tensor of the model state with the one of `source_state`.
+
+    Used to reset a model state to its initial value without allocating a new one.
+    """
+    for module_name, module_state in model_state.items():
+        for key, value in module_state.items():
+            value.copy_(source_state[module_name][key])
+
+
 class StatefulModule(ABC, nn.Module):
     def __init__(self, *args, **kwds):
         self._module_absolute_name = None
@@ -40,6 +117,10 @@ class StatefulModule(ABC, nn.Module):
     def increment_step(self, state: dict, increment: int = 1):
         pass
 
+    def state_batch_dim(self, key: str) -> int | None:
+        """Dimension of the batch in the state tensor `key`, None if it has no batch dimension."""
+        return 0
+
     def get_state(self, model_state: dict[str, dict[str, torch.Tensor]]) -> dict[str, torch.Tensor]:
         """Get the state for this module from the model state."""
         return model_state[self._module_absolute_name]
@@ -1,22 +1,89 @@
+from functools import lru_cache
+
 import torch
 import torch.nn as nn
 from torch.nn import functional as F
 
+from pocket_tts.modules.quantization import compute_dtype_and_device
 from pocket_tts.modules.rope import RotaryEmbedding
 from pocket_tts.modules.stateful_module import StatefulModule
 
 
 def complete_kv(
-    cache: torch.Tensor, current_end: torch.Tensor, k: torch.Tensor, v: torch.Tensor
+    cache: torch.Tensor, current_end: int, k: torch.Tensor, v: torch.Tensor
 ) -> tuple[torch.Tensor, torch.Tensor]:
-    current_end = current_end.shape[0]
-
     cache[0, :, current_end : current_end + k.shape[1]] = k
     cache[1, :, current_end : current_end + v.shape[1]] = v
     valid = cache[:, :, : current_end + k.shape[1]]
     return valid[0], valid[1]
 
 
+def complete_kv_ragged(
+    cache: torch.Tensor, offsets: torch.Tensor, k: torch.Tensor, v: torch.Tensor
+) -> tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+    """Same as `complete_kv` but each batch item writes at its own offset.
+
+    Returns the keys and values up to the furthest position, along with the boolean
+    attention mask telling which of those positions each query can attend to.
+    The unused part of the cache must hold finite values as it goes through the matmul.
+    In a `torch.compile` graph, the whole cache is returned so that the shapes do not
+    depend on the offsets.
+    """
+    B, T = k.shape[:2]
+    positions = offsets.view(-1, 1) + torch.arange(T, device=offsets.device)
+    rows = torch.arange(B, device=offsets.device).view(-1, 1)
+    cache[0, rows, positions] = k
+    cache[1, rows, positions] = v
+    if torch.compiler.is_compiling():
+        end = cache.shape[2]
+    else:
+        end = int(positions.max()) + 1
+    key_positions = torch.arange(end, device=offsets.device)
+    attn_mask = key_positions <= positions[..., None]
+    # Mask is [B, T, end], add the heads dimension.
+    return cache[0, :, :end], cache[1, :, :end], attn_mask[:, None]
+
+
+def cached_kv(state: dict) -> torch.Tensor:
+    """Keys and values of all the positions in the cache, shape [2, B, current_end, H, D].
+
+    For a copy-on-write state (see `TTSModel._fork_state`), the shared prefix and the
+    tail are concatenated, so the result is a copy.
+    """
+    current_end = int(state["current_end"])
+    prefix = state.get("prefix")
+    if prefix is None:
+        return state["cache"][:, :, :current_end]
+    tail = state["cache"][:, :, : current_end - prefix.shape[2]]
+    return torch.cat([prefix, tail], dim=2)
+
+
+def _split_attention(
+    q: torch.Tensor,
+    keys: list[torch.Tensor],
+    values: list[torch.Tensor],
+    attn_mask: torch.Tensor | None,
+) -> torch.Tensor:
+    """Attention over the concatenation of several blocks of keys and values, without copying them.
+
+    All tensors are [B, H, T, D], the mask is additive and covers all the key blocks.
+    """
+    scale = q.shape[-1] ** -0.5
+    scores = torch.cat([torch.matmul(q, k.transpose(-1, -2)) for k in keys], dim=-1) * scale
+    if attn_mask is not None:
+        scores = scores + attn_mask
+    weights = torch.softmax(scores, dim=-1)
+    x = None
+    start = 0
+    for v in values:
+        end = start + v.shape[-2]
+        block = torch.matmul(weights[..., start:end], v)
+        x = block if x is None else x + block
+        start = end
+    return x
+
+
+@lru_cache(maxsize=16)
 def _materialize_causal_mask(
     shape: tuple[int, ...], shift: int, device: str | torch.device = "cpu"
 ) -> torch.Tensor:
@@ -28,6 +95,7 @@ def _materialize_causal_mask(
     tensor = torch.full(shape, dtype=dtype, fill_value=1, device=device)
     mask = torch.tril(tensor, diagonal=shift).to(dtype)
     mask = torch.log(mask)
+    # The mask is cached and shared, it must not be modified in place.
     return mask.to(dtype)
 
 
@@ -64,32 +132,31 @@ class StreamingMultiheadAttention(StatefulModule):
 
     def init_state(self, batch_size: int, sequence_length: int) -> dict[str, torch.Tensor]:
         dim_per_head = self.embed_dim // self.num_heads
-        initial_current_end = torch.zeros((0,)).to(self.in_proj.weight.device)
+        dtype, device = compute_dtype_and_device(self.in_proj)
         return dict(
-            current_end=initial_current_end,
+            # Number of positions already in the cache. It stays on the CPU so that reading it
+            # back does not synchronize with the device.
+            current_end=torch.zeros((), dtype=torch.long),
             cache=torch.full(
                 (2, batch_size, sequence_length, self.num_heads, dim_per_head),
                 float("NaN"),
-                device=self.in_proj.weight.device,
-                dtype=self.in_proj.weight.dtype,
+                device=device,
+                dtype=dtype,
             ),
         )
 
-    def increment_step(self, state: dict, increment: int = 1):
-        new_size = state["current_end"].shape[0] + increment
-        state["current_end"] = torch.zeros((new_size,)).to(state["current_end"].device)
-
-    def _complete_kv(self, k, v, state: dict | None):
-        k, v = complete_kv(state["cache"], state["current_end"], k, v)
-        return k, v
+    def state_batch_dim(self, key: str) -> int | None:
+        # The cache and prefix are [2, B, T, H, D], current_end is shared by the batch.
+        return {"cache": 1, "prefix": 1, "offsets": 0}.get(key)
 
-    def _apply_rope(self, query: torch.Tensor, key: torch.Tensor, state: dict | None):
-        # Apply rope embeddings to query and key tensors.
-        streaming_offset = self._streaming_offset(state)
-        return self.rope(query, key, offset=streaming_offset)
+    def increment_step(self, state: dict, increment: int = 1):
+        if "offsets" in state:
+            state["offsets"] += increment
+            return
+        state["current_end"] += increment
 
-    def _streaming_offset(self, state: dict | None) -> torch.Tensor | int:
-        return state["current_end"].shape[0]
+    def _streaming_offset(self, state: dict | None) -> int:
+        return int(state["current_end"])
 
     def check_model_state(self, model_state: dict):
         if model_state is None:
@@ -105,16 +172,33 @@ class StreamingMultiheadAttention(StatefulModule):
         d = self.embed_dim // self.num_heads
         packed = projected.view(b, t, 3, self.num_heads, d)
         q, k, v = torch.unbind(packed, dim=2)
-        q, k = self._apply_rope(q, k, state)
-        k, v = self._complete_kv(k, v, state)
-
-        mask_shape = (query.shape[1], query.shape[1] + state["current_end"].shape[0])
-        shift = state["current_end"].shape[0]
-
-        attn_mask = self._get_mask(mask_shape, shift=shift, device=q.device)
+        prefix = state.get("prefix")
+        if "offsets" in state:
+            # Batch of streams at different positions, see `BatchScheduler`.
+            q, k = self.rope(q, k, offset=state["offsets"])
+            k, v, attn_mask = complete_kv_ragged(state["cache"], state["offsets"], k, v)
+        else:
+            current_end = self._streaming_offset(state)
+            q, k = self.rope(q, k, offset=current_end)
+            if prefix is None:
+                k, v = complete_kv(state["cache"], current_end, k, v)
+            else:
+                # Copy-on-write state: the cache only holds the positions after the prefix.
+                k, v = complete_kv(state["cache"], current_end - prefix.shape[2], k, v)
+
+            if t == 1:
+                # A single query attends to all the cached positions, no mask needed.
+                attn_mask = None
+            else:
+                mask_shape = (t, t + current_end)
+                attn_mask = self._get_mask(mask_shape, shift=current_end, device=q.device)
 
         q, k, v = [x.transpose(1, 2) for x in (q, k, v)]
-        x = F.scaled_dot_product_attention(q, k, v, attn_mask)
+        if prefix is None:
+            x = F.scaled_dot_product_attention(q, k, v, attn_mask)
+        else:
+            prefix_k, prefix_v = prefix[0].transpose(1, 2), prefix[1].transpose(1, 2)
+            x = _split_attention(q, [prefix_k, k], [prefix_v, v], attn_mask)
         x = x.transpose(1, 2)
         # Reshape from (b, t, h, d) to (b, t, h*d)
         b, t, h, d = x.shape
@@ -3,6 +3,25 @@ from pathlib import Path
 import yaml
 import re
 
+from pocket_tts.default_parameters import (
+    DEFAULT_AUDIO_PROMPT,
+    DEFAULT_EOS_THRESHOLD,
+    DEFAULT_FRAMES_AFTER_EOS,
+    DEFAULT_LSD_DECODE_STEPS,
+    DEFAULT_NOISE_CLAMP,
+    DEFAULT_TEMPERATURE,
+)
+
+GENERATION_DEFAULTS = {
+    "voice": DEFAULT_AUDIO_PROMPT,
+    "lsd_decode_steps": DEFAULT_LSD_DECODE_STEPS,
+    "temperature": DEFAULT_TEMPERATURE,
+    "speed": 1.0,
+    "noise_clamp": DEFAULT_NOISE_CLAMP,
+    "eos_threshold": DEFAULT_EOS_THRESHOLD,
+    "frames_after_eos": DEFAULT_FRAMES_AFTER_EOS,
+}
+
 def load_persona(persona_name: str, personas_dir: Path | None = None):
     """
     Loads a persona from a Markdown file with YAML frontmatter.
@@ -58,3 +77,26 @@ def list_personas(personas_dir: Path | None = None) -> list[str]:
         return []
 
     return sorted([f.stem for f in personas_dir.glob("*.md")])
+
+
+def resolve_generation_parameters(persona_data: dict, **overrides) -> dict:
+    """
+    Resolves the generation parameters, with precedence: override > persona > default.
+
+    Args:
+        persona_data: The parameters of the persona, as returned by `load_persona`.
+        **overrides: Explicit values of the parameters of `GENERATION_DEFAULTS`, None values
+            are ignored.
+
+    Returns:
+        A dictionary with a value for every parameter of `GENERATION_DEFAULTS`.
+    """
+    unknown = set(overrides) - set(GENERATION_DEFAULTS)
+    if unknown:
+        raise TypeError(f"Unknown generation parameters: {', '.join(sorted(unknown))}")
+    return {
+        name: overrides[name]
+        if overrides.get(name) is not None
+        else persona_data.get(name, default)
+        for name, default in GENERATION_DEFAULTS.items()
+    }
@@ -0,0 +1,569 @@
+"""The pocket-tts server: an HTTP and WebSocket API around one loaded model.
+
+Imported by the `serve` command only, so that the other commands do not pay for
+importing FastAPI and uvicorn.
+"""
+
+import asyncio
+import io
+import logging
+import os
+import socket
+import threading
+from pathlib import Path
+from queue import Queue
+
+import uvicorn
+from fastapi import (
+    FastAPI,
+    File,
+    Form,
+    HTTPException,
+    Request,
+    UploadFile,
+    WebSocket,
+    WebSocketDisconnect,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel
+
+from pocket_tts.data.audio import (
+    AUDIO_FORMATS,
+    check_audio_format,
+    stream_audio_chunks,
+    to_pcm16_bytes,
+)
+from pocket_tts.default_parameters import DEFAULT_AUDIO_PROMPT
+from pocket_tts.models.batch_scheduler import BatchScheduler
+from pocket_tts.models.text_stream import TextStreamSession
+from pocket_tts.models.tts_model import TTSModel
+from pocket_tts.models.voice_cache import UPLOADED_VOICE_PREFIX, VoiceStateCache
+from pocket_tts.personas import load_persona
+from pocket_tts.utils.utils import PREDEFINED_VOICES, display_execution_time, size_of_dict
+from pocket_tts.utils.voice_catalog import get_voice_catalog
+
+logger = logging.getLogger(__name__)
+
+# Global model instance
+tts_model: TTSModel | None = None
+global_model_state = None
+batch_scheduler: BatchScheduler | None = None
+VOICES_DIR = Path(__file__).parent.parent / "tts-voices"
+
+web_app = FastAPI(
+    title="Kyutai Pocket TTS API", description="Text-to-Speech generation API", version="1.0.0"
+)
+web_app.add_middleware(
+    CORSMiddleware,
+    allow_origins=[
+        "http://localhost:3000",
+        "https://pod1-10007.internal.kyutai.org",
+        "https://kyutai.org",
+    ],
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+    expose_headers=["X-Voice-Id"],
+)
+
+
+class SpeechRequest(BaseModel):
+    model: str = "pocket-tts"
+    input: str
+    voice: str | None = None
+    persona: str | None = None
+    response_format: str = "wav"
+    speed: float = 1.0
+
+
+@web_app.get("/")
+async def root():
+    """Serve the frontend."""
+    static_path = Path(__file__).parent / "static" / "index.html"
+    return FileResponse(static_path)
+
+
+@web_app.get("/health")
+async def health():
+    return {"status": "healthy"}
+
+
+@web_app.get("/voice-cache")
+async def voice_cache_stats():
+    """Hit, miss and memory statistics of the voice state cache."""
+    return tts_model.voice_state_cache.stats()
+
+
+@web_app.post("/v1/audio/speech")
+async def openai_speech(request: SpeechRequest, http_request: Request):
+    """OpenAI-compatible TTS endpoint."""
+    if not request.input.strip():
+        raise HTTPException(status_code=400, detail="Input cannot be empty")
+    check_response_format(request.response_format)
+    if not 0.25 <= request.speed <= 4.0:
+        raise HTTPException(status_code=400, detail="Speed must be between 0.25 and 4.0")
+
+    persona_data = {}
+    if request.persona:
+        try:
+            persona_data = load_persona(request.persona)
+        except FileNotFoundError:
+            raise HTTPException(status_code=400, detail=f"Persona '{request.persona}' not found.")
+
+    final_voice = request.voice if request.voice is not None else persona_data.get("voice")
+
+    if not final_voice:
+        project_dir = Path(__file__).parent.parent
+        current_voice_path = project_dir / ".current_voice"
+        if current_voice_path.exists():
+            final_voice = current_voice_path.read_text().strip()
+        else:
+            final_voice = DEFAULT_AUDIO_PROMPT
+    
+    # Use azelma as a fallback default if no voice is found
+    if not final_voice:
+        final_voice = "azelma"
+
+    if final_voice.startswith(UPLOADED_VOICE_PREFIX):
+        model_state = get_uploaded_voice_state(final_voice)
+    else:
+        model_state = tts_model._cached_get_state_for_audio_prompt(final_voice)
+
+    return StreamingResponse(
+        generate_data_with_state(
+            request.input, model_state, http_request, request.response_format, request.speed
+        ),
+        media_type=AUDIO_FORMATS[request.response_format],
+    )
+
+
+def check_response_format(response_format: str):
+    """Raises a 400 error if the audio cannot be streamed in `response_format`."""
+    try:
+        check_audio_format(response_format)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def get_uploaded_voice_state(voice_id: str) -> dict:
+    """State of a voice uploaded earlier, from the ID returned in the `X-Voice-Id` header."""
+    model_state = tts_model.voice_state_cache.get_by_id(voice_id)
+    if model_state is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Voice '{voice_id}' is not cached anymore, upload it again with voice_wav.",
+        )
+    return model_state
+
+
+def get_generate_audio_stream():
+    """The generation function to use, the batch scheduler one when it is enabled."""
+    if batch_scheduler is not None:
+        return batch_scheduler.generate_audio_stream
+    return tts_model.generate_audio_stream
+
+
+def write_to_queue(
+    queue, text_to_generate, model_state, cancel_event=None, audio_format="wav", speed=1.0
+):
+    """Allows writing to the StreamingResponse as if it were a file."""
+
+    class FileLikeToQueue(io.IOBase):
+        def __init__(self, queue):
+            self.queue = queue
+
+        def write(self, data):
+            self.queue.put(data)
+
+        def flush(self):
+            pass
+
+        def close(self):
+            self.queue.put(None)
+
+    audio_chunks = get_generate_audio_stream()(
+        model_state=model_state, text_to_generate=text_to_generate, cancel_event=cancel_event
+    )
+    stream_audio_chunks(
+        FileLikeToQueue(queue),
+        audio_chunks,
+        tts_model.config.mimi.sample_rate,
+        speed=speed,
+        audio_format=audio_format,
+    )
+
+
+async def generate_data_with_state(
+    text_to_generate: str,
+    model_state: dict,
+    request: Request | None = None,
+    audio_format: str = "wav",
+    speed: float = 1.0,
+):
+    """Yields the audio file as it is generated, stopping the generation if the client leaves.
+
+    The disconnection of the client is checked between chunks. The generation is also
+    stopped if the response is closed early, e.g. when the server cancels it.
+    """
+    queue = Queue()
+    cancel_event = threading.Event()
+
+    # Run your function in a thread
+    thread = threading.Thread(
+        target=write_to_queue,
+        args=(queue, text_to_generate, model_state, cancel_event, audio_format, speed),
+    )
+    thread.start()
+
+    # Yield data as it becomes available
+    try:
+        while True:
+            data = await run_in_threadpool(queue.get)
+            if data is None:
+                break
+            if request is not None and await request.is_disconnected():
+                logger.info("Client disconnected, cancelling the generation")
+                break
+            yield data
+    finally:
+        # No-op if the generation is over, otherwise it ends after at most one more frame.
+        cancel_event.set()
+
+
+def websocket_message_error(message, **field_types) -> str | None:
+    """Why a JSON message received on a WebSocket is invalid, None if it is valid.
+
+    `field_types` are the types of the fields that must be checked when they are present.
+    """
+    if not isinstance(message, dict):
+        return "Messages must be JSON objects"
+    for field, field_type in field_types.items():
+        if field in message and not isinstance(message[field], field_type):
+            return f"Invalid '{field}' field"
+    return None
+
+
+async def get_websocket_voice_state(voice: str | None) -> dict | None:
+    """State of a voice given to a WebSocket endpoint, None if it cannot be loaded."""
+    if voice is None:
+        return global_model_state
+    if voice.startswith(UPLOADED_VOICE_PREFIX):
+        return tts_model.voice_state_cache.get_by_id(voice)
+    try:
+        return await run_in_threadpool(tts_model._cached_get_state_for_audio_prompt, voice)
+    except Exception as e:
+        # Only this voice is at fault, the connection can go on with another one.
+        logger.warning("Could not load the voice %r: %s", voice, e)
+        return None
+
+
+@web_app.websocket("/tts/stream")
+async def text_stream(websocket: WebSocket, voice: str | None = None):
+    """Speak text that arrives in fragments, e.g. from a language model.
+
+    The client sends JSON messages `{"text": "..."}` with the fragments, then `{"end": true}`.
+    Each sentence is generated as soon as it is complete. The server sends
+    `{"event": "start", "sample_rate": ...}`, then the audio as binary messages of 16-bit
+    mono PCM, then `{"event": "done"}`.
+    """
+    await websocket.accept()
+    model_state = await get_websocket_voice_state(voice)
+    if model_state is None:
+        await websocket.close(code=1008, reason="Unknown voice")
+        return
+
+    session = TextStreamSession(
+        tts_model, model_state, generate_audio_stream=get_generate_audio_stream()
+    )
+
+    async def receive_text():
+        try:
+            while True:
+                message = await websocket.receive_json()
+                error = websocket_message_error(message, text=str)
+                if error is not None:
+                    await websocket.send_json({"event": "error", "message": error})
+                    continue
+                if "text" in message:
+                    session.feed(message["text"])
+                if message.get("end"):
+                    session.close()
+                    return
+        except (WebSocketDisconnect, ValueError):
+            session.cancel()
+        except BaseException:
+            # Also when the receiver failed, so that the audio does not wait for more text.
+            session.cancel()
+            raise
+
+    receiver = asyncio.create_task(receive_text())
+    audio_chunks = session.audio_chunks()
+    try:
+        sample_rate = tts_model.config.mimi.sample_rate
+        await websocket.send_json({"event": "start", "sample_rate": sample_rate})
+        # Each chunk is generated in a worker thread, so that the text keeps being received.
+        while (chunk := await run_in_threadpool(next, audio_chunks, None)) is not None:
+            await websocket.send_bytes(to_pcm16_bytes(chunk))
+        await websocket.send_json({"event": "done"})
+        await websocket.close()
+    except WebSocketDisconnect:
+        session.cancel()
+    finally:
+        receiver.cancel()
+        audio_chunks.close()
+
+
+@web_app.websocket("/ws/tts")
+async def duplex_tts(websocket: WebSocket, voice: str | None = None):
+    """Speak many utterances over one connection, with the voice state kept between them.
+
+    The client sends JSON messages:
+    - `{"text": "...", "id": ...}` queues an utterance, the optional `id` is sent back.
+    - `{"voice": "..."}` changes the voice of the utterances queued afterwards.
+    - `{"cancel": true}` stops the current utterance and drops the queued ones.
+
+    For each utterance, the server sends `{"event": "start", "id": ..., "sample_rate": ...}`,
+    the audio as binary messages of 16-bit mono PCM, one per decoded frame, then
+    `{"event": "end", "id": ..., "cancelled": ...}`.
+    """
+    await websocket.accept()
+    utterances = asyncio.Queue()
+    # Incremented by each cancellation, an utterance is cancelled if it changed since it was
+    # queued.
+    cancellations = 0
+
+    async def receive_messages():
+        nonlocal cancellations, voice
+        try:
+            while True:
+                message = await websocket.receive_json()
+                error = websocket_message_error(message, text=str, voice=(str, type(None)))
+                if error is not None:
+                    message_id = message.get("id") if isinstance(message, dict) else None
+                    await websocket.send_json(
+                        {"event": "error", "id": message_id, "message": error}
+                    )
+                    continue
+                if message.get("cancel"):
+                    cancellations += 1
+                if "voice" in message:
+                    voice = message["voice"]
+                if "text" in message:
+                    await utterances.put((message["text"], message.get("id"), voice, cancellations))
+        except (WebSocketDisconnect, ValueError):
+            pass
+        finally:
+            # Also when the receiver failed, so that the session ends rather than waits.
+            utterances.put_nowait(None)
+
+    receiver = asyncio.create_task(receive_messages())
+    sample_rate = tts_model.config.mimi.sample_rate
+    try:
+        while (utterance := await utterances.get()) is not None:
+            text, utterance_id, utterance_voice, cancellation = utterance
+            if cancellation != cancellations:
+                await websocket.send_json({"event": "end", "id": utterance_id, "cancelled": True})
+                continue
+            model_state = await get_websocket_voice_state(utterance_voice)
+            if model_state is None or not text.strip():
+                message = "Unknown voice" if model_state is None else "Text cannot be empty"
+                await websocket.send_json(
+                    {"event": "error", "id": utterance_id, "message": message}
+                )
+                continue
+
+            await websocket.send_json(
+                {"event": "start", "id": utterance_id, "sample_rate": sample_rate}
+            )
+            audio_chunks = get_generate_audio_stream()(
+                model_state=model_state, text_to_generate=text
+            )
+            try:
+                # Each frame is generated in a worker thread, so that messages keep being
+                # received and a cancellation is seen after at most one frame.
+                while (
+                    cancellation == cancellations
+                    and (chunk := await run_in_threadpool(next, audio_chunks, None)) is not None
+                ):
+                    await websocket.send_bytes(to_pcm16_bytes(chunk))
+            finally:
+                # Stops the generation if the utterance was cancelled.
+                await run_in_threadpool(audio_chunks.close)
+            await websocket.send_json(
+                {"event": "end", "id": utterance_id, "cancelled": cancellation != cancellations}
+            )
+    except WebSocketDisconnect:
+        pass
+    finally:
+        receiver.cancel()
+
+
+@web_app.post("/tts")
+def text_to_speech(
+    request: Request,
+    text: str = Form(...),
+    voice_url: str | None = Form(None),
+    voice_wav: UploadFile | None = File(None),
+    persona: str | None = Form(None),
+    response_format: str = Form("wav"),
+):
+    """
+    Generate speech from text using the pre-loaded voice prompt or a custom voice.
+
+    Args:
+        text: Text to convert to speech
+        voice_url: Optional voice URL (http://, https://, or hf://), or the `X-Voice-Id`
+            returned for a previous upload
+        voice_wav: Optional uploaded voice file (mutually exclusive with voice_url)
+        persona: Optional persona name
+        response_format: Audio format, one of wav, pcm, flac, opus and mp3
+    """
+    if not text.strip():
+        raise HTTPException(status_code=400, detail="Text cannot be empty")
+    check_response_format(response_format)
+
+    if voice_url is not None and voice_wav is not None:
+        raise HTTPException(status_code=400, detail="Cannot provide both voice_url and voice_wav")
+
+    persona_data = {}
+    if persona:
+        try:
+            persona_data = load_persona(persona)
+        except FileNotFoundError:
+            raise HTTPException(status_code=400, detail=f"Persona '{persona}' not found.")
+
+    final_voice_url = voice_url if voice_url is not None else persona_data.get("voice")
+    voice_id = None
+
+    # Use the appropriate model state
+    if final_voice_url is not None and final_voice_url.startswith(UPLOADED_VOICE_PREFIX):
+        voice_id = final_voice_url
+        model_state = get_uploaded_voice_state(voice_id)
+    elif final_voice_url is not None:
+        # If the voice is a simple name (no path separators), search for it in the tts-voices directory
+        if "/" not in final_voice_url and "\\" not in final_voice_url:
+            found_voice = get_voice_catalog(VOICES_DIR).find(final_voice_url)
+            if found_voice:
+                final_voice_url = str(found_voice)
+                logging.info(f"Found voice file '{final_voice_url}'")
+
+        voice_path = Path(final_voice_url)
+        if voice_path.is_dir():
+            logging.info(f"'{final_voice_url}' is a directory, searching for voice file.")
+            # If a directory is provided, find the first suitable file
+            found_voice = None
+            # Try audio files first
+            for ext in ["wav", "mp3", "flac", "ogg", "aiff"]:
+                files = sorted([f for f in voice_path.glob(f"*.{ext}") if f.stat().st_size > 1000])
+                if files:
+                    found_voice = files[0]
+                    break
+            
+            # Then safetensors
+            if not found_voice:
+                files = sorted([f for f in voice_path.glob("*.safetensors") if f.stat().st_size > 1000])
+                if files:
+                    found_voice = files[0]
+            
+            if found_voice:
+                final_voice_url = str(found_voice)
+                logging.info(f"Found voice file '{final_voice_url}'")
+            else:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"No supported voice file found in directory '{final_voice_url}' (found files may be Git LFS pointers)"
+                )
+
+        is_url = final_voice_url.startswith(("http://", "https://", "hf://"))
+        is_predefined = final_voice_url in PREDEFINED_VOICES
+        # Path.is_file() handles the check for existence.
+        is_file = Path(final_voice_url).is_file()
+
+        if not (is_url or is_predefined or is_file):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Voice '{final_voice_url}' not found. It must be a valid URL, a predefined voice name, a local file path, or a directory containing a voice file."
+            )
+        model_state = tts_model._cached_get_state_for_audio_prompt(final_voice_url)
+        logging.warning("Using voice: %s", final_voice_url)
+    elif voice_wav is not None:
+        # Uploads are cached by content, the ID lets the client reuse the voice without
+        # uploading it again.
+        suffix = Path(voice_wav.filename).suffix if voice_wav.filename else ".wav"
+        voice_id, model_state = tts_model.voice_state_cache.get_uploaded(
+            voice_wav.file.read(), suffix
+        )
+    else:
+        # Use default global model state
+        model_state = global_model_state
+
+    headers = {
+        "Content-Disposition": f"attachment; filename=generated_speech.{response_format}",
+        "Transfer-Encoding": "chunked",
+    }
+    if voice_id is not None:
+        headers["X-Voice-Id"] = voice_id
+    return StreamingResponse(
+        generate_data_with_state(text, model_state, request, response_format),
+        media_type=AUDIO_FORMATS[response_format],
+        headers=headers,
+    )
+
+
+def start_server(
+    voice: str,
+    host: str,
+    port: int,
+    reload: bool,
+    config: str,
+    max_batch_size: int,
+    voice_cache_mb: int,
+    voice_cache_dir: Path | None,
+    quantize: str | None,
+    compile_step: bool,
+    uds: Path | None = None,
+):
+    """Loads the model and the default voice, then serves `web_app`, see the `serve` command.
+
+    With `uds`, the app is served on this Unix domain socket instead of `host` and `port`.
+    """
+    global tts_model, global_model_state, batch_scheduler
+    tts_model = TTSModel.load_model(config, quantize=quantize, compile_step=compile_step)
+    tts_model.voice_state_cache = VoiceStateCache(
+        tts_model, max_bytes=voice_cache_mb * 2**20, spill_dir=voice_cache_dir
+    )
+    if max_batch_size > 0:
+        batch_scheduler = BatchScheduler(tts_model, max_batch_size=max_batch_size)
+    # Index the voices now rather than on the first request.
+    get_voice_catalog(VOICES_DIR).refresh()
+
+    # Pre-load the voice prompt
+    global_model_state = tts_model.get_state_for_audio_prompt(voice)
+    logger.info(f"The size of the model state is {size_of_dict(global_model_state) // 1e6} MB")
+    if compile_step:
+        # Compile now rather than during the first request.
+        with display_execution_time("Compiling the generation step"):
+            for _ in tts_model.generate_audio_stream(global_model_state, "Hello."):
+                pass
+
+    if uds is None:
+        uvicorn.run("pocket_tts.server:web_app", host=host, port=port, reload=reload)
+        return
+    # Bound here rather than by uvicorn, which makes the socket writable by everyone.
+    with _bind_private_socket(uds) as sock:
+        uvicorn.run("pocket_tts.server:web_app", fd=sock.fileno())
+
+
+def _bind_private_socket(path: Path) -> socket.socket:
+    """Binds a Unix socket at `path` that only the user can connect to.
+
+    Nothing can connect before uvicorn listens on it, so the mode is set in time.
+    """
+    # Left by a daemon that did not stop cleanly.
+    path.unlink(missing_ok=True)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.bind(str(path))
+    os.chmod(path, 0o600)
+    return sock
@@ -0,0 +1,103 @@
+"""Storage of prompted model states in .safetensors files.
+
+The tensors of the model state are stored next to the audio prompt, under
+`model_state/<module name>/<key>`, so that the file can still be used by readers that
+only know about the audio prompt.
+"""
+
+import hashlib
+import json
+import mmap
+import struct
+from pathlib import Path
+
+import torch
+
+MODEL_STATE_PREFIX = "model_state/"
+MODEL_STATE_SIGNATURE_KEY = "model_state_signature"
+# Metadata of exported voices, used to tell whether an export is up to date.
+SOURCE_SHA256_KEY = "source_sha256"
+SOURCE_STAT_KEY = "source_stat"
+TRUNCATE_KEY = "truncate"
+
+_SAFETENSORS_DTYPES = {
+    "F64": torch.float64,
+    "F32": torch.float32,
+    "F16": torch.float16,
+    "BF16": torch.bfloat16,
+    "I64": torch.int64,
+    "I32": torch.int32,
+    "I16": torch.int16,
+    "I8": torch.int8,
+    "U8": torch.uint8,
+    "BOOL": torch.bool,
+}
+
+
+def flatten_model_state(model_state: dict[str, dict[str, torch.Tensor]]) -> dict[str, torch.Tensor]:
+    return {
+        f"{MODEL_STATE_PREFIX}{module_name}/{key}": value.contiguous()
+        for module_name, module_state in model_state.items()
+        for key, value in module_state.items()
+    }
+
+
+def unflatten_model_state(tensors: dict[str, torch.Tensor]) -> dict[str, dict[str, torch.Tensor]]:
+    """Inverse of `flatten_model_state`, the other tensors are ignored."""
+    model_state = {}
+    for name, tensor in tensors.items():
+        if name.startswith(MODEL_STATE_PREFIX):
+            module_name, key = name[len(MODEL_STATE_PREFIX) :].rsplit("/", 1)
+            model_state.setdefault(module_name, {})[key] = tensor
+    return model_state
+
+
+def source_stat(path: Path) -> str:
+    """Identifies the version of a source file from its modification time and size."""
+    stat = path.stat()
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+
+def file_sha256(path: Path) -> str:
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
+
+
+def _read_header(f) -> tuple[dict, dict[str, str], int]:
+    (header_size,) = struct.unpack("<Q", f.read(8))
+    header = json.loads(f.read(header_size))
+    metadata = header.pop("__metadata__", None) or {}
+    return header, metadata, 8 + header_size
+
+
+def read_safetensors_header(path: str | Path) -> tuple[list[str], dict[str, str]]:
+    """Returns the tensor names and the metadata of a .safetensors file, without its data."""
+    with open(path, "rb") as f:
+        header, metadata, _ = _read_header(f)
+    return list(header), metadata
+
+
+def mmap_safetensors(path: str | Path) -> tuple[dict[str, torch.Tensor], dict[str, str]]:
+    """Maps a .safetensors file in memory and returns its CPU tensors and metadata.
+
+    The tensors are views on a copy-on-write mapping of the file: nothing is read before
+    being used, and writing to them never modifies the file.
+    """
+    with open(path, "rb") as f:
+        header, metadata, data_start = _read_header(f)
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+    tensors = {}
+    for name, info in header.items():
+        dtype = _SAFETENSORS_DTYPES[info["dtype"]]
+        start, end = info["data_offsets"]
+        if start == end:
+            tensors[name] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        count = (end - start) // dtype.itemsize
+        tensor = torch.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + start)
+        tensors[name] = tensor.reshape(info["shape"])
+    return tensors, metadata
@@ -1,12 +1,13 @@
-import hashlib
 import logging
+import multiprocessing
+import os
+import queue
+import threading
 import time
 from pathlib import Path
 
-import requests
 import safetensors.torch
 import torch
-from huggingface_hub import hf_hub_download
 from torch import nn
 
 PROJECT_ROOT = Path(__file__).parent.parent.parent
@@ -42,6 +43,9 @@ def size_of_dict(state_dict: dict) -> int:
             total_size += value.numel() * value.element_size()
         elif isinstance(value, dict):
             total_size += size_of_dict(value)
+        elif isinstance(value, (tuple, list)):
+            # E.g. the packed (weight, bias) of the quantized linear layers.
+            total_size += size_of_dict(dict(enumerate(value)))
     return total_size
 
 
@@ -65,6 +69,106 @@ class display_execution_time:
         return False  # Don't suppress exceptions
 
 
+class BackgroundWorker:
+    """Long-lived daemon thread running the submitted jobs one after the other.
+
+    The thread is started on the first submission, and started again if it is not alive
+    anymore, e.g. in a child process after a fork. Jobs must handle their own errors.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._jobs = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._jobs = queue.SimpleQueue()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+            self._jobs.put((fn, args))
+
+    def _run(self):
+        jobs = self._jobs
+        while True:
+            fn, args = jobs.get()
+            try:
+                fn(*args)
+            except Exception:
+                logging.getLogger(__name__).exception("Error in %s", self.name)
+
+
+def can_fork() -> bool:
+    return "fork" in multiprocessing.get_all_start_methods()
+
+
+def pin_to_core(worker_index: int):
+    """Pins the current process to one of the cores it may run on, when supported."""
+    if not hasattr(os, "sched_setaffinity"):
+        return
+    cores = sorted(os.sched_getaffinity(0))
+    os.sched_setaffinity(0, {cores[worker_index % len(cores)]})
+
+
+def _forked_worker(fn, worker_index: int, tasks: list, results, pin: bool):
+    if pin:
+        pin_to_core(worker_index)
+    for task_index, task in enumerate(tasks):
+        results.put((worker_index, task_index, fn(task)))
+
+
+def forked_map(fn, task_lists: list[list], pin: bool = True):
+    """Runs `fn` over each list of tasks in its own process, forked from this one.
+
+    The processes share the memory of this one copy-on-write, so `fn` and the tasks are
+    not pickled, only the results are. Yields `(task, result)` pairs as they are done, in
+    any order. The tasks of a process that exited before running them yield a None result.
+
+    Args:
+        fn: Function called on each task, it should handle its own errors.
+        task_lists (list[list]): The tasks of each process.
+        pin (bool): Whether to pin each process to its own core.
+    """
+    context = multiprocessing.get_context("fork")
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_forked_worker, args=(fn, worker_index, tasks, results, pin), daemon=True
+        )
+        for worker_index, tasks in enumerate(task_lists)
+    ]
+    for process in processes:
+        process.start()
+
+    remaining = {
+        (worker_index, task_index)
+        for worker_index, tasks in enumerate(task_lists)
+        for task_index in range(len(tasks))
+    }
+    try:
+        while remaining:
+            workers_alive = any(process.is_alive() for process in processes)
+            try:
+                worker_index, task_index, result = results.get(timeout=1.0)
+            except queue.Empty:
+                # The processes flush the queue before exiting, so if none was alive before
+                # the read, nothing more will come.
+                if workers_alive:
+                    continue
+                break
+            remaining.discard((worker_index, task_index))
+            yield task_lists[worker_index][task_index], result
+        for worker_index, task_index in sorted(remaining):
+            yield task_lists[worker_index][task_index], None
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+
+
 def download_if_necessary(file_path: str) -> Path:
     if file_path.startswith("http://") or file_path.startswith("https://") or file_path.startswith("hf://"):
         local_path = None
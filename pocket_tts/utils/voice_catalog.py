@@ -0,0 +1,146 @@
+"""Index of the voice files of a directory, to resolve voice names without walking it."""
+
+import bisect
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = ("wav", "mp3", "flac", "ogg", "aiff")
+# Files under this size are Git LFS pointers, not actual voices.
+MIN_VOICE_FILE_SIZE = 1000
+DEFAULT_CATALOG_TTL = 10.0
+
+
+class VoiceCatalog:
+    """Maps voice names to the voice files found anywhere under `voices_dir`.
+
+    The directory is walked once, then only the modification times of its subdirectories
+    are checked, at most every `ttl` seconds, and it is walked again if one of them changed.
+    Files smaller than `MIN_VOICE_FILE_SIZE` (Git LFS pointers) are skipped.
+
+    Args:
+        voices_dir (Path): Directory containing the voices, searched recursively.
+        ttl (float): Seconds during which the index is used without any check.
+    """
+
+    def __init__(self, voices_dir: Path, ttl: float = DEFAULT_CATALOG_TTL):
+        self.voices_dir = voices_dir
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._checked_at = None
+        self._directory_mtimes: dict[str, int] = {}
+        # Sorted (stem, path) pairs, for the prefix search of .safetensors files.
+        self._safetensors: list[tuple[str, Path]] = []
+        self._audio: dict[str, dict[str, Path]] = {}
+
+    def find(self, name: str) -> Path | None:
+        """Returns the file of the voice `name`, or None.
+
+        A .safetensors file named `name` is preferred, then one whose name starts with `name`,
+        then an audio file named `name`, in the order of `AUDIO_EXTENSIONS`. Names with a
+        path separator are looked up directly, relative to `voices_dir`.
+        """
+        if "/" in name or "\\" in name:
+            for extension in ("safetensors", *AUDIO_EXTENSIONS):
+                path = self.voices_dir / f"{name}.{extension}"
+                if path.is_file() and path.stat().st_size > MIN_VOICE_FILE_SIZE:
+                    return path
+            return None
+
+        with self._lock:
+            self._refresh_if_needed()
+            safetensors_files = self._safetensors
+            audio_files = self._audio
+
+        # The files are sorted by name, so an exact match comes before the other prefix matches.
+        index = bisect.bisect_left(safetensors_files, (name,))
+        if index < len(safetensors_files) and safetensors_files[index][0].startswith(name):
+            return safetensors_files[index][1]
+        for extension in AUDIO_EXTENSIONS:
+            path = audio_files.get(name, {}).get(extension)
+            if path is not None:
+                return path
+        return None
+
+    def refresh(self):
+        """Walks the directory again."""
+        with self._lock:
+            self._rebuild()
+
+    def _refresh_if_needed(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.ttl:
+            return
+        if self._checked_at is None or self._directories_changed():
+            self._rebuild()
+        self._checked_at = time.monotonic()
+
+    def _directories_changed(self) -> bool:
+        if not self._directory_mtimes:
+            return self.voices_dir.is_dir()
+        for directory, mtime in self._directory_mtimes.items():
+            try:
+                if os.stat(directory).st_mtime_ns != mtime:
+                    return True
+            except OSError:
+                return True
+        return False
+
+    def _rebuild(self):
+        start = time.perf_counter()
+        directory_mtimes = {}
+        safetensors_files = []
+        audio_files = {}
+        for root, directories, files in os.walk(self.voices_dir):
+            directories.sort()
+            directory_mtimes[root] = os.stat(root).st_mtime_ns
+            for file_name in sorted(files):
+                stem, _, extension = file_name.rpartition(".")
+                if extension != "safetensors" and extension not in AUDIO_EXTENSIONS:
+                    continue
+                path = Path(root) / file_name
+                try:
+                    if path.stat().st_size <= MIN_VOICE_FILE_SIZE:
+                        continue
+                except OSError:
+                    continue
+                if extension == "safetensors":
+                    safetensors_files.append((stem, path))
+                else:
+                    audio_files.setdefault(stem, {}).setdefault(extension, path)
+        # The sort is stable: among files with the same name, the first one walked comes first.
+        safetensors_files.sort(key=lambda item: item[0])
+
+        self._directory_mtimes = directory_mtimes
+        self._safetensors = safetensors_files
+        self._audio = audio_files
+        self._checked_at = time.monotonic()
+        logger.debug(
+            "Indexed %d voice files in %s in %.1f ms",
+            len(safetensors_files) + sum(len(files) for files in audio_files.values()),
+            self.voices_dir,
+            (time.perf_counter() - start) * 1000,
+        )
+
+
+_catalogs: dict[Path, VoiceCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_voice_catalog(voices_dir: Path) -> VoiceCatalog:
+    """Returns the catalog of `voices_dir`, shared by all the callers in the process."""
+    voices_dir = voices_dir.resolve()
+    with _catalogs_lock:
+        if voices_dir not in _catalogs:
+            _catalogs[voices_dir] = VoiceCatalog(voices_dir)
+        return _catalogs[voices_dir]
+
+
+def default_voices_dir() -> Path:
+    """Directory of the local voices: `$POCKET_TTS_VOICES_DIR`, or ./tts-voices."""
+    voices_dir = os.environ.get("POCKET_TTS_VOICES_DIR")
+    return Path(voices_dir) if voices_dir else Path.cwd() / "tts-voices"
@@ -0,0 +1,211 @@
+"""Micro-benchmarks for the generation loop.
+
+Usage:
+    uv run python scripts/benchmark_generation.py [benchmark ...] [--steps N]
+
+Without arguments, every benchmark is run.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from functools import partial
+
+import torch
+
+from pocket_tts import TTSModel
+from pocket_tts.models.flow_lm import lsd_decode, lsd_decode_flows
+from pocket_tts.modules.rope import RotaryEmbedding, apply_rope
+from pocket_tts.modules.transformer import StreamingMultiheadAttention
+from pocket_tts.utils.utils import size_of_dict
+
+
+def _timeit(fn, steps: int) -> float:
+    """Returns the mean time of `fn` in microseconds."""
+    fn()
+    start = time.perf_counter()
+    for _ in range(steps):
+        fn()
+    return (time.perf_counter() - start) / steps * 1e6
+
+
+def bench_position_tracking(tts_model: TTSModel, steps: int):
+    """Cost of tracking the KV cache position of every FlowLM layer for one step."""
+    num_layers = sum(
+        isinstance(module, StreamingMultiheadAttention) for module in tts_model.flow_lm.modules()
+    )
+    # Previous representation: a zero tensor of length `current_end`, re-allocated on every step.
+    legacy_states = [torch.zeros((0,)) for _ in range(num_layers)]
+
+    def legacy_step():
+        for i, current_end in enumerate(legacy_states):
+            legacy_states[i] = torch.zeros((current_end.shape[0] + 1,)).to(current_end.device)
+
+    states = [{"current_end": torch.zeros((), dtype=torch.long)} for _ in range(num_layers)]
+
+    def step():
+        for state in states:
+            state["current_end"] += 1
+            int(state["current_end"])
+
+    legacy = _timeit(legacy_step, steps)
+    current = _timeit(step, steps)
+    print(f"position tracking, {num_layers} layers: {legacy:.1f}us -> {current:.1f}us per step")
+
+
+def bench_rope(tts_model: TTSModel, steps: int):
+    """Cost of the rotary embedding of one streaming step in a FlowLM layer."""
+    config = tts_model.config.flow_lm.transformer
+    num_heads = config.num_heads
+    q = torch.randn(1, 1, num_heads, config.d_model // num_heads)
+    rope = RotaryEmbedding(max_period=config.max_period)
+    offset = 200
+
+    recomputed = _timeit(lambda: apply_rope(q, q, offset, rope.max_period), steps)
+    cached = _timeit(lambda: rope(q, q, offset), steps)
+    print(f"rope, T=1: {recomputed:.1f}us -> {cached:.1f}us per layer")
+
+
+def bench_causal_mask(tts_model: TTSModel, steps: int):
+    """Cost of building the causal mask of one streaming step in a FlowLM layer."""
+    current_end = 500
+
+    def materialize():
+        # What `_materialize_causal_mask` computed on every call before being cached.
+        mask = torch.tril(torch.full((1, 1 + current_end), fill_value=1.0), diagonal=current_end)
+        torch.log(mask)
+
+    rebuilt = _timeit(materialize, steps)
+    print(f"causal mask, T=1 at position {current_end}: {rebuilt:.1f}us -> skipped")
+
+
+@torch.no_grad
+def bench_lsd_decode(tts_model: TTSModel, steps: int):
+    """Cost of the flow sampling of one frame, for a few numbers of LSD steps."""
+    flow_net = tts_model.flow_lm.flow_net
+    c = torch.randn(1, tts_model.flow_lm.dim)
+    x_0 = torch.randn(1, tts_model.flow_lm.ldim)
+    for num_steps in [1, 4, 8]:
+        recomputed = _timeit(
+            lambda: lsd_decode(partial(flow_net, c), x_0.clone(), num_steps), steps
+        )
+        precomputed = _timeit(
+            lambda: lsd_decode_flows(flow_net.lsd_flows(c, num_steps), x_0.clone()), steps
+        )
+        print(f"lsd decode, {num_steps} steps: {recomputed:.1f}us -> {precomputed:.1f}us per frame")
+
+
+@torch.no_grad
+def _flow_lm_step_time(tts_model: TTSModel, steps: int, static: bool = False) -> float:
+    """Mean time of one FlowLM generation step after a voice prompt, in microseconds.
+
+    With `static`, the step runs on the state used by the compiled step.
+    """
+    model_state = tts_model.get_state_for_audio_prompt("alba")
+    prompt_length = tts_model._flow_lm_current_end(model_state)
+    tts_model._expand_kv_cache(model_state, sequence_length=prompt_length + steps + 1)
+    if static:
+        model_state = tts_model._to_static_state(model_state)
+    latent = torch.full((1, 1, tts_model.flow_lm.ldim), float("NaN"), device=tts_model.device)
+
+    def step():
+        tts_model._run_flow_lm_and_increment_step(
+            model_state=model_state, backbone_input_latents=latent
+        )
+
+    return _timeit(step, steps)
+
+
+def bench_flow_lm_step(tts_model: TTSModel, steps: int):
+    """Time of one FlowLM generation step after a voice prompt."""
+    print(f"FlowLM step: {_flow_lm_step_time(tts_model, steps) / 1000:.2f}ms")
+
+
+def bench_int8(tts_model: TTSModel, steps: int):
+    """FlowLM step time and model size, in float32 and quantized to int8."""
+    quantized = TTSModel.load_model(quantize="int8")
+    for name, model in [("float32", tts_model), ("int8", quantized)]:
+        step_time = _flow_lm_step_time(model, steps) / 1000
+        size = size_of_dict(model.state_dict()) / 1e6
+        print(f"{name}: FlowLM step {step_time:.2f}ms, model {size:.0f} MB")
+
+
+def bench_compiled_step(tts_model: TTSModel, steps: int):
+    """FlowLM step time, eager and compiled with torch.compile."""
+    eager = _flow_lm_step_time(tts_model, steps, static=True) / 1000
+    compiled_model = TTSModel.load_model(compile_step=True)
+    start = time.perf_counter()
+    # The first steps compile the graph.
+    _flow_lm_step_time(compiled_model, 2, static=True)
+    compile_time = time.perf_counter() - start
+    compiled = _flow_lm_step_time(compiled_model, steps, static=True) / 1000
+    print(f"FlowLM step: eager {eager:.2f}ms -> compiled {compiled:.2f}ms")
+    print(f"compilation: {compile_time:.1f}s (kernels cached on disk for the next runs)")
+
+
+def bench_type_checks(tts_model: TTSModel, steps: int):
+    """Import time and FlowLM step time, with and without the beartype runtime checks."""
+    # `pocket_tts` itself imports the model lazily, the checks apply to the model modules.
+    import_script = (
+        "import time; start = time.perf_counter(); import pocket_tts.models.tts_model; "
+        "print(f'{(time.perf_counter() - start) * 1000:.0f}ms')"
+    )
+    for type_checks in ["1", "0"]:
+        env = {**os.environ, "POCKET_TTS_TYPE_CHECKS": type_checks}
+
+        def run(*args):
+            output = subprocess.run(
+                [sys.executable, *args], env=env, capture_output=True, text=True, check=True
+            ).stdout
+            return output.strip().splitlines()[-1]
+
+        import_time = run("-c", import_script)
+        step_time = run(__file__, "flow_lm_step", "--steps", str(steps))
+        print(f"POCKET_TTS_TYPE_CHECKS={type_checks}: import {import_time}, {step_time}")
+
+
+@torch.no_grad
+def bench_first_chunk_latency(tts_model: TTSModel, steps: int):
+    """Time to the first audio chunk of a short utterance, setup included."""
+    model_state = tts_model.get_state_for_audio_prompt("alba")
+    latencies = []
+    for _ in range(min(steps, 20)):
+        start = time.perf_counter()
+        stream = tts_model.generate_audio_stream(model_state, "Hello.")
+        next(stream)
+        latencies.append(time.perf_counter() - start)
+        stream.close()
+    print(f"first chunk latency: {sum(latencies) / len(latencies) * 1000:.1f}ms")
+
+
+BENCHMARKS = {
+    "position_tracking": bench_position_tracking,
+    "rope": bench_rope,
+    "causal_mask": bench_causal_mask,
+    "lsd_decode": bench_lsd_decode,
+    "flow_lm_step": bench_flow_lm_step,
+    "int8": bench_int8,
+    "compiled_step": bench_compiled_step,
+    "type_checks": bench_type_checks,
+    "first_chunk_latency": bench_first_chunk_latency,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("benchmarks", nargs="*", help=f"Any of {', '.join(BENCHMARKS)}.")
+    parser.add_argument("--steps", type=int, default=200, help="Steps timed per benchmark.")
+    args = parser.parse_args()
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmarks: {', '.join(sorted(unknown))}")
+
+    tts_model = TTSModel.load_model()
+    for name in args.benchmarks or BENCHMARKS:
+        BENCHMARKS[name](tts_model, args.steps)
+
+
+if __name__ == "__main__":
+    main()
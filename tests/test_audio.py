@@ -0,0 +1,97 @@
+import io
+
+import pytest
+import soundfile as sf
+import torch
+
+from pocket_tts.data.audio import audio_format_from_path, check_audio_format, stream_audio_chunks
+from pocket_tts.data.audio_utils import StreamingTimeStretch, time_stretch_chunks
+
+
+class UnseekableStream(io.RawIOBase):
+    def __init__(self):
+        self.data = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.data += data
+        return len(data)
+
+
+def _chunks(sample_rate, num_chunks=10):
+    t = torch.arange(sample_rate // 10 * num_chunks) / sample_rate
+    return list((0.5 * torch.sin(2 * torch.pi * 440 * t)).split(sample_rate // 10))
+
+
+@pytest.mark.parametrize("audio_format", ["wav", "pcm", "flac", "opus", "mp3"])
+def test_streamed_formats_decode(tmp_path, audio_format):
+    try:
+        check_audio_format(audio_format)
+    except ValueError as e:
+        pytest.skip(str(e))
+    sample_rate = 24000
+    chunks = _chunks(sample_rate)
+
+    stream = UnseekableStream()
+    stream_audio_chunks(stream, iter(chunks), sample_rate, audio_format=audio_format)
+    if audio_format == "pcm":
+        assert len(stream.data) == 2 * sum(chunk.shape[0] for chunk in chunks)
+        return
+    if audio_format == "wav":
+        # The length in the header is not known when streaming.
+        assert stream.data.startswith(b"RIFF")
+        return
+    audio, decoded_rate = sf.read(io.BytesIO(bytes(stream.data)), dtype="float32")
+    assert decoded_rate == sample_rate
+    # Lossy codecs add some padding.
+    assert audio.shape[0] >= sum(chunk.shape[0] for chunk in chunks) * 0.95
+
+    path = tmp_path / f"speech.{audio_format}"
+    stream_audio_chunks(path, iter(chunks), sample_rate)
+    assert sf.info(str(path)).samplerate == sample_rate
+
+
+def test_audio_formats():
+    assert audio_format_from_path("out/speech.OGG") == "opus"
+    assert audio_format_from_path("speech.raw") == "pcm"
+    assert audio_format_from_path("speech.txt") == "wav"
+    with pytest.raises(ValueError, match="Unsupported audio format"):
+        check_audio_format("aac")
+
+
+@pytest.mark.parametrize("speed", [0.8, 1.5])
+def test_time_stretch_keeps_the_pitch(speed):
+    sample_rate = 24000
+    chunks = _chunks(sample_rate)
+    audio = torch.cat(chunks)
+
+    streamed = torch.cat(list(time_stretch_chunks(iter(chunks), sample_rate, speed)))
+    time_stretch = StreamingTimeStretch(sample_rate, speed)
+    whole = torch.cat([time_stretch.process(audio), time_stretch.flush()])
+
+    assert streamed.shape[0] == round(audio.shape[0] / speed)
+    # The output does not depend on how the input is chunked.
+    torch.testing.assert_close(streamed, whole)
+    spectrum = torch.fft.rfft(streamed).abs()
+    peak_frequency = spectrum.argmax().item() * sample_rate / streamed.shape[0]
+    assert abs(peak_frequency - 440) < 5
+
+
+@pytest.mark.parametrize("speed", [0.8, 1.5, 4.0])
+@pytest.mark.parametrize("num_samples", [2760, 9592])
+def test_time_stretch_length(speed, num_samples):
+    sample_rate = 24000
+    audio = torch.randn(num_samples)
+    time_stretch = StreamingTimeStretch(sample_rate, speed)
+
+    output_length = 0
+    input_length = 0
+    for chunk in audio.split(1000):
+        input_length += chunk.shape[0]
+        output_length += time_stretch.process(chunk).shape[0]
+        assert output_length <= round(input_length / speed)
+    output_length += time_stretch.flush().shape[0]
+
+    assert output_length == round(num_samples / speed)
@@ -0,0 +1,81 @@
+import json
+from pathlib import Path
+
+from typer.testing import CliRunner
+
+from pocket_tts.batch import read_manifest, split_items
+from pocket_tts.data.audio import audio_read
+from pocket_tts.default_parameters import DEFAULT_AUDIO_PROMPT, DEFAULT_TEMPERATURE
+from pocket_tts.main import cli_app
+
+runner = CliRunner()
+
+
+def test_read_manifest_resolves_parameters(tmp_path, monkeypatch):
+    personas_dir = tmp_path / "personas"
+    personas_dir.mkdir()
+    (personas_dir / "calm.md").write_text("---\nvoice: marius\ntemperature: 0.5\n---\n")
+    monkeypatch.setenv("POCKET_TTS_PERSONAS_DIR", str(personas_dir))
+
+    manifest = tmp_path / "manifest.csv"
+    manifest.write_text(
+        "text,output,voice,persona,temperature\n"
+        "Hello.,a.wav,,,\n"
+        "Hi.,/tmp/b.wav,,calm,\n"
+        "Hey.,c.wav,alba,calm,0.9\n"
+    )
+    items = read_manifest(manifest, tmp_path / "out")
+
+    assert [item["output"] for item in items] == [
+        tmp_path / "out" / "a.wav",
+        Path("/tmp/b.wav"),
+        tmp_path / "out" / "c.wav",
+    ]
+    voices = [item["parameters"]["voice"] for item in items]
+    assert voices == [DEFAULT_AUDIO_PROMPT, "marius", "alba"]
+    assert [item["parameters"]["temperature"] for item in items] == [DEFAULT_TEMPERATURE, 0.5, 0.9]
+
+    jsonl_manifest = tmp_path / "manifest.jsonl"
+    jsonl_manifest.write_text(
+        json.dumps({"text": "Hello.", "output": "a.wav", "lsd_decode_steps": "4"}) + "\n\n"
+    )
+    (item,) = read_manifest(jsonl_manifest, tmp_path)
+    assert item["parameters"]["lsd_decode_steps"] == 4
+
+
+def test_split_items_keeps_voices_together():
+    voices = ["alba"] * 4 + ["marius"] * 3 + ["javert"]
+    items = [
+        {"index": i, "text": "Some text.", "parameters": {"voice": voice}}
+        for i, voice in enumerate(voices)
+    ]
+    workers = split_items(items, num_workers=2)
+
+    assert sorted(item["index"] for worker in workers for item in worker) == list(range(8))
+    assert [len(worker) for worker in workers] == [4, 4]
+    for worker in workers:
+        worker_voices = [item["parameters"]["voice"] for item in worker]
+        # Each voice is contiguous within a worker.
+        assert worker_voices == sorted(worker_voices, key=worker_voices.index)
+
+
+def test_batch_command(tmp_path):
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text(
+        json.dumps({"text": "Hello world.", "output": "hello.wav"})
+        + "\n"
+        + json.dumps({"text": "Another test.", "output": "sub/other.wav", "voice": "marius"})
+        + "\n"
+    )
+
+    result = runner.invoke(cli_app, ["batch", str(manifest), "--output-dir", str(tmp_path)])
+
+    assert result.exit_code == 0
+    for output in [tmp_path / "hello.wav", tmp_path / "sub" / "other.wav"]:
+        audio, sample_rate = audio_read(str(output))
+        assert audio.shape[1] > 0
+    summaries = [
+        json.loads(line) for line in (tmp_path / "manifest.summary.jsonl").read_text().splitlines()
+    ]
+    assert [summary["status"] for summary in summaries] == ["ok", "ok"]
+    assert all(summary["rtf"] > 0 for summary in summaries)
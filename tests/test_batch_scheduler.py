@@ -0,0 +1,84 @@
+import threading
+
+import torch
+
+from pocket_tts import TTSModel
+from pocket_tts.models.batch_scheduler import BatchedMimiDecoder, BatchScheduler
+from pocket_tts.modules.rope import RotaryEmbedding
+from pocket_tts.modules.stateful_module import increment_steps, init_states
+from pocket_tts.modules.transformer import StreamingMultiheadAttention
+
+
+@torch.no_grad
+def test_ragged_attention_matches_single_streams():
+    """A batch of streams at different positions gives the same outputs as each stream alone."""
+    torch.manual_seed(0)
+    attention = StreamingMultiheadAttention(embed_dim=64, num_heads=4, rope=RotaryEmbedding())
+    prompt_lengths = [3, 7]
+    capacity = 10
+
+    single_states = []
+    expected = []
+    queries = torch.randn(len(prompt_lengths), 1, 1, 64)
+    for prompt_length, query in zip(prompt_lengths, queries):
+        state = init_states(attention, batch_size=1, sequence_length=capacity)
+        attention(torch.randn(1, prompt_length, 64), state)
+        increment_steps(attention, state, increment=prompt_length)
+        single_states.append(state)
+        expected.append(attention(query, state))
+
+    cache = torch.zeros(2, len(prompt_lengths), capacity, 4, 16)
+    for row, (prompt_length, state) in enumerate(zip(prompt_lengths, single_states)):
+        cache[:, row, :prompt_length] = state[""]["cache"][:, 0, :prompt_length]
+    batched_state = {"": dict(cache=cache, offsets=torch.tensor(prompt_lengths))}
+    batched = attention(torch.cat(list(queries)), batched_state)
+
+    torch.testing.assert_close(batched, torch.cat(expected), rtol=1e-4, atol=1e-5)
+
+
+def test_batch_scheduler_concurrent_requests():
+    tts_model = TTSModel.load_model()
+    voice_state = tts_model.get_state_for_audio_prompt("alba")
+    scheduler = BatchScheduler(tts_model, max_batch_size=2)
+
+    texts = ["Hello world, this is a test.", "A second request, generated at the same time."]
+    audios = [None] * len(texts)
+
+    def generate(index):
+        chunks = list(scheduler.generate_audio_stream(voice_state, texts[index]))
+        audios[index] = torch.cat(chunks)
+
+    threads = [threading.Thread(target=generate, args=(i,)) for i in range(len(texts))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for audio in audios:
+        assert audio is not None
+        assert audio.shape[0] > tts_model.sample_rate // 2
+
+
+@torch.no_grad
+def test_batched_mimi_decoder_matches_single_streams():
+    tts_model = TTSModel.load_model()
+    decoder = BatchedMimiDecoder(tts_model, max_batch_size=3)
+    mimi_context = tts_model.config.mimi.transformer.context
+    torch.manual_seed(0)
+    latents = torch.randn(4, 2, 1, tts_model.flow_lm.ldim)
+
+    single_states = [
+        init_states(tts_model.mimi, batch_size=1, sequence_length=mimi_context) for _ in range(2)
+    ]
+    for step_latents in latents:
+        batched = decoder.decode(["first", "second"], step_latents)
+        for stream, latent in enumerate(step_latents):
+            expected = tts_model._decode_latent(latent[None], single_states[stream])
+            torch.testing.assert_close(batched[stream], expected, rtol=1e-4, atol=1e-4)
+
+    # A released row is reused with a fresh state.
+    decoder.release("first")
+    fresh = decoder.decode(["third"], latents[0, :1])[0]
+    single_state = init_states(tts_model.mimi, batch_size=1, sequence_length=mimi_context)
+    expected = tts_model._decode_latent(latents[0, :1], single_state)
+    torch.testing.assert_close(fresh, expected, rtol=1e-4, atol=1e-4)
@@ -1,7 +1,6 @@
 """Integration tests for the CLI generate command using real implementation."""
 
 import os
-from unittest.mock import patch
 
 import pytest
 from typer.testing import CliRunner
@@ -245,15 +244,25 @@ def test_generate_with_speed(tmp_path):
     audio_normal, _ = audio_read(str(output_file_normal))
 
     # Generate at faster speed
-    with patch('torchaudio.functional.speed') as mock_speed:
-        result_fast = runner.invoke(
-            cli_app,
-            ["generate", "--text", "This is a test sentence.", "--speed", "1.5", "--output-path", str(output_file_fast)],
-        )
-        assert result_fast.exit_code == 0
-        mock_speed.assert_called_once()
+    result_fast = runner.invoke(
+        cli_app,
+        ["generate", "--text", "This is a test sentence.", "--speed", "1.5", "--output-path", str(output_file_fast)],
+    )
+    assert result_fast.exit_code == 0
 
     audio_fast, _ = audio_read(str(output_file_fast))
 
     # The faster audio should be shorter
     assert audio_fast.shape[1] < audio_normal.shape[1]
+
+
+def test_generate_rejects_unknown_quantization(tmp_path):
+    """Test that an unsupported --quantize fails before the model is loaded."""
+    output_file = tmp_path / "test_output.wav"
+
+    result = runner.invoke(
+        cli_app, ["generate", "--quantize", "int4", "--output-path", str(output_file)]
+    )
+
+    assert result.exit_code != 0
+    assert not output_file.exists()
@@ -0,0 +1,55 @@
+import torch
+
+from pocket_tts import TTSModel
+
+NUM_FRAMES = 10
+
+
+@torch.no_grad
+def _generate_latents(tts_model: TTSModel, text: str, static: bool) -> torch.Tensor:
+    model_state = tts_model.get_state_for_audio_prompt("alba")
+    tokens = tts_model.flow_lm.conditioner.prepare(text).tokens
+    prompt_length = tts_model._flow_lm_current_end(model_state)
+    tts_model._expand_kv_cache(model_state, prompt_length + tokens.shape[1] + NUM_FRAMES + 1)
+    tts_model._run_flow_lm_and_increment_step(model_state=model_state, text_tokens=tokens)
+    step_state = tts_model._to_static_state(model_state) if static else model_state
+
+    latent = torch.full((1, 1, tts_model.flow_lm.ldim), float("NaN"))
+    latents = []
+    for _ in range(NUM_FRAMES):
+        latent, _ = tts_model._run_flow_lm_and_increment_step(
+            model_state=step_state, backbone_input_latents=latent
+        )
+        latents.append(latent)
+    if static:
+        tts_model._from_static_state(step_state, model_state)
+        assert tts_model._flow_lm_current_end(model_state) == (
+            prompt_length + tokens.shape[1] + NUM_FRAMES
+        )
+    return torch.cat(latents, dim=1)
+
+
+def test_compiled_step_matches_eager():
+    tts_model = TTSModel.load_model(temp=0)
+    expected = _generate_latents(tts_model, "Hello world.", static=False)
+
+    tts_model._compile_step()
+    latents = _generate_latents(tts_model, "Hello world.", static=True)
+
+    assert tts_model._compiled_run_flow_lm is not None, "the compiled step fell back to eager"
+    torch.testing.assert_close(latents, expected, atol=1e-3, rtol=1e-3)
+
+
+def test_compiled_step_copies_the_voice_in_pooled_caches():
+    tts_model = TTSModel.load_model(temp=0)
+    tts_model._compile_step()
+    voice_state = tts_model.get_state_for_audio_prompt("alba")
+    voice_cache = voice_state["transformer.layers.0.self_attn"]["cache"].clone()
+
+    for text in ["Hello world.", "How are you doing today?"]:
+        tts_model.generate_audio(voice_state, text)
+
+    # The caches have the same length whatever the text, so the step is compiled once.
+    assert tts_model._static_kv_cache_pool._allocated >= 1
+    assert tts_model._kv_cache_pool._allocated == 0
+    torch.testing.assert_close(voice_state["transformer.layers.0.self_attn"]["cache"], voice_cache)
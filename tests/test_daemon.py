@@ -0,0 +1,79 @@
+import io
+import socketserver
+import tempfile
+import threading
+import urllib.parse
+from http.server import BaseHTTPRequestHandler
+from pathlib import Path
+
+import pytest
+
+from pocket_tts.daemon_client import daemon_is_running, generate_with_daemon
+
+
+class _FakeDaemonHandler(BaseHTTPRequestHandler):
+    """Answers like the `/tts` endpoint, with the text as the audio."""
+
+    requests = []
+
+    def do_GET(self):
+        self.send_response(200 if self.path == "/health" else 404)
+        self.end_headers()
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        fields = dict(urllib.parse.parse_qsl(body.decode()))
+        self.requests.append(fields)
+        if fields["text"] == "fail":
+            self.send_response(400)
+            self.end_headers()
+            self.wfile.write(b"Text cannot be empty")
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "audio/wav")
+        self.end_headers()
+        self.wfile.write(b"RIFF" + fields["text"].encode())
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+@pytest.fixture
+def fake_daemon():
+    # Not in tmp_path, whose path can be too long for a Unix socket.
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        socket_path = Path(tmp_dir) / "pocket-tts.sock"
+        _FakeDaemonHandler.requests = []
+        with _UnixHTTPServer(str(socket_path), _FakeDaemonHandler) as server:
+            thread = threading.Thread(target=server.serve_forever)
+            thread.start()
+            yield socket_path
+            server.shutdown()
+            thread.join()
+
+
+def test_generate_with_daemon(fake_daemon):
+    assert daemon_is_running(fake_daemon)
+    output = io.BytesIO()
+
+    assert generate_with_daemon("Hello.", output, voice="alba", socket_path=fake_daemon)
+
+    assert output.getvalue() == b"RIFFHello."
+    assert _FakeDaemonHandler.requests == [
+        {"text": "Hello.", "voice_url": "alba", "response_format": "wav"}
+    ]
+    with pytest.raises(RuntimeError, match="status 400"):
+        generate_with_daemon("fail", io.BytesIO(), socket_path=fake_daemon)
+
+
+def test_generate_without_daemon(tmp_path):
+    socket_path = tmp_path / "missing.sock"
+    output = io.BytesIO()
+
+    assert not daemon_is_running(socket_path)
+    assert not generate_with_daemon("Hello.", output, socket_path=socket_path)
+    assert output.getvalue() == b""
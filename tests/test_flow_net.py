@@ -0,0 +1,25 @@
+from functools import partial
+
+import torch
+
+from pocket_tts.models.flow_lm import lsd_decode, lsd_decode_flows
+from pocket_tts.modules.mlp import SimpleMLPAdaLN
+
+
+@torch.no_grad
+def test_precomputed_lsd_flows_match_flow_net():
+    torch.manual_seed(0)
+    # in_channels, model_channels, out_channels, cond_channels, num_res_blocks
+    flow_net = SimpleMLPAdaLN(8, 32, 8, 16, 3, num_time_conds=2)
+    c = torch.randn(2, 16)
+    x_0 = torch.randn(2, 8)
+
+    for num_steps in [1, 4]:
+        expected = lsd_decode(partial(flow_net, c), x_0.clone(), num_steps)
+        actual = lsd_decode_flows(flow_net.lsd_flows(c, num_steps), x_0.clone())
+        torch.testing.assert_close(actual, expected, rtol=1e-4, atol=1e-5)
+
+    # The cached time embeddings are dropped when new weights are loaded.
+    assert flow_net._lsd_time_embeddings
+    flow_net.load_state_dict(flow_net.state_dict())
+    assert not flow_net._lsd_time_embeddings
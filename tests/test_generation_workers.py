@@ -0,0 +1,35 @@
+import threading
+
+from pocket_tts import TTSModel
+
+
+def test_closed_stream_frees_the_workers():
+    tts_model = TTSModel.load_model()
+    voice_state = tts_model.get_state_for_audio_prompt("alba")
+
+    stream = tts_model.generate_audio_stream(voice_state, "This sentence is never heard in full.")
+    next(stream)
+    stream.close()
+
+    # The persistent workers are reused and the next generation is complete.
+    generation_thread = tts_model._generation_worker._thread
+    audio = tts_model.generate_audio(voice_state, "Hello world.")
+    assert audio.shape[0] > tts_model.sample_rate // 4
+    assert tts_model._generation_worker._thread is generation_thread
+
+
+def test_cancel_event_stops_the_generation():
+    tts_model = TTSModel.load_model()
+    voice_state = tts_model.get_state_for_audio_prompt("alba")
+    text = "This is a long text. " * 20
+    cancel_event = threading.Event()
+
+    chunks = []
+    for chunk in tts_model.generate_audio_stream(voice_state, text, cancel_event=cancel_event):
+        chunks.append(chunk)
+        cancel_event.set()
+
+    # The frames generated before the cancellation was seen are dropped.
+    assert len(chunks) == 1
+    audio = tts_model.generate_audio(voice_state, "Hello world.")
+    assert audio.shape[0] > tts_model.sample_rate // 4
@@ -0,0 +1,46 @@
+import subprocess
+import sys
+
+import pytest
+
+# Relative to the import of typer in the same process, so that it does not depend on the load
+# of the machine. Importing torch is about 40 times slower than typer.
+CLI_IMPORT_BUDGET_TYPER_IMPORTS = 15
+
+
+def _import_times(*modules: str) -> dict[str, float]:
+    """Cumulative import time of every module imported by importing `modules` in order.
+
+    In seconds, a module imported by an earlier one is not counted again.
+    """
+    imports = "; ".join(f"import {module}" for module in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", imports],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.removeprefix("import time:").split("|")
+        times[name.strip()] = int(cumulative) / 1e6
+    return times
+
+
+@pytest.mark.parametrize("module", ["pocket_tts.main", "pocket_tts.daemon_client"])
+def test_command_line_modules_import_no_heavy_dependency(module):
+    times = _import_times("typer", module)
+
+    heavy = {"torch", "fastapi", "uvicorn", "scipy", "soundfile", "huggingface_hub"}
+    assert not heavy & times.keys()
+    assert times[module] < CLI_IMPORT_BUDGET_TYPER_IMPORTS * times["typer"]
+
+
+@pytest.mark.parametrize("module", ["pocket_tts.models.tts_model", "pocket_tts.batch"])
+def test_generation_does_not_import_the_server(module):
+    times = _import_times(module)
+
+    assert "torch" in times
+    assert not {"fastapi", "uvicorn", "scipy", "soundfile"} & times.keys()
@@ -0,0 +1,31 @@
+import torch
+
+from pocket_tts import TTSModel
+from pocket_tts.modules.kv_cache import KVCachePool
+from pocket_tts.modules.rope import RotaryEmbedding
+from pocket_tts.modules.transformer import StreamingMultiheadAttention
+
+
+def test_kv_cache_pool_recycles_caches():
+    attention = StreamingMultiheadAttention(embed_dim=64, num_heads=4, rope=RotaryEmbedding())
+    pool = KVCachePool(torch.nn.ModuleDict({"attn": attention}), capacity=10, size=1)
+
+    assert pool.acquire(11) is None
+    caches = pool.acquire(10)
+    assert caches["attn"].shape == (2, 1, 10, 4, 16)
+    # All the entries are in use.
+    assert pool.acquire(5) is None
+    pool.release(caches)
+    assert pool.acquire(5) is caches
+
+
+def test_generation_reuses_pooled_kv_caches():
+    tts_model = TTSModel.load_model()
+    voice_state = tts_model.get_state_for_audio_prompt("alba")
+    voice_cache = voice_state["transformer.layers.0.self_attn"]["cache"].clone()
+
+    for _ in range(2):
+        tts_model.generate_audio(voice_state, "Hello world.")
+
+    assert tts_model._kv_cache_pool._allocated >= 1
+    torch.testing.assert_close(voice_state["transformer.layers.0.self_attn"]["cache"], voice_cache)
@@ -1,7 +1,8 @@
 import tempfile
 from pathlib import Path
 import pytest
-from pocket_tts.personas import load_persona, list_personas
+from pocket_tts.default_parameters import DEFAULT_EOS_THRESHOLD
+from pocket_tts.personas import load_persona, list_personas, resolve_generation_parameters
 
 def test_load_persona():
     persona_content = """---
@@ -42,3 +43,14 @@ def test_list_personas():
         assert "persona1" in personas
         assert "persona2" in personas
         assert "not_a_persona" not in personas
+
+def test_resolve_generation_parameters():
+    persona_data = {"voice": "marius", "temperature": 0.8, "speed": 1.2}
+    parameters = resolve_generation_parameters(persona_data, temperature=0.5, voice=None)
+
+    assert parameters["voice"] == "marius"
+    assert parameters["temperature"] == 0.5
+    assert parameters["speed"] == 1.2
+    assert parameters["eos_threshold"] == DEFAULT_EOS_THRESHOLD
+    with pytest.raises(TypeError):
+        resolve_generation_parameters(persona_data, temprature=0.5)
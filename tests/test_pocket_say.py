@@ -1,5 +1,6 @@
 import os
 import shutil
+import socket
 import subprocess
 import tempfile
 from pathlib import Path
@@ -31,6 +32,7 @@ def test_env():
         # Create dummy curl
         curl_mock = bin_dir / "curl"
         curl_mock.write_text("""#!/bin/bash
+STATUS=200
 while [[ $# -gt 0 ]]; do
     case $1 in
         --output)
@@ -38,6 +40,19 @@ while [[ $# -gt 0 ]]; do
             echo "RIFF....WAVE" > "$2"
             shift 2
             ;;
+        --unix-socket)
+            echo "SOCKET: $2" >> "$TEST_LOG"
+            STATUS="${DAEMON_HTTP_STATUS:-200}"
+            shift 2
+            ;;
+        -w)
+            echo -n "$STATUS"
+            shift 2
+            ;;
+        http://*)
+            echo "URL: $1" >> "$TEST_LOG"
+            shift
+            ;;
         --data-urlencode)
             if [[ "$2" == voice_url=* ]]; then
                 echo "VOICE: ${2#voice_url=}" >> "$TEST_LOG"
@@ -77,6 +92,7 @@ exit 0
         env["PATH"] = f"{bin_dir}:{env['PATH']}"
         env["AUDIO_STATE_FILE"] = str(audio_state_file)
         env["TEST_LOG"] = str(test_log)
+        env["POCKET_TTS_SOCKET"] = str(tmp_path / "pocket-tts.sock")
 
         yield {
             "tmp_path": tmp_path,
@@ -204,3 +220,53 @@ def test_pocket_say_muted(test_env):
     if test_env["test_log"].exists():
         log_content = test_env["test_log"].read_text()
         assert "PLAYING" not in log_content
+
+
+def test_pocket_say_uses_the_daemon(test_env):
+    """Test that pocket-say sends the request to the daemon socket when there is one."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as daemon_socket:
+        daemon_socket.bind(test_env["env"]["POCKET_TTS_SOCKET"])
+        subprocess.run([test_env["pocket_say"], "hello"], env=test_env["env"], check=True)
+
+    log_content = test_env["test_log"].read_text()
+    assert f"SOCKET: {test_env['env']['POCKET_TTS_SOCKET']}" in log_content
+    assert "URL: http://localhost/tts" in log_content
+    assert "localhost:8000" not in log_content
+    assert "PLAYING" in log_content
+
+
+def test_pocket_say_without_daemon_uses_the_server(test_env):
+    """Test that pocket-say falls back to the HTTP server when no daemon is running."""
+    subprocess.run([test_env["pocket_say"], "hello"], env=test_env["env"], check=True)
+
+    log_content = test_env["test_log"].read_text()
+    assert "SOCKET:" not in log_content
+    assert "URL: http://localhost:8000/tts" in log_content
+
+
+def test_pocket_say_reports_the_daemon_error(test_env):
+    """Test that pocket-say does not fall back to the HTTP server when the daemon fails."""
+    test_env["env"]["DAEMON_HTTP_STATUS"] = "400"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as daemon_socket:
+        daemon_socket.bind(test_env["env"]["POCKET_TTS_SOCKET"])
+        result = subprocess.run(
+            [test_env["pocket_say"], "hello"], env=test_env["env"], capture_output=True
+        )
+
+    assert result.returncode == 1
+    assert b"The daemon failed with status 400" in result.stderr
+    log_content = test_env["test_log"].read_text()
+    assert "localhost:8000" not in log_content
+    assert "PLAYING" not in log_content
+
+
+def test_pocket_say_with_a_stale_daemon_socket_uses_the_server(test_env):
+    """Test that pocket-say falls back to the HTTP server when nothing answers on the socket."""
+    test_env["env"]["DAEMON_HTTP_STATUS"] = "000"
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as daemon_socket:
+        daemon_socket.bind(test_env["env"]["POCKET_TTS_SOCKET"])
+        subprocess.run([test_env["pocket_say"], "hello"], env=test_env["env"], check=True)
+
+    log_content = test_env["test_log"].read_text()
+    assert "URL: http://localhost:8000/tts" in log_content
+    assert "PLAYING" in log_content
@@ -0,0 +1,75 @@
+import pytest
+import torch
+import torch.nn.functional as F
+
+from pocket_tts import TTSModel
+from pocket_tts.modules.quantization import quantize_linear_layers
+from pocket_tts.modules.stateful_module import init_states
+from pocket_tts.utils.utils import size_of_dict
+
+CORPUS = [
+    "Hello world.",
+    "The quick brown fox jumps over the lazy dog.",
+    "Could you call me back tomorrow morning, around nine?",
+]
+NUM_FRAMES = 25
+
+
+@torch.no_grad
+def _generate_latents(
+    tts_model: TTSModel, text: str, input_latents: torch.Tensor | None = None
+) -> torch.Tensor:
+    """Latents predicted at each step, from `input_latents` if given (teacher forcing)."""
+    model_state = tts_model.get_state_for_audio_prompt("alba")
+    tokens = tts_model.flow_lm.conditioner.prepare(text).tokens
+    prompt_length = tts_model._flow_lm_current_end(model_state)
+    tts_model._expand_kv_cache(model_state, prompt_length + tokens.shape[1] + NUM_FRAMES + 1)
+    tts_model._run_flow_lm_and_increment_step(model_state=model_state, text_tokens=tokens)
+
+    latent = torch.full((1, 1, tts_model.flow_lm.ldim), float("NaN"))
+    latents = []
+    for step in range(NUM_FRAMES):
+        latent, _ = tts_model._run_flow_lm_and_increment_step(
+            model_state=model_state, backbone_input_latents=latent
+        )
+        latents.append(latent)
+        if input_latents is not None:
+            latent = input_latents[:, step : step + 1]
+    return torch.cat(latents, dim=1)
+
+
+@torch.no_grad
+def _decode(tts_model: TTSModel, latents: torch.Tensor) -> torch.Tensor:
+    mimi_state = init_states(
+        tts_model.mimi, batch_size=1, sequence_length=tts_model.config.mimi.transformer.context
+    )
+    frames = [
+        tts_model._decode_latent(latents[:, step : step + 1], mimi_state)
+        for step in range(latents.shape[1])
+    ]
+    return torch.cat(frames, dim=-1).flatten()
+
+
+def test_int8_quantization_matches_float():
+    """Accuracy of the int8 model against the float one, with the same inputs at each step."""
+    # Without sampling noise, the latents only depend on the weights.
+    reference = TTSModel.load_model(temp=0)
+    quantized = TTSModel.load_model(temp=0, quantize="int8")
+    assert size_of_dict(quantized.state_dict()) < 0.75 * size_of_dict(reference.state_dict())
+
+    for text in CORPUS:
+        torch.manual_seed(0)
+        expected = _generate_latents(reference, text)
+        latents = _generate_latents(quantized, text, input_latents=expected)
+        similarity = F.cosine_similarity(latents, expected, dim=-1)
+        assert similarity.mean() > 0.95, text
+
+        expected_audio = _decode(reference, expected)
+        audio = _decode(quantized, expected)
+        snr = 10 * torch.log10(expected_audio.pow(2).sum() / (audio - expected_audio).pow(2).sum())
+        assert snr > 10, text
+
+
+def test_quantize_rejects_unknown_modes():
+    with pytest.raises(ValueError, match="Unsupported quantization"):
+        quantize_linear_layers(torch.nn.Linear(4, 4), "int4")
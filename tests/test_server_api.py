@@ -1,10 +1,15 @@
+import asyncio
+import json
 import textwrap
+from fastapi import Request
 from fastapi.testclient import TestClient
 from unittest.mock import MagicMock
 import pytest
+import torch
 from pathlib import Path
 
-from pocket_tts.main import web_app
+from pocket_tts.server import generate_data_with_state, web_app
+from pocket_tts.models.voice_cache import VoiceStateCache
 
 # A known voice URL for testing
 other_voice = "https://huggingface.co/kyutai/tts-voices/resolve/main/expresso/ex01-ex02_default_001_channel1_168s.wav"
@@ -22,9 +27,9 @@ def mock_tts_model(monkeypatch):
     mock_model._cached_get_state_for_audio_prompt.return_value = dummy_state
     mock_model.get_state_for_audio_prompt.return_value = dummy_state
     
-    monkeypatch.setattr("pocket_tts.main.tts_model", mock_model)
+    monkeypatch.setattr("pocket_tts.server.tts_model", mock_model)
     # Also need to mock global_model_state which is set during server startup
-    monkeypatch.setattr("pocket_tts.main.global_model_state", dummy_state)
+    monkeypatch.setattr("pocket_tts.server.global_model_state", dummy_state)
     return mock_model
 
 def test_openai_speech_with_persona(tmp_path, monkeypatch, mock_tts_model):
@@ -70,3 +75,151 @@ A test persona.
     # The voice from the persona should be used
     mock_tts_model._cached_get_state_for_audio_prompt.assert_called_with(other_voice)
 
+
+def test_tts_endpoint_reuses_uploaded_voice(mock_tts_model):
+    """Test that an uploaded voice is prompted once and can be reused through its ID."""
+    mock_tts_model.voice_state_cache = VoiceStateCache(mock_tts_model, max_bytes=2**20)
+    client = TestClient(web_app)
+    files = {"voice_wav": ("voice.wav", b"RIFF voice", "audio/wav")}
+
+    response = client.post("/tts", data={"text": "hello"}, files=files)
+    assert response.status_code == 200
+    voice_id = response.headers["X-Voice-Id"]
+    response = client.post("/tts", data={"text": "hello"}, files=files)
+    assert response.headers["X-Voice-Id"] == voice_id
+
+    response = client.post("/tts", data={"text": "hello", "voice_url": voice_id})
+    assert response.status_code == 200
+    assert mock_tts_model.get_state_for_audio_prompt.call_count == 1
+
+    response = client.post("/tts", data={"text": "hello", "voice_url": "upload:unknown"})
+    assert response.status_code == 404
+
+def test_generation_stops_when_client_disconnects(mock_tts_model):
+    """Test that the generation is cancelled once the HTTP client is gone."""
+    cancel_events = []
+
+    def generate_audio_stream(model_state, text_to_generate, cancel_event=None, **kwargs):
+        cancel_events.append(cancel_event)
+        while not cancel_event.is_set():
+            yield torch.zeros(240)
+
+    mock_tts_model.generate_audio_stream.side_effect = generate_audio_stream
+    request = MagicMock(spec=Request)
+    request.is_disconnected.side_effect = [False, True]
+
+    async def consume():
+        return [data async for data in generate_data_with_state("Hello.", {}, request)]
+
+    assert len(asyncio.run(consume())) == 1
+    assert cancel_events[0].is_set()
+
+def test_text_stream_websocket(mock_tts_model):
+    """Test that text streamed over the websocket is spoken sentence by sentence."""
+    texts = []
+
+    def generate_audio_stream(model_state, text_to_generate, **kwargs):
+        texts.append(text_to_generate)
+        yield torch.zeros(240)
+
+    mock_tts_model.generate_audio_stream.side_effect = generate_audio_stream
+    client = TestClient(web_app)
+    with client.websocket_connect("/tts/stream") as websocket:
+        assert websocket.receive_json() == {"event": "start", "sample_rate": 24000}
+        websocket.send_json({"text": "Hello there. How"})
+        assert len(websocket.receive_bytes()) == 2 * 240
+        websocket.send_json({"text": " are you?", "end": True})
+        assert len(websocket.receive_bytes()) == 2 * 240
+        assert websocket.receive_json() == {"event": "done"}
+    assert texts == ["Hello there.", "How are you?"]
+
+
+def test_text_stream_websocket_with_invalid_messages(mock_tts_model):
+    """Test that invalid messages are rejected and the text keeps being received."""
+    texts = []
+
+    def generate_audio_stream(model_state, text_to_generate, **kwargs):
+        texts.append(text_to_generate)
+        yield torch.zeros(240)
+
+    mock_tts_model.generate_audio_stream.side_effect = generate_audio_stream
+    client = TestClient(web_app)
+    with client.websocket_connect("/tts/stream") as websocket:
+        assert websocket.receive_json() == {"event": "start", "sample_rate": 24000}
+        websocket.send_json(["not", "a", "dict"])
+        assert websocket.receive_json() == {
+            "event": "error",
+            "message": "Messages must be JSON objects",
+        }
+        websocket.send_json({"text": 42})
+        assert websocket.receive_json() == {"event": "error", "message": "Invalid 'text' field"}
+        websocket.send_json({"text": "Hello there.", "end": True})
+        assert len(websocket.receive_bytes()) == 2 * 240
+        assert websocket.receive_json() == {"event": "done"}
+    assert texts == ["Hello there."]
+
+def test_duplex_websocket(mock_tts_model):
+    """Test several utterances and a cancellation over one websocket connection."""
+
+    def generate_audio_stream(model_state, text_to_generate, **kwargs):
+        for _ in range(3 if text_to_generate == "Hello." else 1000):
+            yield torch.zeros(240)
+
+    mock_tts_model.generate_audio_stream.side_effect = generate_audio_stream
+    client = TestClient(web_app)
+    with client.websocket_connect("/ws/tts") as websocket:
+        websocket.send_json({"text": "Hello.", "id": 1})
+        assert websocket.receive_json() == {"event": "start", "id": 1, "sample_rate": 24000}
+        for _ in range(3):
+            assert len(websocket.receive_bytes()) == 2 * 240
+        assert websocket.receive_json() == {"event": "end", "id": 1, "cancelled": False}
+
+        websocket.send_json({"text": "A very long text.", "id": 2})
+        assert websocket.receive_json()["event"] == "start"
+        websocket.receive_bytes()
+        websocket.send_json({"cancel": True})
+        while (message := websocket.receive()).get("bytes") is not None:
+            pass
+        assert json.loads(message["text"]) == {"event": "end", "id": 2, "cancelled": True}
+
+def test_duplex_websocket_with_unknown_voice(mock_tts_model):
+    """Test that an utterance with a voice that cannot be loaded does not close the connection."""
+    mock_tts_model._cached_get_state_for_audio_prompt.side_effect = FileNotFoundError("missing")
+    mock_tts_model.generate_audio_stream.side_effect = lambda **kwargs: (
+        chunk for chunk in [torch.zeros(240)]
+    )
+    client = TestClient(web_app)
+    with client.websocket_connect("/ws/tts") as websocket:
+        websocket.send_json({"text": "Hello.", "id": 1, "voice": "missing.wav"})
+        assert websocket.receive_json() == {"event": "error", "id": 1, "message": "Unknown voice"}
+
+        websocket.send_json({"text": "Hello.", "id": 2, "voice": None})
+        assert websocket.receive_json()["event"] == "start"
+        assert len(websocket.receive_bytes()) == 2 * 240
+        assert websocket.receive_json() == {"event": "end", "id": 2, "cancelled": False}
+
+
+def test_duplex_websocket_with_invalid_messages(mock_tts_model):
+    """Test that messages that are not JSON objects or have wrong fields are rejected."""
+    mock_tts_model.generate_audio_stream.side_effect = lambda **kwargs: (
+        chunk for chunk in [torch.zeros(240)]
+    )
+    client = TestClient(web_app)
+    with client.websocket_connect("/ws/tts") as websocket:
+        websocket.send_json(["x"])
+        assert websocket.receive_json() == {
+            "event": "error",
+            "id": None,
+            "message": "Messages must be JSON objects",
+        }
+        websocket.send_json({"text": 42, "id": 1})
+        assert websocket.receive_json() == {
+            "event": "error",
+            "id": 1,
+            "message": "Invalid 'text' field",
+        }
+
+        websocket.send_json({"text": "Hello.", "id": 2})
+        assert websocket.receive_json()["event"] == "start"
+        assert len(websocket.receive_bytes()) == 2 * 240
+        assert websocket.receive_json() == {"event": "end", "id": 2, "cancelled": False}
@@ -0,0 +1,77 @@
+import os
+
+import pytest
+import torch
+
+from pocket_tts import TTSModel
+from pocket_tts.data.audio import stream_audio_chunks
+from pocket_tts.utils.state_files import (
+    flatten_model_state,
+    mmap_safetensors,
+    unflatten_model_state,
+)
+
+
+def test_mmap_safetensors_round_trip(tmp_path):
+    import safetensors.torch
+
+    model_state = {
+        "transformer.layers.0.self_attn": {
+            "current_end": torch.tensor(3),
+            "cache": torch.randn(2, 1, 3, 4, 8),
+        }
+    }
+    path = tmp_path / "state.safetensors"
+    tensors = {"audio_prompt": torch.randn(1, 3, 8), **flatten_model_state(model_state)}
+    safetensors.torch.save_file(tensors, path, metadata={"key": "value"})
+
+    loaded, metadata = mmap_safetensors(path)
+    assert metadata == {"key": "value"}
+    torch.testing.assert_close(loaded["audio_prompt"], tensors["audio_prompt"])
+    loaded_state = unflatten_model_state(loaded)
+    for key, value in model_state["transformer.layers.0.self_attn"].items():
+        torch.testing.assert_close(loaded_state["transformer.layers.0.self_attn"][key], value)
+
+    # Writing to the mapped tensors doesn't modify the file.
+    loaded_state["transformer.layers.0.self_attn"]["current_end"] += 1
+    reloaded_state = unflatten_model_state(mmap_safetensors(path)[0])
+    assert int(reloaded_state["transformer.layers.0.self_attn"]["current_end"]) == 3
+
+
+def test_saved_model_state_skips_prompting(tmp_path):
+    import safetensors.torch
+
+    tts_model = TTSModel.load_model()
+    audio = torch.randn(1, tts_model.sample_rate * 2) * 0.1
+    path = tmp_path / "voice.safetensors"
+    tts_model.save_audio_prompt(audio, path, save_state=True)
+
+    prompt = safetensors.torch.load_file(path)["audio_prompt"]
+    expected = tts_model._get_state_for_prompt(prompt)
+    loaded = tts_model.get_state_for_audio_prompt(path)
+    assert loaded.keys() == expected.keys()
+    for module_name, module_state in expected.items():
+        for key, value in module_state.items():
+            torch.testing.assert_close(loaded[module_name][key], value)
+
+
+def test_export_is_current(tmp_path):
+    tts_model = TTSModel.load_model()
+    if not tts_model.has_voice_cloning:
+        pytest.skip("Exporting audio files needs the weights with voice cloning")
+    audio_path = tmp_path / "voice.wav"
+    audio = torch.randn(tts_model.sample_rate * 2) * 0.1
+    stream_audio_chunks(audio_path, iter([audio]), tts_model.sample_rate)
+    export_path = tmp_path / "voice.safetensors"
+
+    assert not tts_model._is_export_current(audio_path, export_path)
+    tts_model.save_audio_prompt(audio_path, export_path)
+    assert tts_model._is_export_current(audio_path, export_path)
+    assert not tts_model._is_export_current(audio_path, export_path, truncate=True)
+    assert not tts_model._is_export_current(audio_path, export_path, save_state=True)
+
+    # Touching the audio without changing it keeps the export current.
+    os.utime(audio_path, ns=(0, 0))
+    assert tts_model._is_export_current(audio_path, export_path)
+    stream_audio_chunks(audio_path, iter([audio * 0.5]), tts_model.sample_rate)
+    assert not tts_model._is_export_current(audio_path, export_path)
@@ -0,0 +1,48 @@
+from unittest.mock import MagicMock
+
+import torch
+
+from pocket_tts.models.text_stream import TextStreamSession
+
+
+def _session(**kwargs):
+    texts = []
+
+    def generate_audio_stream(model_state, text_to_generate, max_tokens, frames_after_eos):
+        texts.append(text_to_generate)
+        yield torch.zeros(10)
+        yield torch.zeros(10)
+
+    session = TextStreamSession(
+        MagicMock(), {}, generate_audio_stream=generate_audio_stream, **kwargs
+    )
+    return session, texts
+
+
+def test_text_stream_speaks_complete_sentences():
+    session, texts = _session()
+    for fragment in ["Hello", " there. How", " are you? I'm", " fine", "", " thanks"]:
+        session.feed(fragment)
+    session.close()
+
+    chunks = list(session.audio_chunks())
+    assert texts == ["Hello there.", "How are you?", "I'm fine thanks"]
+    assert len(chunks) == 6
+
+
+def test_text_stream_starts_before_the_text_ends():
+    session, texts = _session(max_buffered_chars=20)
+    audio_chunks = session.audio_chunks()
+    session.feed("First sentence. Second")
+    next(audio_chunks)
+    assert texts == ["First sentence."]
+
+    session.feed(" sentence without any end in sight")
+    next(audio_chunks)
+    next(audio_chunks)
+    assert texts == ["First sentence.", "Second sentence without any end in"]
+
+    # The rest of the audio and the text not spoken yet are dropped.
+    session.cancel()
+    assert list(audio_chunks) == []
+    assert len(texts) == 2
@@ -0,0 +1,79 @@
+import torch
+
+from pocket_tts.modules.rope import RotaryEmbedding, apply_rope
+from pocket_tts.modules.stateful_module import increment_steps, init_states
+from pocket_tts.modules.transformer import StreamingMultiheadAttention, cached_kv
+
+
+@torch.no_grad
+def test_streaming_attention_matches_full_sequence():
+    """Feeding a sequence step by step gives the same outputs as feeding it at once."""
+    torch.manual_seed(0)
+    attention = StreamingMultiheadAttention(embed_dim=64, num_heads=4, rope=RotaryEmbedding())
+    inputs = torch.randn(1, 6, 64)
+
+    state = init_states(attention, batch_size=1, sequence_length=inputs.shape[1])
+    expected = attention(inputs, state)
+
+    state = init_states(attention, batch_size=1, sequence_length=inputs.shape[1])
+    outputs = [attention(inputs[:, :2], state)]
+    increment_steps(attention, state, increment=2)
+    for step in range(2, inputs.shape[1]):
+        outputs.append(attention(inputs[:, step : step + 1], state))
+        increment_steps(attention, state)
+
+    assert int(state[""]["current_end"]) == inputs.shape[1]
+    torch.testing.assert_close(torch.cat(outputs, dim=1), expected, rtol=1e-4, atol=1e-5)
+
+
+def test_rotary_embedding_tables_match_apply_rope():
+    torch.manual_seed(0)
+    rope = RotaryEmbedding()
+    q, k = torch.randn(2, 2, 3, 4, 16)
+    for offset in [0, 5, 300]:
+        expected = apply_rope(q, k, offset=offset)
+        for actual, reference in zip(rope(q, k, offset=offset), expected):
+            torch.testing.assert_close(actual, reference)
+
+    offsets = torch.tensor([7, 1000])
+    expected = [apply_rope(q[i : i + 1], k[i : i + 1], offset=int(offsets[i])) for i in range(2)]
+    for actual, reference in zip(rope(q, k, offset=offsets), zip(*expected)):
+        torch.testing.assert_close(actual, torch.cat(reference))
+
+
+@torch.no_grad
+def test_copy_on_write_state_matches_full_cache():
+    """Attending to a shared prefix plus a tail gives the same outputs as a single cache."""
+    torch.manual_seed(0)
+    attention = StreamingMultiheadAttention(embed_dim=64, num_heads=4, rope=RotaryEmbedding())
+    prompt_length = 5
+    inputs = torch.randn(1, 4, 64)
+
+    voice_state = init_states(attention, batch_size=1, sequence_length=prompt_length)
+    attention(torch.randn(1, prompt_length, 64), voice_state)
+    increment_steps(attention, voice_state, increment=prompt_length)
+    voice_cache = voice_state[""]["cache"].clone()
+
+    full_state = {"": dict(voice_state[""])}
+    full_state[""]["cache"] = torch.cat([voice_cache, torch.zeros(2, 1, 4, 4, 16)], dim=2)
+    full_state[""]["current_end"] = voice_state[""]["current_end"].clone()
+    forked_state = {
+        "": dict(
+            prefix=cached_kv(voice_state[""]),
+            cache=torch.zeros(2, 1, 4, 4, 16),
+            current_end=voice_state[""]["current_end"].clone(),
+        )
+    }
+
+    def run(state):
+        outputs = [attention(inputs[:, :2], state)]
+        increment_steps(attention, state, increment=2)
+        for step in range(2, inputs.shape[1]):
+            outputs.append(attention(inputs[:, step : step + 1], state))
+            increment_steps(attention, state)
+        return torch.cat(outputs, dim=1)
+
+    torch.testing.assert_close(run(forked_state), run(full_state), rtol=1e-4, atol=1e-5)
+    torch.testing.assert_close(cached_kv(forked_state[""]), cached_kv(full_state[""]))
+    # The shared prefix was not modified.
+    torch.testing.assert_close(voice_state[""]["cache"], voice_cache)
@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+CHECK_SCRIPT = """
+from beartype.roar import BeartypeCallHintParamViolation
+
+from pocket_tts.utils.utils import size_of_dict
+
+try:
+    size_of_dict("not a dict")
+except BeartypeCallHintParamViolation:
+    print("checked")
+except Exception:
+    print("unchecked")
+"""
+
+
+@pytest.mark.parametrize("type_checks, expected", [("1", "checked"), ("0", "unchecked")])
+def test_type_checks_can_be_disabled(type_checks, expected):
+    env = {**os.environ, "POCKET_TTS_TYPE_CHECKS": type_checks}
+    result = subprocess.run(
+        [sys.executable, "-c", CHECK_SCRIPT], env=env, capture_output=True, text=True, check=True
+    )
+    assert result.stdout.strip() == expected
@@ -0,0 +1,66 @@
+from unittest.mock import MagicMock
+
+import torch
+
+from pocket_tts.models.voice_cache import VoiceStateCache, voice_cache_key
+
+
+def _fake_model():
+    tts_model = MagicMock()
+    # Each state is 4 KB.
+    tts_model.get_state_for_audio_prompt.side_effect = lambda voice, truncate: {
+        "layer": {"cache": torch.zeros(1024)}
+    }
+    return tts_model
+
+
+def test_voice_cache_evicts_least_recently_used():
+    tts_model = _fake_model()
+    cache = VoiceStateCache(tts_model, max_bytes=2 * 4096)
+
+    alba = cache.get("alba")
+    cache.get("marius")
+    assert cache.get("alba") is alba
+    cache.get("javert")  # Evicts marius, the least recently used.
+
+    assert cache.get("alba") is alba
+    cache.get("marius")
+    assert tts_model.get_state_for_audio_prompt.call_count == 4
+    assert cache.stats() == {
+        "entries": 2,
+        "bytes": 2 * 4096,
+        "max_bytes": 2 * 4096,
+        "hits": 2,
+        "misses": 4,
+        "evictions": 2,
+        "spill_hits": 0,
+    }
+
+
+def test_voice_cache_key_tracks_file_changes(tmp_path):
+    voice = tmp_path / "voice.wav"
+    voice.write_bytes(b"first")
+    key = voice_cache_key(str(voice), truncate=False)
+    assert voice_cache_key(voice, truncate=False) == key
+    assert voice_cache_key(voice, truncate=True) != key
+
+    voice.write_bytes(b"second version")
+    assert voice_cache_key(voice, truncate=False) != key
+
+    tensor = torch.randn(1, 100)
+    assert voice_cache_key(tensor, False) == voice_cache_key(tensor.clone(), False)
+
+
+def test_uploaded_voices_are_cached_by_content():
+    tts_model = _fake_model()
+    cache = VoiceStateCache(tts_model, max_bytes=2 * 4096)
+
+    voice_id, model_state = cache.get_uploaded(b"RIFF voice", ".wav")
+    assert cache.get_uploaded(b"RIFF voice", ".wav") == (voice_id, model_state)
+    assert cache.get_by_id(voice_id) is model_state
+    assert cache.get_uploaded(b"RIFF other voice", ".wav")[0] != voice_id
+    assert tts_model.get_state_for_audio_prompt.call_count == 2
+    assert tts_model.get_state_for_audio_prompt.call_args.kwargs == {"truncate": True}
+
+    cache.clear()
+    assert cache.get_by_id(voice_id) is None
@@ -0,0 +1,29 @@
+from pocket_tts.utils.voice_catalog import VoiceCatalog
+
+
+def _write(path, size=2000):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"\0" * size)
+    return path
+
+
+def test_voice_catalog_resolves_names(tmp_path):
+    wav = _write(tmp_path / "speakers" / "alba.wav")
+    prefixed = _write(tmp_path / "embeddings" / "marius-casual.safetensors")
+    _write(tmp_path / "embeddings" / "javert.safetensors", size=130)  # Git LFS pointer
+    javert = _write(tmp_path / "javert.mp3")
+    catalog = VoiceCatalog(tmp_path)
+
+    assert catalog.find("alba") == wav
+    assert catalog.find("marius") == prefixed
+    assert catalog.find("javert") == javert
+    assert catalog.find("speakers/alba") == wav
+    assert catalog.find("cosette") is None
+
+    exact = _write(tmp_path / "embeddings" / "marius.safetensors")
+    alba = _write(tmp_path / "alba.safetensors")
+    # Changes are only picked up once the TTL has expired.
+    assert catalog.find("marius") == prefixed
+    catalog.ttl = 0
+    assert catalog.find("marius") == exact
+    assert catalog.find("alba") == alba